@@ -0,0 +1,69 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+# Code that prints ``size`` bytes, per language
+WORKLOADS = {
+    "python": lambda size: f"print('x' * {size})",
+    "javascript": lambda size: f"console.log('x'.repeat({size}))",
+    "bash": lambda size: f"head -c {size} /dev/zero | tr '\\0' x; echo",
+}
+
+
+class Scenario:
+    def __init__(self, language: str, size: int):
+        self.language = language
+        self.size = size
+        self.code = WORKLOADS[language](size)
+
+    @property
+    def name(self) -> str:
+        return f"{self.language}-{self.size}"
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(round(fraction * (len(sorted_values) - 1)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def run_load(
+    call: Callable[[Scenario], Awaitable[None]],
+    scenario: Scenario,
+    concurrency: int,
+    requests: int,
+) -> dict:
+    """Issue ``requests`` calls with at most ``concurrency`` in flight and
+    summarise their latencies."""
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def client():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                await call(scenario)
+            except Exception:  # noqa: BLE001 - every failure counts as an error
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
@@ -0,0 +1,57 @@
+"""Serve gcf/main.py:execute_code over HTTP as a local Cloud Function stand-in.
+
+Usage: python -m benchmarks.local_executor [--port 8080]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+
+from flask import Flask, request
+from werkzeug.serving import make_server
+
+# Import the executor the way functions-framework does, as top-level modules
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gcf")
+)
+from main import execute_code
+
+
+def make_app() -> Flask:
+    app = Flask("local-executor")
+
+    @app.route("/", defaults={"path": ""}, methods=["GET", "POST"])
+    @app.route("/<path:path>", methods=["GET", "POST"])
+    def handle(path):
+        return execute_code(request)
+
+    return app
+
+
+def serve(host: str = "127.0.0.1", port: int = 0):
+    """Start the executor in a background thread and return (server, url)."""
+    server = make_server(host, port, make_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings")
+    args = parser.parse_args()
+
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server(args.host, args.port, make_app(), threaded=True)
+    print(f"http://{args.host}:{server.server_port}/", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
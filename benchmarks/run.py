@@ -0,0 +1,347 @@
+"""Load and latency benchmarks for the whole execution path.
+
+Starts the executor behind a local HTTP server (see local_executor.py) and
+drives it through one or more targets:
+
+- executor: HTTP requests straight to the executor
+- server:   CodeInterpreterServer.run_code in this process
+- stdio:    the FastMCP server (main.py) over stdio, as an MCP client would
+- local:    CodeInterpreterServer.run_code with the local backend, no HTTP
+
+Usage:
+    python -m benchmarks.run --targets executor,server,stdio --concurrency 8 --requests 200
+    python -m benchmarks.run --save local          # write benchmarks/baselines/local.json
+    python -m benchmarks.run --compare local       # fail on regressions against it
+
+Executor settings such as WORKER_POOL_SIZE are read from the environment as
+usual, so the same run can be repeated with and without them.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from .load import WORKLOADS, Scenario, run_load
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINES = Path(__file__).resolve().parent / "baselines"
+
+# Lower is better for latencies, higher for throughput
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+THROUGHPUT_KEY = "throughput_rps"
+
+
+def peak_rss_kb(pid: int) -> int:
+    """Peak resident set size of a process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def child_pids(match: str) -> list[int]:
+    pids = []
+    for task in Path(f"/proc/{os.getpid()}/task").glob("*/children"):
+        for pid in task.read_text().split():
+            try:
+                cmdline = (
+                    Path(f"/proc/{pid}/cmdline")
+                    .read_bytes()
+                    .replace(b"\0", b" ")
+                    .decode()
+                )
+            except OSError:
+                continue
+            if match in cmdline:
+                pids.append(int(pid))
+    return pids
+
+
+def start_executor() -> tuple[subprocess.Popen, str]:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.local_executor", "--port", "0", "--quiet"],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    url = proc.stdout.readline().strip()
+    if not url:
+        proc.kill()
+        raise RuntimeError("local executor did not start")
+    return proc, url
+
+
+def _check(result: dict) -> None:
+    if "error" in result or result.get("exitCode", 0) != 0:
+        raise RuntimeError(result.get("error") or result.get("stderr"))
+
+
+def _check_text(text: str) -> None:
+    """As _check, for the text run_code renders with output.format_result."""
+    if text.startswith(("Error: ", "Exit code: ")) or "\n\nExit code: " in text:
+        raise RuntimeError(text)
+
+
+async def executor_target(url: str):
+    from src.code_mcp.http_client import GCFClient
+
+    client = GCFClient()
+
+    async def call(scenario: Scenario) -> None:
+        _check(
+            await client.post_json(
+                url, {"code": scenario.code, "language": scenario.language}
+            )
+        )
+
+    return call, client.aclose
+
+
+async def server_target(url: str):
+    from src.code_mcp.http_client import close_client
+    from src.code_mcp.server import CodeInterpreterServer
+
+    server = CodeInterpreterServer()
+    server.gcf_url = url
+
+    async def call(scenario: Scenario) -> None:
+        _check_text(
+            (await server.run_code(scenario.code, scenario.language, cache=False))[
+                0
+            ].text
+        )
+
+    return call, close_client
+
+
+async def local_target(url: str):
+    from src.code_mcp.server import CodeInterpreterServer
+
+    server = CodeInterpreterServer()
+    server.backend_name = "local"
+
+    async def call(scenario: Scenario) -> None:
+        _check_text(
+            (await server.run_code(scenario.code, scenario.language, cache=False))[
+                0
+            ].text
+        )
+
+    async def close() -> None:
+        pass
+
+    return call, close
+
+
+async def stdio_target(url: str):
+    from contextlib import AsyncExitStack
+
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    env = {**os.environ, "GCF_URL": url}
+    env.pop("CODE_MCP_CACHE", None)
+    params = StdioServerParameters(
+        command=sys.executable, args=[str(ROOT / "main.py")], env=env, cwd=str(ROOT)
+    )
+
+    stack = AsyncExitStack()
+    # The server logs every call to stderr
+    errlog = stack.enter_context(open(os.devnull, "w"))  # noqa: ASYNC230, SIM115
+    read_stream, write_stream = await stack.enter_async_context(
+        stdio_client(params, errlog=errlog)
+    )
+    session = await stack.enter_async_context(ClientSession(read_stream, write_stream))
+    await session.initialize()
+
+    async def call(scenario: Scenario) -> None:
+        result = await session.call_tool(
+            "run_code",
+            {"code": scenario.code, "language": scenario.language, "cache": False},
+        )
+        if result.isError:
+            raise RuntimeError(
+                result.content[0].text if result.content else "tool error"
+            )
+        _check_text(result.content[0].text if result.content else "")
+
+    return call, stack.aclose
+
+
+TARGETS = {
+    "executor": executor_target,
+    "server": server_target,
+    "stdio": stdio_target,
+    "local": local_target,
+}
+
+
+async def run_benchmarks(args) -> dict:
+    executor, url = (None, args.executor_url) if args.executor_url else start_executor()
+    results = {}
+    memory = {}
+    try:
+        for target in args.targets:
+            call, close = await TARGETS[target](url)
+            try:
+                for language in args.languages:
+                    for size in args.sizes:
+                        scenario = Scenario(language, size)
+                        await run_load(
+                            call,
+                            scenario,
+                            min(args.concurrency, args.warmup),
+                            args.warmup,
+                        )
+                        stats = await run_load(
+                            call, scenario, args.concurrency, args.requests
+                        )
+                        results[f"{target}/{scenario.name}"] = stats
+                        print(
+                            f"{target:>8} {scenario.name:<20} p50 {stats['p50_ms']:>8.1f} ms"
+                            f"  p95 {stats['p95_ms']:>8.1f} ms  p99 {stats['p99_ms']:>8.1f} ms"
+                            f"  {stats['throughput_rps']:>7.1f} req/s  errors {stats['errors']}",
+                            flush=True,
+                        )
+                if target == "stdio":
+                    memory["stdio_server_kb"] = max(
+                        (peak_rss_kb(pid) for pid in child_pids("main.py")), default=0
+                    )
+            finally:
+                await close()
+    finally:
+        if executor is not None:
+            memory["executor_kb"] = peak_rss_kb(executor.pid)
+            executor.kill()
+            executor.wait()
+
+    # ru_maxrss is in kilobytes on Linux
+    memory["driver_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "worker_pool_size": int(os.getenv("WORKER_POOL_SIZE", "0")),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+        "memory": memory,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return one line per metric that got worse by more than ``threshold``."""
+    regressions = []
+    for key, stats in report["results"].items():
+        before = baseline["results"].get(key)
+        if before is None:
+            continue
+        for metric in LATENCY_KEYS + (THROUGHPUT_KEY,):
+            old, new = before[metric], stats[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = (
+                change > threshold if metric in LATENCY_KEYS else -change > threshold
+            )
+            marker = "REGRESSION" if worse else ""
+            print(
+                f"{key:<32} {metric:<15} {old:>10.2f} -> {new:>10.2f} ({change:+.0%}) {marker}"
+            )
+            if worse:
+                regressions.append(f"{key} {metric}: {old} -> {new}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load and latency benchmarks for code-mcp"
+    )
+    parser.add_argument(
+        "--targets",
+        default="executor,server",
+        type=lambda v: v.split(","),
+        help=f"Comma-separated targets: {', '.join(TARGETS)}",
+    )
+    parser.add_argument(
+        "--languages",
+        default="python,javascript,bash",
+        type=lambda v: v.split(","),
+        help=f"Comma-separated languages: {', '.join(WORKLOADS)}",
+    )
+    parser.add_argument(
+        "--sizes",
+        default="16,65536",
+        type=lambda v: [int(s) for s in v.split(",")],
+        help="Comma-separated output sizes in bytes",
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--requests", type=int, default=50, help="Requests per target and scenario"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=4, help="Unmeasured requests before each scenario"
+    )
+    parser.add_argument(
+        "--executor-url", help="Benchmark an existing executor instead of a local one"
+    )
+    parser.add_argument(
+        "--save", metavar="NAME", help="Write the report to baselines/NAME.json"
+    )
+    parser.add_argument(
+        "--compare", metavar="NAME", help="Compare against baselines/NAME.json"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown before failing (0.2 = 20%%)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    for target in args.targets:
+        if target not in TARGETS:
+            raise SystemExit(f"Unknown target: {target}")
+
+    report = asyncio.run(run_benchmarks(args))
+    print(
+        "memory: "
+        + ", ".join(f"{key} {value}" for key, value in report["memory"].items())
+    )
+
+    if args.save:
+        BASELINES.mkdir(exist_ok=True)
+        path = BASELINES / f"{args.save}.json"
+        path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print(f"Saved {path.relative_to(ROOT)}")
+
+    if args.compare:
+        baseline = json.loads((BASELINES / f"{args.compare}.json").read_text())
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Caps concurrent executions and queues a bounded number of callers.
+
+    A caller that finds the queue full, or waits longer than
+    ``queue_timeout``, is rejected with a retry-after hint derived from the
+    recent execution time so clients back off instead of piling on.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._avg_duration = 1.0
+        self._cond = threading.Condition()
+
+    def _retry_after(self) -> int:
+        backlog = (self.waiting + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(self._avg_duration * backlog))
+
+    def _reject(self, message: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(message, self._retry_after())
+
+    def acquire(self) -> float:
+        """Wait for an execution slot and return the time spent queued."""
+        started = time.monotonic()
+        with self._cond:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    raise self._reject(
+                        f"Executor busy: {self.active} running, {self.waiting} queued"
+                    )
+                self.waiting += 1
+                try:
+                    deadline = started + self.queue_timeout
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise self._reject(
+                                f"Executor busy: queued for {self.queue_timeout} seconds"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            wait = time.monotonic() - started
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        return wait
+
+    def release(self, duration: float) -> None:
+        with self._cond:
+            self.active -= 1
+            # Smoothed run time feeds the retry-after estimate
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self):
+        wait = self.acquire()
+        started = time.monotonic()
+        try:
+            yield wait
+        finally:
+            self.release(time.monotonic() - started)
+
+    @contextmanager
+    def borrow(self, wanted: int):
+        """Take up to ``wanted`` slots that are free right now, without
+        queueing, and yield how many were taken. For callers that already
+        hold a slot and could use more, such as a parallel batch."""
+        with self._cond:
+            taken = max(0, min(wanted, self.max_concurrent - self.active))
+            self.active += taken
+        try:
+            yield taken
+        finally:
+            with self._cond:
+                self.active -= taken
+                self._cond.notify(taken)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active": self.active,
+                "queued": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_ms_avg": self.wait_total * 1000 / self.admitted
+                if self.admitted
+                else 0.0,
+                "wait_ms_max": self.wait_max * 1000,
+            }
@@ -0,0 +1,249 @@
+import base64
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Self
+
+logger = logging.getLogger(__name__)
+
+# Input files are stored once under their SHA-256 and copied into each run's
+# working directory. The least recently used blobs are removed once the store
+# grows past BLOB_STORE_MB; /tmp counts against the function's memory.
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(tempfile.gettempdir(), "code-mcp-blobs"))
+BLOB_STORE_MB = int(os.getenv("BLOB_STORE_MB", "64"))
+# Output files returned with a result, in total; larger ones are listed
+# without their content
+MAX_RESULT_FILES_MB = int(os.getenv("MAX_RESULT_FILES_MB", "8"))
+MAX_FILES = int(os.getenv("MAX_FILES", "100"))
+
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobError(Exception):
+    status = 400
+
+
+class MissingBlobs(BlobError):
+    """Input files reference blobs this instance does not have (any more)."""
+
+    status = 409
+
+    def __init__(self, missing: list[str]):
+        super().__init__(f"Missing {len(missing)} input blob(s), send them again")
+        self.missing = missing
+
+
+def digest_of(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def validate_files(files) -> str | None:
+    """Check a request's {path: sha256} mapping of input files."""
+    if not isinstance(files, dict):
+        return "Field files must map file names to SHA-256 digests"
+    if len(files) > MAX_FILES:
+        return f"Too many files: at most {MAX_FILES}"
+    for name, digest in files.items():
+        parts = name.replace("\\", "/").split("/") if isinstance(name, str) else []
+        if (
+            not name
+            or name.startswith("/")
+            or "\0" in name
+            or any(part in ("", ".", "..") for part in parts)
+        ):
+            return f"Invalid file name: {name!r}"
+        if not isinstance(digest, str) or not DIGEST.match(digest):
+            return f"Invalid digest for {name}: expected a SHA-256 hex digest"
+    return None
+
+
+class BlobStore:
+    """Content-addressed files on local disk, bounded in total size."""
+
+    def __init__(
+        self, root: str = BLOB_DIR, max_bytes: int = BLOB_STORE_MB * 1024 * 1024
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # Blobs left by an earlier process on this instance
+        for name in os.listdir(root):
+            if DIGEST.match(name):
+                size = os.path.getsize(os.path.join(root, name))
+                self._sizes[name] = size
+                self.total += size
+        self._evict()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest)
+
+    def missing(self, digests: list[str]) -> list[str]:
+        with self._lock:
+            missing = []
+            for digest in digests:
+                if digest in self._sizes:
+                    self._sizes.move_to_end(digest)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    missing.append(digest)
+            return missing
+
+    def put(self, data: bytes, digest: str | None = None) -> str:
+        actual = digest_of(data)
+        if digest is not None and digest != actual:
+            raise BlobError(f"Blob content does not match its digest {digest}")
+        with self._lock:
+            if actual in self._sizes:
+                self._sizes.move_to_end(actual)
+                return actual
+        if len(data) > self.max_bytes:
+            raise BlobError(
+                f"Blob too large: {len(data)} bytes, the store holds {self.max_bytes}"
+            )
+
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(actual))
+        with self._lock:
+            if actual not in self._sizes:
+                self._sizes[actual] = len(data)
+                self.total += len(data)
+            self._evict(keep=actual)
+        return actual
+
+    def put_encoded(self, blobs) -> list[str]:
+        """Store {digest: base64 content} as sent by the client."""
+        if not isinstance(blobs, dict):
+            raise BlobError("Field blobs must map SHA-256 digests to base64 content")
+        stored = []
+        for digest, content in blobs.items():
+            try:
+                data = (
+                    content
+                    if isinstance(content, bytes)
+                    else base64.b64decode(content, validate=True)
+                )
+            except (TypeError, ValueError):
+                raise BlobError(f"Invalid base64 content for blob {digest}")
+            stored.append(self.put(data, digest))
+        return stored
+
+    def copy_to(self, digest: str, dest: str) -> None:
+        with self._lock:
+            if digest not in self._sizes:
+                raise MissingBlobs([digest])
+            self._sizes.move_to_end(digest)
+        try:
+            shutil.copyfile(self._path(digest), dest)
+        except FileNotFoundError:
+            # Evicted by a concurrent upload
+            raise MissingBlobs([digest])
+
+    def _evict(self, keep: str | None = None) -> None:
+        while self.total > self.max_bytes and self._sizes:
+            digest, size = next(iter(self._sizes.items()))
+            if digest == keep:
+                break
+            del self._sizes[digest]
+            self.total -= size
+            self.evicted += 1
+            try:
+                os.unlink(self._path(digest))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "blobs": len(self._sizes),
+            "bytes": self.total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+
+class Workspace:
+    """A temporary working directory holding a run's input files.
+
+    ``collect()`` returns the files the run created or changed, with their
+    content base64-encoded up to ``MAX_RESULT_FILES_MB`` in total. They are
+    also added to the store, so a later run can use them as inputs without
+    uploading them.
+    """
+
+    def __init__(self, store: BlobStore, files: dict[str, str]):
+        self.store = store
+        self.files = files
+        self.path = None
+        self._inputs: dict[str, tuple[int, int]] = {}
+
+    def __enter__(self) -> Self:
+        missing = self.store.missing(list(set(self.files.values())))
+        if missing:
+            raise MissingBlobs(missing)
+        self.path = tempfile.mkdtemp(prefix="run-")
+        try:
+            for name, digest in self.files.items():
+                dest = os.path.join(self.path, *name.replace("\\", "/").split("/"))
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                self.store.copy_to(digest, dest)
+                stat = os.stat(dest)
+                self._inputs[os.path.relpath(dest, self.path)] = (
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                )
+        except BaseException:
+            shutil.rmtree(self.path, ignore_errors=True)
+            raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def collect(self, limit: int = MAX_RESULT_FILES_MB * 1024 * 1024) -> list[dict]:
+        collected = []
+        budget = limit
+        for directory, dirnames, filenames in os.walk(self.path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                if os.path.islink(path) or not os.path.isfile(path):
+                    continue
+                name = os.path.relpath(path, self.path)
+                stat = os.stat(path)
+                if self._inputs.get(name) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                if len(collected) >= MAX_FILES:
+                    logger.warning(
+                        f"Run wrote more than {MAX_FILES} files, ignoring the rest"
+                    )
+                    return collected
+
+                entry = {"name": name.replace(os.sep, "/"), "size": stat.st_size}
+                if stat.st_size <= budget:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    budget -= len(data)
+                    entry["sha256"] = digest_of(data)
+                    entry["content"] = base64.b64encode(data).decode()
+                    try:
+                        self.store.put(data)
+                    except BlobError:
+                        pass
+                else:
+                    entry["omitted"] = True
+                collected.append(entry)
+        return collected
@@ -0,0 +1,405 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+try:
+    from .cancellation import Call, Cancelled
+    from .limits import ResourceLimits
+except ImportError:  # loaded as a top-level module by functions-framework
+    from cancellation import Call, Cancelled
+    from limits import ResourceLimits
+
+logger = logging.getLogger(__name__)
+
+# Compiled snippets are built once and the binary kept under the hash of the
+# source, the compiler and its flags, so an identical snippet runs without
+# compiling again. The least recently used binaries are removed once the
+# cache grows past BUILD_CACHE_MB, and compiler caches such as Go's are
+# counted too; /tmp counts against the function's memory.
+BUILD_DIR = os.getenv(
+    "BUILD_DIR", os.path.join(tempfile.gettempdir(), "code-mcp-builds")
+)
+BUILD_CACHE_MB = int(os.getenv("BUILD_CACHE_MB", "64"))
+BUILD_TIMEOUT = float(os.getenv("BUILD_TIMEOUT", "60"))
+BUILD_CFLAGS = os.getenv("BUILD_CFLAGS", "-O2").split()
+BUILD_CXXFLAGS = os.getenv("BUILD_CXXFLAGS", "-O2 -std=c++17").split()
+BUILD_RUSTFLAGS = os.getenv("BUILD_RUSTFLAGS", "-O").split()
+# Languages offered when their compiler is installed
+COMPILED_LANGUAGES = [
+    language.strip()
+    for language in os.getenv("COMPILED_LANGUAGES", "c,cpp,go,rust").split(",")
+    if language.strip()
+]
+# Compiler output kept in a failed build's result
+MAX_BUILD_OUTPUT = 64 * 1024
+
+# Compilers reserve more address space than snippets may, and Go builds in
+# parallel, so builds only get the file size limit and BUILD_TIMEOUT.
+BUILD_LIMITS = ResourceLimits(cpu_seconds=0, memory_mb=0, max_processes=0)
+
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BuildFailed(Exception):
+    """The compiler rejected the snippet or ran out of time."""
+
+    def __init__(self, output: str, exit_code: int):
+        super().__init__(output)
+        self.result = {
+            "stdout": "",
+            "stderr": f"Compilation failed:\n{output}",
+            "exitCode": exit_code,
+        }
+
+
+class Toolchain:
+    """How to compile one language: ``command`` builds ``{src}`` into
+    ``{out}``, ``version`` identifies the compiler for the cache key.
+    ``caches`` are directories the compiler keeps its own cache in."""
+
+    def __init__(
+        self,
+        language: str,
+        source: str,
+        command: list[str],
+        version: list[str],
+        env: dict | None = None,
+        caches: list[str] | None = None,
+    ):
+        self.language = language
+        self.source = source
+        self.command = command
+        self.version = version
+        self.env = env or {}
+        self.caches = caches or []
+        self._identity = None
+
+    @property
+    def compiler(self) -> str:
+        return self.command[0]
+
+    def available(self) -> bool:
+        return shutil.which(self.compiler) is not None
+
+    def identity(self) -> str:
+        """Compiler path and version; a compiler upgrade invalidates old builds."""
+        if self._identity is None:
+            version = subprocess.run(
+                self.version, capture_output=True, text=True, timeout=30, check=False
+            )
+            self._identity = f"{shutil.which(self.compiler)} {version.stdout.strip() or version.stderr.strip()}"
+        return self._identity
+
+    def key(self, source: str) -> str:
+        material = json.dumps(
+            [self.language, self.identity(), self.command, self.env, source]
+        )
+        return hashlib.sha256(material.encode()).hexdigest()
+
+
+def _go_env(root: str) -> dict:
+    # Functions have no writable home directory, and must not download toolchains
+    return {
+        "GOCACHE": os.path.join(root, ".go-cache"),
+        "GOPATH": os.path.join(root, ".go-path"),
+        "GOTOOLCHAIN": "local",
+        "GO111MODULE": "off",
+    }
+
+
+def default_toolchains(root: str = BUILD_DIR) -> dict[str, Toolchain]:
+    go_env = _go_env(root)
+    return {
+        "c": Toolchain(
+            "c",
+            "main.c",
+            ["cc", *BUILD_CFLAGS, "-o", "{out}", "{src}", "-lm"],
+            ["cc", "--version"],
+        ),
+        "cpp": Toolchain(
+            "cpp",
+            "main.cpp",
+            ["c++", *BUILD_CXXFLAGS, "-o", "{out}", "{src}"],
+            ["c++", "--version"],
+        ),
+        "go": Toolchain(
+            "go",
+            "main.go",
+            ["go", "build", "-o", "{out}", "{src}"],
+            ["go", "version"],
+            go_env,
+            [go_env["GOCACHE"], go_env["GOPATH"]],
+        ),
+        "rust": Toolchain(
+            "rust",
+            "main.rs",
+            ["rustc", *BUILD_RUSTFLAGS, "-o", "{out}", "{src}"],
+            ["rustc", "--version"],
+        ),
+    }
+
+
+def available_toolchains(
+    languages: list[str] = COMPILED_LANGUAGES, root: str = BUILD_DIR
+) -> dict[str, Toolchain]:
+    """Toolchains for ``languages`` whose compiler is installed."""
+    toolchains = default_toolchains(root)
+    available = {}
+    for language in languages:
+        toolchain = toolchains.get(language)
+        if toolchain is None:
+            logger.warning(f"Unknown compiled language: {language}")
+        elif toolchain.available():
+            available[language] = toolchain
+    return available
+
+
+def _disk_usage(paths: list[str]) -> int:
+    total = 0
+    for path in paths:
+        for directory, _, names in os.walk(path):
+            for name in names:
+                try:
+                    total += os.lstat(os.path.join(directory, name)).st_size
+                except FileNotFoundError:
+                    pass
+    return total
+
+
+class BuildCache:
+    """Binaries on local disk by build key, bounded in total size.
+
+    Binaries in use are pinned and never evicted, and concurrent requests
+    for the same build wait for a single compiler run. Toolchain caches are
+    measured after each build and count towards the size; once evicting
+    binaries isn't enough, the caches of toolchains not compiling are
+    cleared.
+    """
+
+    def __init__(
+        self, root: str = BUILD_DIR, max_bytes: int = BUILD_CACHE_MB * 1024 * 1024
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.evicted = 0
+        self.caches_cleared = 0
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        # Toolchain caches by language: their directories, size and how many
+        # compilers are using them
+        self._caches: dict[str, list[str]] = {}
+        self._cache_sizes: dict[str, int] = {}
+        self._compiling: dict[str, int] = {}
+        self._pins: dict[str, int] = {}
+        self._building: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # Binaries left by an earlier process on this instance
+        for name in os.listdir(root):
+            if DIGEST.match(name):
+                size = os.path.getsize(os.path.join(root, name))
+                self._sizes[name] = size
+                self.total += size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _pin(self, key: str) -> bool:
+        """Pin a cached binary; False if it isn't cached. Caller holds the lock."""
+        if key not in self._sizes:
+            return False
+        self._sizes.move_to_end(key)
+        self._pins[key] = self._pins.get(key, 0) + 1
+        return True
+
+    def _unpin(self, key: str) -> None:
+        with self._lock:
+            self._pins[key] -= 1
+            if not self._pins[key]:
+                del self._pins[key]
+            self._evict()
+
+    @contextmanager
+    def binary(
+        self,
+        toolchain: Toolchain,
+        source: str,
+        timings: dict | None = None,
+        call: Call | None = None,
+        timeout: float = BUILD_TIMEOUT,
+    ):
+        """Yield the path of the built snippet, compiling it unless cached.
+
+        The seconds spent compiling are stored under ``timings["build"]``.
+        Raises BuildFailed, or cancellation.Cancelled if ``call`` is
+        cancelled while compiling.
+        """
+        key = toolchain.key(source)
+        with self._lock:
+            cached = self._pin(key)
+            if cached:
+                self.hits += 1
+            else:
+                building = self._building.setdefault(key, threading.Lock())
+        if not cached:
+            try:
+                with building:
+                    with self._lock:
+                        # Built by the request we waited for
+                        cached = self._pin(key)
+                        if cached:
+                            self.hits += 1
+                        else:
+                            self.misses += 1
+                    if not cached:
+                        self._compile(toolchain, source, key, timings, call, timeout)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        try:
+            yield self._path(key)
+        finally:
+            self._unpin(key)
+
+    def _compile(
+        self,
+        toolchain: Toolchain,
+        source: str,
+        key: str,
+        timings: dict | None,
+        call: Call | None,
+        timeout: float,
+    ) -> None:
+        """Build into the cache and pin the result."""
+        workdir = tempfile.mkdtemp(dir=self.root, prefix=".build-")
+        try:
+            src = os.path.join(workdir, toolchain.source)
+            out = os.path.join(workdir, "snippet")
+            with open(src, "w") as f:
+                f.write(source)
+            cmd = [
+                arg.replace("{src}", src).replace("{out}", out)
+                for arg in toolchain.command
+            ]
+            cmd, preexec_fn = BUILD_LIMITS.apply(cmd)
+            env = {**os.environ, **toolchain.env}
+
+            logger.info(f"Compiling {toolchain.language} snippet {key[:12]}")
+            started = time.monotonic()
+            with self._toolchain_cache(toolchain):
+                proc = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    cwd=workdir,
+                    env=env,
+                    preexec_fn=preexec_fn,  # noqa: PLW1509
+                )
+                try:
+                    with (
+                        call.on_cancel(proc.kill) if call is not None else nullcontext()
+                    ):
+                        output, _ = proc.communicate(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.communicate()
+                    with self._lock:
+                        self.failures += 1
+                    raise BuildFailed(f"timed out after {timeout} seconds", -1)
+                finally:
+                    if timings is not None:
+                        timings["build"] = time.monotonic() - started
+            if call is not None and call.cancelled:
+                raise Cancelled()
+            if proc.returncode != 0:
+                with self._lock:
+                    self.failures += 1
+                text = output.decode("utf-8", errors="replace").replace(
+                    workdir + os.sep, ""
+                )
+                raise BuildFailed(text[-MAX_BUILD_OUTPUT:], proc.returncode)
+
+            size = os.path.getsize(out)
+            os.replace(out, self._path(key))
+            with self._lock:
+                if key not in self._sizes:
+                    self._sizes[key] = size
+                    self.total += size
+                self._pin(key)
+                self._evict()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    @contextmanager
+    def _toolchain_cache(self, toolchain: Toolchain):
+        """Keep the toolchain's caches while the block compiles, then
+        account for their new size."""
+        if not toolchain.caches:
+            yield
+            return
+        language = toolchain.language
+        with self._lock:
+            self._caches[language] = toolchain.caches
+            self._compiling[language] = self._compiling.get(language, 0) + 1
+        try:
+            yield
+        finally:
+            size = _disk_usage(toolchain.caches)
+            with self._lock:
+                self._compiling[language] -= 1
+                self.total += size - self._cache_sizes.get(language, 0)
+                self._cache_sizes[language] = size
+                self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used unpinned binaries while over size,
+        then idle toolchain caches, largest first. Caller holds the lock."""
+        for key in list(self._sizes):
+            if self.total <= self.max_bytes:
+                break
+            if key in self._pins:
+                continue
+            self.total -= self._sizes.pop(key)
+            self.evicted += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+        for language, size in sorted(
+            self._cache_sizes.items(), key=lambda item: -item[1]
+        ):
+            if self.total <= self.max_bytes:
+                break
+            if not size or self._compiling.get(language):
+                continue
+            self.total -= size
+            self._cache_sizes[language] = 0
+            self.caches_cleared += 1
+            for path in self._caches[language]:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "binaries": len(self._sizes),
+                "bytes": self.total,
+                "cache_bytes": sum(self._cache_sizes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "evicted": self.evicted,
+                "caches_cleared": self.caches_cleared,
+            }
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    from .tracing import Trace
+except ImportError:  # loaded as a top-level module by functions-framework
+    from tracing import Trace
+
+logger = logging.getLogger(__name__)
+
+# Set by the client on every request: an id to cancel it by, and how many
+# milliseconds it will wait for the answer
+REQUEST_ID_HEADER = "X-Request-Id"
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+# Cancellations that arrive before their request are remembered, this many
+# at most
+MAX_EARLY_CANCELS = 1024
+
+
+class Cancelled(Exception):
+    """The run's request was cancelled and its process killed."""
+
+
+class Call:
+    """One executor request: its id, when the caller stops waiting for it,
+    whether it has been cancelled, and its trace if the caller traces it."""
+
+    def __init__(
+        self,
+        request_id: str | None = None,
+        deadline: float | None = None,
+        trace: Trace | None = None,
+    ):
+        self.request_id = request_id
+        self.deadline = deadline
+        self.trace = trace
+        self.cancelled = False
+        self._kills = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_headers(cls, headers) -> "Call":
+        deadline = None
+        value = headers.get(DEADLINE_HEADER)
+        if value:
+            try:
+                deadline = time.monotonic() + float(value) / 1000
+            except ValueError:
+                logger.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {value}")
+        return cls(
+            headers.get(REQUEST_ID_HEADER) or None,
+            deadline,
+            Trace.from_headers(headers),
+        )
+
+    def timeout(self, limit: float) -> float:
+        """``limit`` cut short to the seconds left before the deadline."""
+        if self.deadline is None:
+            return limit
+        remaining = self.deadline - time.monotonic()
+        if remaining >= limit:
+            return limit
+        return max(round(remaining, 1), 0)
+
+    @contextmanager
+    def on_cancel(self, kill):
+        """Call kill() if the request is cancelled while the block runs,
+        or right away if it already was."""
+        with self._lock:
+            cancelled = self.cancelled
+            if not cancelled:
+                self._kills.append(kill)
+        if cancelled:
+            _kill(kill)
+        try:
+            yield
+        finally:
+            with self._lock:
+                if kill in self._kills:
+                    self._kills.remove(kill)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            kills, self._kills = self._kills, []
+        for kill in kills:
+            _kill(kill)
+
+
+def _kill(kill) -> None:
+    try:
+        kill()
+    except ProcessLookupError:
+        # Already gone
+        pass
+
+
+class CallRegistry:
+    """Calls in progress, by request id, so the cancel action can find them."""
+
+    def __init__(self, max_early: int = MAX_EARLY_CANCELS):
+        self.max_early = max_early
+        self.cancelled = 0
+        self._calls: dict[str, Call] = {}
+        self._early: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, call: Call) -> None:
+        if call.request_id is None:
+            return
+        with self._lock:
+            self._calls[call.request_id] = call
+            early = call.request_id in self._early
+            if early:
+                del self._early[call.request_id]
+        if early:
+            call.cancel()
+
+    def discard(self, call: Call) -> None:
+        with self._lock:
+            if self._calls.get(call.request_id) is call:
+                del self._calls[call.request_id]
+
+    def cancel(self, request_id: str) -> bool:
+        """Cancel the call; False if it isn't running (yet)."""
+        with self._lock:
+            call = self._calls.get(request_id)
+            if call is None:
+                self._early[request_id] = None
+                while len(self._early) > self.max_early:
+                    self._early.popitem(last=False)
+                return False
+            self.cancelled += 1
+        call.cancel()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active": len(self._calls), "cancelled": self.cancelled}
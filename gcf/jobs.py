@@ -0,0 +1,134 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .admission import AdmissionRejected
+except ImportError:  # loaded as a top-level module by functions-framework
+    from admission import AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+# Jobs run in the background with their own timeout, at most
+# MAX_RUNNING_JOBS at once. They don't take execution slots from the
+# admission controller, so an instance may run MAX_RUNNING_JOBS jobs on top
+# of MAX_CONCURRENT_EXECUTIONS requests. Up to MAX_JOBS are tracked, finished ones
+# included; finished jobs are dropped JOB_RESULT_TTL seconds after they end.
+MAX_RUNNING_JOBS = int(os.getenv("MAX_RUNNING_JOBS", "2"))
+MAX_JOBS = int(os.getenv("MAX_JOBS", "64"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "600"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+# Longest a get_job request waits for the job to finish, kept below the
+# client's request timeout
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "25"))
+
+
+class JobError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "pending"
+        self.submitted = time.monotonic()
+        self.finished: float | None = None
+        self.result: dict | None = None
+        self.done = threading.Event()
+
+    def snapshot(self) -> dict:
+        end = self.finished if self.finished is not None else time.monotonic()
+        snapshot = {
+            "jobId": self.id,
+            "status": self.status,
+            "elapsedMs": round((end - self.submitted) * 1000, 1),
+        }
+        if self.result is not None:
+            snapshot["result"] = self.result
+        return snapshot
+
+
+class JobManager:
+    """Runs submitted executions in the background and keeps their results
+    for a bounded time."""
+
+    def __init__(
+        self,
+        max_running: int = MAX_RUNNING_JOBS,
+        max_jobs: int = MAX_JOBS,
+        result_ttl: float = JOB_RESULT_TTL,
+        max_wait: float = JOB_MAX_WAIT,
+    ):
+        self.max_jobs = max_jobs
+        self.result_ttl = result_ttl
+        self.max_wait = max_wait
+        self.submitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_running, thread_name_prefix="job"
+        )
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.result_ttl:
+                del self._jobs[job_id]
+                self.expired += 1
+
+    def submit(self, fn) -> Job:
+        """Run fn() in the background; its return value is the job's result."""
+        with self._lock:
+            self._expire()
+            if len(self._jobs) >= self.max_jobs:
+                self.rejected += 1
+                raise AdmissionRejected(
+                    f"Too many jobs: at most {self.max_jobs} are kept", retry_after=5
+                )
+            job = Job()
+            self._jobs[job.id] = job
+            self.submitted += 1
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn) -> None:
+        job.status = "running"
+        try:
+            result = fn()
+        except Exception as e:  # noqa: BLE001 - the job must finish either way
+            logger.error(f"Job {job.id} failed: {e!s}")
+            result = {"stdout": "", "stderr": f"Execution error: {e!s}", "exitCode": -1}
+        job.result = result
+        job.finished = time.monotonic()
+        job.status = "done"
+        job.done.set()
+
+    def wait(self, job_id: str, timeout: float = 0) -> dict:
+        """Snapshot of the job once it is done or ``timeout`` has passed."""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise JobError(f"Unknown job: {job_id}", status=404)
+        if timeout > 0:
+            job.done.wait(min(timeout, self.max_wait))
+        return job.snapshot()
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "pending": statuses.count("pending"),
+            "running": statuses.count("running"),
+            "done": statuses.count("done"),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
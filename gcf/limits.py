@@ -0,0 +1,97 @@
+import os
+import resource
+import signal
+import subprocess
+
+# Limits applied to every freshly spawned snippet process; 0 disables one.
+# RLIMIT_NPROC counts every process of the user running the function, so the
+# process cap is off unless configured for the deployment.
+CPU_TIME_LIMIT = int(os.getenv("CPU_TIME_LIMIT", "30"))
+MEMORY_LIMIT_MB = int(os.getenv("MEMORY_LIMIT_MB", "1024"))
+MAX_PROCESSES = int(os.getenv("MAX_PROCESSES", "0"))
+MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "64"))
+
+
+class ResourceLimits:
+    def __init__(
+        self,
+        cpu_seconds: int = CPU_TIME_LIMIT,
+        memory_mb: int = MEMORY_LIMIT_MB,
+        max_processes: int = MAX_PROCESSES,
+        file_size_mb: int = MAX_FILE_SIZE_MB,
+    ):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_processes = max_processes
+        self.file_size_mb = file_size_mb
+
+    def apply(self, cmd: list[str]) -> tuple[list[str], object]:
+        """Return cmd and a preexec_fn that sets these limits in the child."""
+        limits = []
+        if self.cpu_seconds > 0:
+            # The soft limit sends SIGXCPU, the hard limit a second later SIGKILL
+            limits.append((resource.RLIMIT_CPU, self.cpu_seconds, self.cpu_seconds + 1))
+        if self.memory_mb > 0:
+            if os.path.basename(cmd[0]) == "node":
+                # V8 reserves far more address space than it uses, so cap its
+                # heap instead of RLIMIT_AS
+                cmd = [cmd[0], f"--max-old-space-size={self.memory_mb}"] + cmd[1:]
+            else:
+                limit = self.memory_mb * 1024 * 1024
+                limits.append((resource.RLIMIT_AS, limit, limit))
+        if self.max_processes > 0:
+            limits.append(
+                (resource.RLIMIT_NPROC, self.max_processes, self.max_processes)
+            )
+        if self.file_size_mb > 0:
+            limit = self.file_size_mb * 1024 * 1024
+            limits.append((resource.RLIMIT_FSIZE, limit, limit))
+
+        if not limits:
+            return cmd, None
+
+        def set_limits():
+            for which, soft, hard in limits:
+                resource.setrlimit(which, (soft, hard))
+
+        return cmd, set_limits
+
+
+DEFAULT_LIMITS = ResourceLimits()
+
+
+class MeasuredPopen(subprocess.Popen):
+    """Popen that keeps the child's resource usage when it is reaped."""
+
+    rusage = None
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, sts, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # Same fallback as Popen: the child was reaped elsewhere
+            return self.pid, 0
+        if pid == self.pid:
+            self.rusage = rusage
+        return pid, sts
+
+
+def usage_report(rusage, wall: float) -> dict:
+    usage = {"wallMs": round(wall * 1000, 1)}
+    if rusage is not None:
+        usage.update(
+            cpuUserMs=round(rusage.ru_utime * 1000, 1),
+            cpuSysMs=round(rusage.ru_stime * 1000, 1),
+            # ru_maxrss is in kilobytes on Linux
+            maxRssKb=rusage.ru_maxrss,
+        )
+    return usage
+
+
+def describe_exit(exit_code: int) -> str | None:
+    """Explain exits caused by a resource limit rather than the code."""
+    if exit_code == -signal.SIGXCPU:
+        return "CPU time limit exceeded"
+    if exit_code == -signal.SIGXFSZ:
+        return "File size limit exceeded"
+    return None
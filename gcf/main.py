@@ -1,7 +1,73 @@
-import subprocess
 import json
 import logging
-from flask import jsonify
+import math
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+
+from flask import Response, jsonify
+
+try:
+    from .admission import AdmissionController, AdmissionRejected
+    from .blobs import BlobError, BlobStore, MissingBlobs, Workspace, validate_files
+    from .builds import BUILD_TIMEOUT, BuildCache, BuildFailed, available_toolchains
+    from .cancellation import Call, CallRegistry, Cancelled
+    from .jobs import JOB_TIMEOUT, JobError, JobManager
+    from .limits import DEFAULT_LIMITS, ResourceLimits
+    from .metrics import (
+        StageMetrics,
+        StageTimer,
+        outcome_of,
+        outcome_of_status,
+        render_gauges,
+    )
+    from .output import MAX_OUTPUT_BYTES, run_process
+    from .pool import create_pools
+    from .profiling import PROFILED_LANGUAGES, Profiler
+    from .sessions import SessionError, SessionManager
+    from .streaming import stream_process
+    from .tracing import SPANS_HEADER
+    from .wire import (
+        PLAIN,
+        RequestTooLarge,
+        ResponseEncoder,
+        UnsupportedMediaType,
+        advertise,
+        read_request,
+    )
+    from .zygote import Zygote
+except ImportError:  # loaded as a top-level module by functions-framework
+    from admission import AdmissionController, AdmissionRejected
+    from blobs import BlobError, BlobStore, MissingBlobs, Workspace, validate_files
+    from builds import BUILD_TIMEOUT, BuildCache, BuildFailed, available_toolchains
+    from cancellation import Call, CallRegistry, Cancelled
+    from jobs import JOB_TIMEOUT, JobError, JobManager
+    from limits import DEFAULT_LIMITS, ResourceLimits
+    from metrics import (
+        StageMetrics,
+        StageTimer,
+        outcome_of,
+        outcome_of_status,
+        render_gauges,
+    )
+    from output import MAX_OUTPUT_BYTES, run_process
+    from pool import create_pools
+    from profiling import PROFILED_LANGUAGES, Profiler
+    from sessions import SessionError, SessionManager
+    from streaming import stream_process
+    from tracing import SPANS_HEADER
+    from wire import (
+        PLAIN,
+        RequestTooLarge,
+        ResponseEncoder,
+        UnsupportedMediaType,
+        advertise,
+        read_request,
+    )
+    from zygote import Zygote
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -10,62 +76,708 @@ TIMEOUT = 30
 SUPPORTED_LANGUAGES = {
     "python": ["python", "-c"],
     "javascript": ["node", "-e"],
-    "bash": ["bash", "-c"]
+    "bash": ["bash", "-c"],
 }
 
+# Compiled languages whose compiler is installed (COMPILED_LANGUAGES). Each
+# snippet is built once; repeat runs take the binary from the build cache.
+TOOLCHAINS = available_toolchains()
+BUILDS = BuildCache()
+
+# Executions beyond MAX_CONCURRENT_EXECUTIONS wait in a queue of at most
+# MAX_QUEUED_EXECUTIONS for up to QUEUE_TIMEOUT seconds; past that the
+# request is turned away with 429 and a Retry-After hint.
+MAX_CONCURRENT_EXECUTIONS = int(
+    os.getenv("MAX_CONCURRENT_EXECUTIONS", str(os.cpu_count() or 1))
+)
+MAX_QUEUED_EXECUTIONS = int(os.getenv("MAX_QUEUED_EXECUTIONS", "32"))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "10"))
+
+# Per-stage latency histograms, served in Prometheus format on GET /metrics
+METRICS = StageMetrics("executor_stage_seconds")
+
+ADMISSION = AdmissionController(
+    MAX_CONCURRENT_EXECUTIONS, MAX_QUEUED_EXECUTIONS, QUEUE_TIMEOUT
+)
+
+# Sessions keep an interpreter (and its globals) alive between requests.
+# Every request must reach the same instance, so deploy with a single
+# instance when relying on them.
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "4"))
+SESSION_MEMORY_MB = int(os.getenv("SESSION_MEMORY_MB", "512"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "600"))
+
+SESSIONS = SessionManager(MAX_SESSIONS, SESSION_MEMORY_MB, SESSION_IDLE_TIMEOUT)
+SESSIONS.start_reaper()
+
+# Batch requests run up to MAX_BATCH_SIZE snippets in one round trip, with
+# at most BATCH_MAX_PARALLEL of them at once when parallel is requested.
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "50"))
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+# Warm interpreter pool, disabled unless WORKER_POOL_SIZE is set. Python and
+# JavaScript snippets then run in pre-started workers instead of paying
+# interpreter startup on every request; bash is always spawned directly.
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "0"))
+WORKER_POOL_MIN = int(os.getenv("WORKER_POOL_MIN", "1"))
+WORKER_MAX_USES = int(os.getenv("WORKER_MAX_USES", "100"))
+WORKER_IDLE_TIMEOUT = float(os.getenv("WORKER_IDLE_TIMEOUT", "300"))
+
+# Pooled workers get the memory, process and file size limits; CPU time would
+# accumulate across runs, so they rely on TIMEOUT alone.
+POOL_LIMITS = ResourceLimits(cpu_seconds=0)
+
+POOLS = {}
+if WORKER_POOL_SIZE > 0:
+    POOLS = create_pools(
+        WORKER_POOL_SIZE,
+        WORKER_POOL_MIN,
+        WORKER_MAX_USES,
+        WORKER_IDLE_TIMEOUT,
+        POOL_LIMITS,
+    )
+
+# Python snippets fork from a zygote process that imported ZYGOTE_PRELOAD
+# once, instead of starting an interpreter and importing them on every run.
+# Off unless ZYGOTE is set; a configured worker pool takes precedence.
+ZYGOTE_ENABLED = os.getenv("ZYGOTE", "").lower() in ("1", "true", "yes")
+ZYGOTE_PRELOAD = [
+    m.strip() for m in os.getenv("ZYGOTE_PRELOAD", "").split(",") if m.strip()
+]
+
+PYTHON_ZYGOTE = None
+if ZYGOTE_ENABLED:
+    PYTHON_ZYGOTE = Zygote(ZYGOTE_PRELOAD, DEFAULT_LIMITS)
+    # Pay for the imports while the instance starts, not on the first run
+    threading.Thread(target=PYTHON_ZYGOTE.start, daemon=True).start()
+
+# Input files, stored by content hash so clients send each one only once
+BLOBS = BlobStore()
+
+# Runs submitted with "async": true execute in the background under
+# JOB_TIMEOUT; clients collect the result with the get_job action. They run
+# in the manager's own MAX_RUNNING_JOBS threads, outside ADMISSION.
+JOBS = JobManager()
+
+# A job may use the CPU for as long as it may run
+JOB_LIMITS = ResourceLimits(
+    cpu_seconds=max(DEFAULT_LIMITS.cpu_seconds, math.ceil(JOB_TIMEOUT))
+    if DEFAULT_LIMITS.cpu_seconds > 0
+    else 0
+)
+
+# Requests in progress, so a client that gives up can have its run killed
+# with {"action": "cancel", "requestId": ...}
+CALLS = CallRegistry()
+
+
+def validate_snippet(snippet) -> str | None:
+    if not isinstance(snippet, dict):
+        return "Invalid snippet: expected an object with code and language"
+
+    if not snippet.get("code"):
+        return "Missing required field: code"
+
+    language = snippet.get("language")
+    if not language:
+        return "Missing required field: language"
+
+    if language not in SUPPORTED_LANGUAGES and language not in TOOLCHAINS:
+        return f"Unsupported language: {language}"
+
+    timeout = snippet.get("timeout")
+    if timeout is not None and (
+        isinstance(timeout, bool)
+        or not isinstance(timeout, (int, float))
+        or timeout <= 0
+    ):
+        return "Field timeout must be a positive number of seconds"
+
+    if snippet.get("profile"):
+        if snippet.get("sessionId"):
+            return "Profiling is not supported in sessions"
+        if language not in PROFILED_LANGUAGES:
+            return f"Profiling is not supported for {language}"
+
+    if "files" in snippet or snippet.get("collectFiles"):
+        if snippet.get("sessionId"):
+            return "Files are not supported in sessions"
+        return validate_files(snippet.get("files", {}))
+
+    return None
+
+
+def open_workspace(request_json: dict):
+    """A Workspace when the request sends or collects files, else a no-op
+    context yielding None."""
+    if "files" not in request_json and not request_json.get("collectFiles"):
+        return nullcontext()
+    return Workspace(BLOBS, request_json.get("files", {}))
+
+
+def not_started(call: Call) -> dict:
+    """Result for a run that was cancelled or out of time before it began."""
+    return {
+        "stdout": "",
+        "stderr": "Code execution cancelled"
+        if call.cancelled
+        else "Deadline exceeded before the code ran",
+        "exitCode": -1,
+    }
+
+
+def run_snippet(
+    code: str,
+    language: str,
+    usage: bool = False,
+    cwd: str | None = None,
+    timeout: float = TIMEOUT,
+    call: Call | None = None,
+    profile: bool = False,
+    limits: ResourceLimits = DEFAULT_LIMITS,
+) -> dict:
+    timings = {}
+    result = _run_snippet(
+        code, language, usage, timings, cwd, timeout, call, profile, limits
+    )
+    if call is not None and call.trace is not None:
+        call.trace.add_stages(timings)
+    outcome = outcome_of(result)
+    for stage, seconds in timings.items():
+        METRICS.observe(stage, seconds, language, outcome)
+    return result
+
+
+def _run_snippet(
+    code: str,
+    language: str,
+    usage: bool,
+    timings: dict,
+    cwd: str | None = None,
+    timeout: float = TIMEOUT,
+    call: Call | None = None,
+    profile: bool = False,
+    limits: ResourceLimits = DEFAULT_LIMITS,
+) -> dict:
+    # Don't run past the point where the client stops waiting
+    call = call or Call()
+    timeout = call.timeout(timeout)
+    if call.cancelled or timeout <= 0:
+        return not_started(call)
+
+    logger.info(f"Executing {language} code")
 
-def execute_code(request):
     try:
-        request_json = request.get_json()
-        
-        if not request_json:
-            return jsonify({"error": "Invalid request body"}), 400
-        
-        code = request_json.get("code")
+        toolchain = TOOLCHAINS.get(language)
+        if toolchain is not None:
+            with BUILDS.binary(
+                toolchain, code, timings, call, call.timeout(BUILD_TIMEOUT)
+            ) as binary:
+                # Compiling counts against the deadline too
+                timeout = call.timeout(timeout)
+                return run_process(
+                    [binary],
+                    timeout,
+                    MAX_OUTPUT_BYTES,
+                    limits,
+                    usage,
+                    timings,
+                    cwd,
+                    call,
+                )
+
+        if profile:
+            # Pooled workers and the zygote would run the code outside the profiler
+            with Profiler(language) as profiler:
+                cmd = profiler.command(code)
+                result = run_process(
+                    cmd, timeout, MAX_OUTPUT_BYTES, limits, usage, timings, cwd, call
+                )
+                summary = profiler.summary()
+            if summary is not None:
+                result["profile"] = summary
+            return result
+
+        # Pooled workers can't change directory for a single run
+        pool = POOLS.get(language) if cwd is None else None
+        if pool is not None:
+            return pool.run(code, timeout, usage, timings, call)
+
+        if language == "python" and PYTHON_ZYGOTE is not None:
+            return PYTHON_ZYGOTE.run(
+                code, timeout, MAX_OUTPUT_BYTES, usage, timings, cwd, call, limits
+            )
+
+        cmd = SUPPORTED_LANGUAGES[language] + [code]
+        return run_process(
+            cmd, timeout, MAX_OUTPUT_BYTES, limits, usage, timings, cwd, call
+        )
+
+    except BuildFailed as e:
+        return e.result
+
+    except Cancelled:
+        logger.info(f"Cancelled {language} run {call.request_id}")
+        return {"stdout": "", "stderr": "Code execution cancelled", "exitCode": -1}
+
+    except subprocess.TimeoutExpired:
+        return {
+            "stdout": "",
+            "stderr": f"Code execution timed out after {timeout} seconds",
+            "exitCode": -1,
+        }
+
+    except Exception as e:
+        logger.error(f"Execution error: {e!s}")
+        return {"stdout": "", "stderr": f"Execution error: {e!s}", "exitCode": -1}
+
+
+def run_batch(
+    snippets: list, parallel: bool, usage: bool = False, call: Call | None = None
+) -> list[dict]:
+    def run_one(snippet):
+        error = validate_snippet(snippet)
+        if not error:
+            # Batch snippets run without a workspace or session
+            unsupported = [
+                field
+                for field in ("sessionId", "files", "collectFiles")
+                if field in snippet
+            ]
+            if unsupported:
+                error = f"Field {unsupported[0]} is not supported in batch snippets"
+        if error:
+            return {"error": error}
+        timeout = min(TIMEOUT, snippet.get("timeout", TIMEOUT))
+        profile = bool(snippet.get("profile", False))
+        return run_snippet(
+            snippet["code"],
+            snippet["language"],
+            usage,
+            timeout=timeout,
+            call=call,
+            profile=profile,
+        )
+
+    if not parallel or len(snippets) == 1:
+        return [run_one(snippet) for snippet in snippets]
+
+    # The batch already holds one slot; every extra concurrent snippet
+    # needs another, so it never runs more than admission allows
+    with ADMISSION.borrow(min(BATCH_MAX_PARALLEL, len(snippets)) - 1) as extra:
+        if not extra:
+            return [run_one(snippet) for snippet in snippets]
+        with ThreadPoolExecutor(max_workers=extra + 1) as executor:
+            return list(executor.map(run_one, snippets))
+
+
+def execute_batch(
+    request_json: dict,
+    timer: StageTimer,
+    encoder: ResponseEncoder = PLAIN,
+    call: Call | None = None,
+):
+    snippets = request_json["batch"]
+
+    if not isinstance(snippets, list) or not snippets:
+        return jsonify({"error": "Field batch must be a non-empty list"}), 400
+
+    if len(snippets) > MAX_BATCH_SIZE:
+        return jsonify(
+            {"error": f"Batch too large: at most {MAX_BATCH_SIZE} snippets"}
+        ), 400
+
+    parallel = bool(request_json.get("parallel", False))
+    logger.info(f"Executing batch of {len(snippets)} snippets (parallel={parallel})")
+
+    usage = bool(request_json.get("usage", False))
+    results = run_batch(snippets, parallel, usage, call)
+
+    started = time.perf_counter()
+    response = encoder.response({"results": results})
+    timer.add("serialize", time.perf_counter() - started)
+    return response, 200
+
+
+def stream_command(
+    code: str,
+    language: str,
+    resources: ExitStack,
+    timings: dict,
+    call: Call,
+    profile: bool = False,
+) -> tuple[list[str], Profiler | None]:
+    """Command for a streamed run, and its profiler when profiled. Compiled
+    snippets are built first, and their binary stays pinned in the build
+    cache until ``resources`` close."""
+    if profile:
+        profiler = resources.enter_context(Profiler(language))
+        return profiler.command(code), profiler
+    toolchain = TOOLCHAINS.get(language)
+    if toolchain is None:
+        return SUPPORTED_LANGUAGES[language] + [code], None
+    return [
+        resources.enter_context(
+            BUILDS.binary(toolchain, code, timings, call, call.timeout(BUILD_TIMEOUT))
+        )
+    ], None
+
+
+def execute_stream(
+    code: str,
+    language: str,
+    timer: StageTimer,
+    usage: bool = False,
+    request_json: dict | None = None,
+    call: Call | None = None,
+):
+    """Stream output as NDJSON events while the process runs.
+
+    Streamed runs always spawn a fresh process: pooled workers only report
+    output once the code has finished. Collected files are sent with the
+    final event.
+    """
+    request_json = request_json or {}
+    call = call or Call()
+    # The workspace and the slot are held until the stream ends, not just
+    # until it starts
+    resources = ExitStack()
+    workspace = resources.enter_context(open_workspace(request_json))
+    try:
+        wait = ADMISSION.acquire()
+    except BaseException:
+        resources.close()
+        raise
+    timer.add("queue_wait", wait)
+    started = time.monotonic()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            ADMISSION.release(time.monotonic() - started)
+            resources.close()
+
+    logger.info(f"Streaming {language} code")
+
+    def generate():
+        timings = {}
+        final = {"exitCode": -1}
+        profiler = None
+        try:
+            cwd = workspace.path if workspace is not None else None
+            timeout = call.timeout(min(TIMEOUT, request_json.get("timeout", TIMEOUT)))
+            if call.cancelled or timeout <= 0:
+                events = [
+                    {"stream": "stderr", "data": not_started(call)["stderr"]},
+                    {"exitCode": -1},
+                ]
+            else:
+                try:
+                    cmd, profiler = stream_command(
+                        code,
+                        language,
+                        resources,
+                        timings,
+                        call,
+                        bool(request_json.get("profile", False)),
+                    )
+                    events = stream_process(
+                        cmd,
+                        call.timeout(timeout),
+                        MAX_OUTPUT_BYTES,
+                        DEFAULT_LIMITS,
+                        usage,
+                        timings,
+                        cwd,
+                        call,
+                    )
+                except BuildFailed as e:
+                    events = [
+                        {"stream": "stderr", "data": e.result["stderr"]},
+                        {"exitCode": e.result["exitCode"]},
+                    ]
+                except Cancelled:
+                    events = [
+                        {"stream": "stderr", "data": "Code execution cancelled"},
+                        {"exitCode": -1},
+                    ]
+            for event in events:
+                if "exitCode" in event:
+                    final = event
+                    if workspace is not None and request_json.get("collectFiles"):
+                        event["files"] = workspace.collect()
+                    summary = profiler.summary() if profiler is not None else None
+                    if summary is not None:
+                        event["profile"] = summary
+                    if call.trace is not None:
+                        # Headers went out before the run started
+                        call.trace.add_stages(timings)
+                        event["trace"] = call.trace.spans
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logger.error(f"Execution error: {e!s}")
+            yield (
+                json.dumps({"stream": "stderr", "data": f"Execution error: {e!s}"})
+                + "\n"
+            )
+            yield json.dumps({"exitCode": -1}) + "\n"
+        finally:
+            release()
+            for stage, seconds in timings.items():
+                timer.add(stage, seconds)
+            timer.finish(outcome_of(final))
+
+    response = Response(generate(), mimetype="application/x-ndjson")
+    # Runs even if the client goes away before the first chunk
+    response.call_on_close(release)
+    response.headers["X-Queue-Wait-Ms"] = f"{wait * 1000:.1f}"
+    return response, 200
+
+
+def run_in_workspace(
+    request_json: dict,
+    workspace: Workspace | None,
+    timeout: float = TIMEOUT,
+    call: Call | None = None,
+    limits: ResourceLimits = DEFAULT_LIMITS,
+) -> dict:
+    usage = bool(request_json.get("usage", False))
+    profile = bool(request_json.get("profile", False))
+    cwd = workspace.path if workspace is not None else None
+    # The request may ask for less time than the executor allows
+    timeout = min(timeout, request_json.get("timeout", timeout))
+    result = run_snippet(
+        request_json["code"],
+        request_json["language"],
+        usage,
+        cwd,
+        timeout,
+        call,
+        profile,
+        limits,
+    )
+    if workspace is not None and request_json.get("collectFiles"):
+        result["files"] = workspace.collect()
+    return result
+
+
+def execute_single(
+    request_json: dict,
+    timer: StageTimer,
+    encoder: ResponseEncoder = PLAIN,
+    call: Call | None = None,
+):
+    usage = bool(request_json.get("usage", False))
+    if request_json.get("sessionId"):
+        call = call or Call()
+        timeout = call.timeout(min(TIMEOUT, request_json.get("timeout", TIMEOUT)))
+        if call.cancelled or timeout <= 0:
+            # A session run that times out closes the session
+            result = not_started(call)
+        else:
+            result = SESSIONS.run(
+                request_json["sessionId"],
+                request_json["code"],
+                request_json["language"],
+                timeout,
+                usage,
+                call,
+            )
+    else:
+        with open_workspace(request_json) as workspace:
+            result = run_in_workspace(request_json, workspace, call=call)
+
+    started = time.perf_counter()
+    response = encoder.response(result)
+    timer.add("serialize", time.perf_counter() - started)
+    timer.finish(outcome_of(result))
+    return response, 200
+
+
+def submit_job(request_json: dict):
+    """Start the run in the background and answer 202 with its job id.
+
+    Input files are checked and copied before answering, so a missing blob
+    is still reported as a 409 the client can resend.
+    """
+    if request_json.get("sessionId"):
+        return jsonify({"error": "Async runs are not supported in sessions"}), 400
+    resources = ExitStack()
+    workspace = resources.enter_context(open_workspace(request_json))
+
+    def run():
+        with resources:
+            return run_in_workspace(
+                request_json, workspace, JOB_TIMEOUT, limits=JOB_LIMITS
+            )
+
+    try:
+        job = JOBS.submit(run)
+    except BaseException:
+        resources.close()
+        raise
+    logger.info(f"Submitted {request_json['language']} job {job.id}")
+    return jsonify(job.snapshot()), 202
+
+
+def run_admitted(
+    handler,
+    request_json: dict,
+    timer: StageTimer,
+    encoder: ResponseEncoder = PLAIN,
+    call: Call | None = None,
+):
+    """Run handler in an execution slot and report how long it queued."""
+    with ADMISSION.admit() as wait:
+        timer.add("queue_wait", wait)
+        response, status_code = handler(request_json, timer, encoder, call)
+    response.headers["X-Queue-Wait-Ms"] = f"{wait * 1000:.1f}"
+    return response, status_code
+
+
+def execute_action(request_json: dict):
+    action = request_json["action"]
+
+    if action == "create_session":
         language = request_json.get("language")
-        
-        if not code:
-            return jsonify({"error": "Missing required field: code"}), 400
-        
         if not language:
             return jsonify({"error": "Missing required field: language"}), 400
-        
-        if language not in SUPPORTED_LANGUAGES:
-            return jsonify({"error": f"Unsupported language: {language}"}), 400
-        
-        cmd = SUPPORTED_LANGUAGES[language] + [code]
-        
-        logger.info(f"Executing {language} code")
-        
+        session = SESSIONS.create(language)
+        return jsonify({"sessionId": session.id, "language": session.language}), 200
+
+    if action == "close_session":
+        session_id = request_json.get("sessionId")
+        if not session_id:
+            return jsonify({"error": "Missing required field: sessionId"}), 400
+        if not SESSIONS.close(session_id):
+            return jsonify({"error": f"Unknown session: {session_id}"}), 404
+        return jsonify({"closed": True}), 200
+
+    if action == "get_job":
+        job_id = request_json.get("jobId")
+        if not job_id:
+            return jsonify({"error": "Missing required field: jobId"}), 400
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=TIMEOUT
+            wait = float(request_json.get("wait", 0))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Field wait must be a number of seconds"}), 400
+        return jsonify(JOBS.wait(job_id, wait)), 200
+
+    if action == "cancel":
+        request_id = request_json.get("requestId")
+        if not request_id:
+            return jsonify({"error": "Missing required field: requestId"}), 400
+        return jsonify({"cancelled": CALLS.cancel(request_id)}), 200
+
+    if action == "missing_blobs":
+        digests = request_json.get("digests")
+        if not isinstance(digests, list):
+            return jsonify({"error": "Field digests must be a list"}), 400
+        return jsonify({"missing": BLOBS.missing(digests)}), 200
+
+    if action == "put_blobs":
+        return jsonify({"stored": BLOBS.put_encoded(request_json.get("blobs"))}), 200
+
+    return jsonify({"error": f"Unknown action: {action}"}), 400
+
+
+def execute_metrics():
+    body = METRICS.render()
+    body += render_gauges("executor_admission", ADMISSION.stats())
+    body += render_gauges("executor_sessions", {"active": SESSIONS.count()})
+    body += render_gauges("executor_blobs", BLOBS.stats())
+    body += render_gauges("executor_jobs", JOBS.stats())
+    body += render_gauges("executor_calls", CALLS.stats())
+    body += render_gauges("executor_builds", BUILDS.stats())
+    if PYTHON_ZYGOTE is not None:
+        body += render_gauges("executor_zygote", PYTHON_ZYGOTE.stats())
+    for language, pool in POOLS.items():
+        body += render_gauges(f"executor_pool_{language}", pool.stats())
+    return Response(body, mimetype="text/plain; version=0.0.4"), 200
+
+
+def execute_code(request):
+    if request.method == "GET" and request.path.rstrip("/").endswith("/metrics"):
+        return execute_metrics()
+
+    call = Call.from_headers(request.headers)
+    timer = StageTimer(METRICS, trace=call.trace)
+    CALLS.add(call)
+    response, status_code = dispatch(request, timer, call)
+    advertise(response)
+    # Streamed responses record their stages once the stream ends
+    if response.is_streamed:
+        response.call_on_close(lambda: CALLS.discard(call))
+    else:
+        CALLS.discard(call)
+        timer.finish(outcome_of_status(status_code))
+        if call.trace is not None:
+            response.headers[SPANS_HEADER] = call.trace.header()
+    return response, status_code
+
+
+def dispatch(request, timer: StageTimer, call: Call):
+    try:
+        request_json = read_request(request)
+        encoder = ResponseEncoder(request.headers)
+
+        if not request_json:
+            return jsonify({"error": "Invalid request body"}), 400
+
+        if "blobs" in request_json and "action" not in request_json:
+            # Input files sent along with the run, see execute_action's put_blobs
+            BLOBS.put_encoded(request_json["blobs"])
+
+        if "action" in request_json:
+            timer.language = "action"
+            return execute_action(request_json)
+
+        if "batch" in request_json:
+            timer.language = "batch"
+            timer.add("parse", time.perf_counter() - timer.started)
+            return run_admitted(execute_batch, request_json, timer, encoder, call)
+
+        error = validate_snippet(request_json)
+        if error:
+            return jsonify({"error": error}), 400
+
+        timer.language = request_json["language"]
+        timer.add("parse", time.perf_counter() - timer.started)
+
+        if request_json.get("async"):
+            return submit_job(request_json)
+
+        if request_json.get("stream") and not request_json.get("sessionId"):
+            return execute_stream(
+                request_json["code"],
+                request_json["language"],
+                timer,
+                bool(request_json.get("usage", False)),
+                request_json,
+                call,
             )
-            
-            return jsonify({
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "exitCode": result.returncode
-            }), 200
-            
-        except subprocess.TimeoutExpired:
-            return jsonify({
-                "stdout": "",
-                "stderr": f"Code execution timed out after {TIMEOUT} seconds",
-                "exitCode": -1
-            }), 200
-        
-        except Exception as e:
-            logger.error(f"Execution error: {str(e)}")
-            return jsonify({
-                "stdout": "",
-                "stderr": f"Execution error: {str(e)}",
-                "exitCode": -1
-            }), 200
-    
+
+        return run_admitted(execute_single, request_json, timer, encoder, call)
+
+    except MissingBlobs as e:
+        return jsonify({"error": str(e), "missing": e.missing}), e.status
+
+    except (
+        SessionError,
+        UnsupportedMediaType,
+        RequestTooLarge,
+        BlobError,
+        JobError,
+    ) as e:
+        return jsonify({"error": str(e)}), e.status
+
+    except AdmissionRejected as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+
     except Exception as e:
-        logger.error(f"Request handling error: {str(e)}")
-        return jsonify({"error": f"Server error: {str(e)}"}), 500
\ No newline at end of file
+        logger.error(f"Request handling error: {e!s}")
+        return jsonify({"error": f"Server error: {e!s}"}), 500
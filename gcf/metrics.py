@@ -0,0 +1,146 @@
+import bisect
+import threading
+import time
+
+# Upper bounds in seconds, from sub-millisecond dispatch to the run timeout
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StageMetrics:
+    """Latency histograms keyed by stage, language and outcome.
+
+    Recording is one lock acquisition and a bisect, cheap enough to leave on
+    for every request.
+    """
+
+    def __init__(self, name: str, buckets: tuple = BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self._histograms: dict[tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self, stage: str, seconds: float, language: str = "none", outcome: str = "ok"
+    ) -> None:
+        key = (stage, language, outcome)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def snapshot(self) -> dict[tuple[str, str, str], dict]:
+        with self._lock:
+            return {
+                key: {"count": h.count, "sum": h.sum, "counts": list(h.counts)}
+                for key, h in self._histograms.items()
+            }
+
+    def render(self) -> str:
+        """Render the histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {self.name} Time spent in each stage of a request",
+            f"# TYPE {self.name} histogram",
+        ]
+        for (stage, language, outcome), h in sorted(self.snapshot().items()):
+            labels = f'stage="{stage}",language="{language}",outcome="{outcome}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), h["counts"]):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"{self.name}_sum{{{labels}}} {h['sum']:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(prefix: str, values: dict) -> str:
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+class StageTimer:
+    """Collects the stage durations of one request and records them together
+    once its outcome is known. Stages are also added to ``trace`` as spans
+    ending when they are added."""
+
+    def __init__(self, metrics: StageMetrics, language: str = "none", trace=None):
+        self.metrics = metrics
+        self.language = language
+        self.trace = trace
+        self.stages: dict[str, float] = {}
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self.trace is not None:
+            self.trace.add(stage, seconds)
+
+    def finish(self, outcome: str) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self.stages["total"] = time.perf_counter() - self.started
+        if self.trace is not None:
+            self.trace.add("execute_code", self.stages["total"])
+        for stage, seconds in self.stages.items():
+            self.metrics.observe(stage, seconds, self.language, outcome)
+
+
+def outcome_of(result: dict) -> str:
+    """Classify a run result: ok, error (non-zero exit), failed (timeout or
+    crash) or invalid (rejected before running, e.g. a bad batch snippet)."""
+    if "error" in result:
+        return "invalid"
+    exit_code = result.get("exitCode", 0)
+    if exit_code == 0:
+        return "ok"
+    if exit_code == -1:
+        return "failed"
+    return "error"
+
+
+def outcome_of_status(status_code: int) -> str:
+    if status_code < 400:
+        return "ok"
+    if status_code == 429:
+        return "rejected"
+    if status_code < 500:
+        return "invalid"
+    return "failed"
@@ -0,0 +1,205 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    from .cancellation import Call, Cancelled
+    from .limits import MeasuredPopen, ResourceLimits, describe_exit, usage_report
+except ImportError:  # loaded as a top-level module by functions-framework
+    from cancellation import Call, Cancelled
+    from limits import MeasuredPopen, ResourceLimits, describe_exit, usage_report
+
+# Bytes of output kept per stream: the first half and the last half of the
+# output survive, anything in between is counted and dropped.
+MAX_OUTPUT_BYTES = int(os.getenv("MAX_OUTPUT_BYTES", str(1024 * 1024)))
+CHUNK_SIZE = 65536
+
+
+class RingBuffer:
+    """Fixed-size buffer that keeps the most recent bytes written to it."""
+
+    def __init__(self, size: int):
+        self._buf = bytearray(size)
+        self._pos = 0
+        self._full = False
+
+    def write(self, data: bytes) -> None:
+        size = len(self._buf)
+        if size == 0:
+            return
+        if len(data) >= size:
+            self._buf[:] = data[-size:]
+            self._pos = 0
+            self._full = True
+            return
+        end = self._pos + len(data)
+        if end <= size:
+            self._buf[self._pos : end] = data
+        else:
+            split = size - self._pos
+            self._buf[self._pos :] = data[:split]
+            self._buf[: end - size] = data[split:]
+        if end >= size:
+            self._full = True
+        self._pos = end % size
+
+    def getvalue(self) -> bytes:
+        if not self._full:
+            return bytes(self._buf[: self._pos])
+        return bytes(self._buf[self._pos :] + self._buf[: self._pos])
+
+
+class BoundedBuffer:
+    """Keeps the head and tail of a stream within ``limit`` bytes."""
+
+    def __init__(self, limit: int = MAX_OUTPUT_BYTES):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = None
+        self.total = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > self.head_limit + self.tail_limit
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            if self.tail is None:
+                self.tail = RingBuffer(self.tail_limit)
+            self.tail.write(data)
+
+    def getvalue(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        if self.tail is None:
+            return head
+        tail = self.tail.getvalue().decode("utf-8", errors="replace")
+        if not self.truncated:
+            return head + tail
+        dropped = self.total - self.head_limit - self.tail_limit
+        return f"{head}\n... [{dropped} bytes truncated] ...\n{tail}"
+
+
+def build_result(stdout: BoundedBuffer, stderr: BoundedBuffer, exit_code: int) -> dict:
+    result = {
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "exitCode": exit_code,
+    }
+    if stdout.truncated or stderr.truncated:
+        result["truncated"] = True
+        result["stdoutBytes"] = stdout.total
+        result["stderrBytes"] = stderr.total
+    return result
+
+
+def _drain(pipe, buffer: BoundedBuffer) -> None:
+    with pipe:
+        for chunk in iter(lambda: pipe.read1(CHUNK_SIZE), b""):
+            buffer.write(chunk)
+
+
+def kill_group(proc: subprocess.Popen) -> None:
+    """Kill proc and everything it started; it must lead its own session."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # The whole group is gone already
+        pass
+
+
+def run_process(
+    cmd: list[str],
+    timeout: float,
+    max_output: int = MAX_OUTPUT_BYTES,
+    limits: ResourceLimits | None = None,
+    usage: bool = False,
+    timings: dict | None = None,
+    cwd: str | None = None,
+    call: Call | None = None,
+) -> dict:
+    """Run cmd like subprocess.run(capture_output=True) but keep at most
+    ``max_output`` bytes of each stream in memory.
+
+    ``limits`` are applied to the child. With ``usage``, the result carries
+    the child's CPU time, peak RSS and wall time under ``"usage"``. If
+    ``timings`` is given, the seconds spent starting the process and running
+    it are stored under ``"spawn"`` and ``"execute"``. The process runs in
+    ``cwd`` when given, and is killed if ``call`` is cancelled.
+
+    The process leads its own session, so children it leaves behind are
+    killed with it. Children still holding the pipes when ``timeout`` runs
+    out count as a timeout, even if the process itself has exited.
+
+    Raises subprocess.TimeoutExpired or cancellation.Cancelled after killing
+    the process group.
+    """
+    preexec_fn = None
+    if limits is not None:
+        cmd, preexec_fn = limits.apply(cmd)
+
+    stdout, stderr = BoundedBuffer(max_output), BoundedBuffer(max_output)
+    started = time.monotonic()
+    proc = MeasuredPopen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        preexec_fn=preexec_fn,
+        cwd=cwd,
+        start_new_session=True,
+    )
+    spawned = time.monotonic()
+    deadline = spawned + timeout
+    if timings is not None:
+        timings["spawn"] = spawned - started
+    readers = [
+        threading.Thread(target=_drain, args=(proc.stdout, stdout), daemon=True),
+        threading.Thread(target=_drain, args=(proc.stderr, stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        with (
+            call.on_cancel(lambda: kill_group(proc))
+            if call is not None
+            else nullcontext()
+        ):
+            proc.wait(timeout=timeout)
+            wall = time.monotonic() - started
+            # Background children may still hold the pipes open
+            for reader in readers:
+                reader.join(timeout=max(deadline - time.monotonic(), 0))
+        if call is not None and call.cancelled:
+            raise Cancelled()
+        if any(reader.is_alive() for reader in readers):
+            raise subprocess.TimeoutExpired(cmd, timeout)
+    except (subprocess.TimeoutExpired, Cancelled):
+        kill_group(proc)
+        proc.wait()
+        if timings is not None:
+            timings["execute"] = time.monotonic() - spawned
+        for reader in readers:
+            reader.join(timeout=1)
+        raise
+
+    # Nothing the snippet started outlives its run
+    kill_group(proc)
+    if timings is not None:
+        timings["execute"] = time.monotonic() - spawned
+
+    result = build_result(stdout, stderr, proc.returncode)
+    note = describe_exit(proc.returncode)
+    if note:
+        result["stderr"] += f"\n{note}\n"
+    if usage:
+        result["usage"] = usage_report(proc.rusage, wall)
+    return result
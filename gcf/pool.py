@@ -0,0 +1,268 @@
+import json
+import logging
+import os
+import select
+import subprocess
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+try:
+    from .cancellation import Call, Cancelled
+    from .limits import ResourceLimits
+    from .output import CHUNK_SIZE, MAX_OUTPUT_BYTES
+except ImportError:  # loaded as a top-level module by functions-framework
+    from cancellation import Call, Cancelled
+    from limits import ResourceLimits
+    from output import CHUNK_SIZE, MAX_OUTPUT_BYTES
+
+logger = logging.getLogger(__name__)
+
+WORKER_DIR = Path(__file__).parent
+
+# Commands that start a long-lived worker for each pooled language. The
+# request and response fds are appended as arguments.
+WORKER_COMMANDS = {
+    "python": ["python", str(WORKER_DIR / "worker.py")],
+    "javascript": ["node", str(WORKER_DIR / "worker.js")],
+}
+
+
+# Longest reply line read from a worker: both streams at the output cap, with
+# JSON escaping a byte as up to six characters, plus the other fields
+MAX_REPLY_CHARS = 12 * MAX_OUTPUT_BYTES + CHUNK_SIZE
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+class Worker:
+    def __init__(self, cmd: list[str], preexec_fn=None):
+        request_read, request_write = os.pipe()
+        response_read, response_write = os.pipe()
+        try:
+            self.proc = subprocess.Popen(
+                cmd + [str(request_read), str(response_write)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                pass_fds=(request_read, response_write),
+                preexec_fn=preexec_fn,  # noqa: PLW1509
+            )
+        except Exception:
+            for fd in (request_read, request_write, response_read, response_write):
+                os.close(fd)
+            raise
+        os.close(request_read)
+        os.close(response_write)
+        self.requests = os.fdopen(request_write, "w")
+        self.responses = os.fdopen(response_read, "r")
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self, code: str, timeout: float, usage: bool = False) -> dict:
+        self.uses += 1
+        started = time.monotonic()
+        try:
+            self.requests.write(json.dumps({"code": code, "usage": usage}) + "\n")
+            self.requests.flush()
+        except BrokenPipeError:
+            raise WorkerCrashed("worker exited before accepting code")
+
+        ready, _, _ = select.select([self.responses], [], [], timeout)
+        if not ready:
+            raise subprocess.TimeoutExpired(cmd=self.proc.args, timeout=timeout)
+
+        line = self.responses.readline(MAX_REPLY_CHARS)
+        if not line:
+            raise WorkerCrashed("worker exited while running code")
+        if not line.endswith("\n"):
+            raise RuntimeError("Worker reply exceeded the output limit")
+        result = json.loads(line)
+        if usage:
+            result.setdefault("usage", {})["wallMs"] = round(
+                (time.monotonic() - started) * 1000, 1
+            )
+        return result
+
+    def close(self) -> None:
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+        self.requests.close()
+        self.responses.close()
+
+
+class WorkerPool:
+    """Pre-started interpreters for one language.
+
+    Workers are started on demand up to ``max_size`` while callers are
+    queued, shrink back to ``min_size`` after ``idle_timeout`` seconds
+    without work, and are replaced after ``max_uses`` runs, a timeout or a
+    crash. ``limits`` apply to each worker process as a whole, so a CPU time
+    limit would accumulate across runs and should be left at 0.
+    """
+
+    def __init__(
+        self,
+        cmd: list[str],
+        min_size: int,
+        max_size: int,
+        max_uses: int,
+        idle_timeout: float,
+        limits: ResourceLimits | None = None,
+    ):
+        self.cmd, self.preexec_fn = (
+            limits.apply(cmd) if limits is not None else (cmd, None)
+        )
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self._idle: list[Worker] = []
+        self._size = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+            }
+
+    def warm(self) -> None:
+        """Start workers in the background until ``min_size`` are running."""
+
+        def fill():
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size:
+                        return
+                    self._size += 1
+                try:
+                    worker = Worker(self.cmd, preexec_fn=self.preexec_fn)
+                except OSError as e:
+                    logger.error(f"Could not start worker {self.cmd[0]}: {e!s}")
+                    with self._cond:
+                        self._size -= 1
+                    return
+                self._checkin(worker)
+
+        threading.Thread(target=fill, daemon=True).start()
+
+    def _reap_idle(self) -> list[Worker]:
+        now = time.monotonic()
+        expired = []
+        while self._size - len(expired) > self.min_size and self._idle:
+            oldest = self._idle[0]
+            if now - oldest.last_used < self.idle_timeout:
+                break
+            expired.append(self._idle.pop(0))
+        self._size -= len(expired)
+        return expired
+
+    def _checkout(self) -> Worker:
+        with self._cond:
+            expired = self._reap_idle()
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.max_size:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            worker = self._idle.pop() if self._idle else None
+            if worker is None:
+                self._size += 1
+
+        for stale in expired:
+            stale.close()
+
+        if worker is not None:
+            if worker.alive():
+                return worker
+            # Died while idle: replace it in the slot it already holds
+            worker.close()
+        try:
+            return Worker(self.cmd, preexec_fn=self.preexec_fn)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, worker: Worker) -> None:
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _discard(self, worker: Worker) -> None:
+        worker.close()
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        if self._size < self.min_size:
+            self.warm()
+
+    def run(
+        self,
+        code: str,
+        timeout: float,
+        usage: bool = False,
+        timings: dict | None = None,
+        call: Call | None = None,
+    ) -> dict:
+        """Run code in a worker; ``timings`` and ``call`` as in
+        ``output.run_process``, where spawn is the time taken to check out a
+        worker. A cancelled run kills its worker."""
+        started = time.monotonic()
+        worker = self._checkout()
+        checked_out = time.monotonic()
+        if timings is not None:
+            timings["spawn"] = checked_out - started
+        try:
+            with (
+                call.on_cancel(worker.proc.kill) if call is not None else nullcontext()
+            ):
+                result = worker.run(code, timeout, usage)
+        except WorkerCrashed:
+            worker.proc.wait()
+            self._discard(worker)
+            if call is not None and call.cancelled:
+                raise Cancelled()
+            return {"stdout": "", "stderr": "", "exitCode": worker.proc.returncode}
+        except BaseException:
+            self._discard(worker)
+            raise
+        finally:
+            if timings is not None:
+                timings["execute"] = time.monotonic() - checked_out
+
+        if worker.uses >= self.max_uses or not worker.alive():
+            self._discard(worker)
+        else:
+            worker.last_used = time.monotonic()
+            self._checkin(worker)
+        return result
+
+
+def create_pools(
+    size: int,
+    min_size: int,
+    max_uses: int,
+    idle_timeout: float,
+    limits: ResourceLimits | None = None,
+) -> dict[str, WorkerPool]:
+    pools = {}
+    for language, cmd in WORKER_COMMANDS.items():
+        pools[language] = WorkerPool(
+            cmd, min_size, size, max_uses, idle_timeout, limits
+        )
+        pools[language].warm()
+    return pools
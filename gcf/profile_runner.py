@@ -0,0 +1,48 @@
+"""Runs a Python snippet under cProfile for the executor's profile option.
+
+Behaves like ``python -c CODE`` and writes the pstats data to OUT however
+the snippet finishes, so the profile of a failing run is kept too.
+
+Usage: python profile_runner.py OUT CODE
+"""
+
+import cProfile
+import sys
+import traceback
+
+
+def main() -> int:
+    out, code = sys.argv[1], sys.argv[2]
+    # What the snippet would see under `python -c`
+    sys.argv = ["-c"]
+    sys.path[0] = ""
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    try:
+        compiled = compile(code, "<string>", "exec")
+    except SyntaxError as e:
+        traceback.print_exception(type(e), e, None)
+        return 1
+
+    profiler = cProfile.Profile()
+    error = None
+    try:
+        profiler.enable()
+        try:
+            exec(compiled, namespace)  # noqa: S102
+        finally:
+            profiler.disable()
+    except SystemExit:
+        profiler.dump_stats(out)
+        raise
+    except BaseException as e:  # noqa: BLE001
+        error = e
+    profiler.dump_stats(out)
+    if error is not None:
+        # Drop this module's frame so tracebacks match `python -c`
+        traceback.print_exception(type(error), error, error.__traceback__.tb_next)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import glob
+import json
+import logging
+import os
+import pstats
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Self
+
+logger = logging.getLogger(__name__)
+
+# Runs with "profile": true report their PROFILE_TOP functions with the most
+# self time. Python runs under cProfile, JavaScript under V8's sampling
+# profiler (node --cpu-prof), which counts samples instead of calls.
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "20"))
+PROFILED_LANGUAGES = ("python", "javascript")
+
+RUNNER = str(Path(__file__).parent / "profile_runner.py")
+
+# V8 frames that stand for no function of the snippet
+V8_PSEUDO_FRAMES = {"(root)", "(program)", "(idle)"}
+
+
+def _entry(
+    function: str, self_seconds: float, cumulative_seconds: float, **counts
+) -> dict:
+    return {
+        "function": function,
+        **counts,
+        "selfMs": round(self_seconds * 1000, 3),
+        "cumulativeMs": round(cumulative_seconds * 1000, 3),
+    }
+
+
+def summarize_pstats(path: str, top: int = PROFILE_TOP) -> dict:
+    stats = pstats.Stats(path).stats
+    entries = []
+    total = 0.0
+    for func, (_, calls, self_time, cumulative, callers) in stats.items():
+        # The runner's exec() and disable() calls: their caller started
+        # before profiling did, so they are the only entries without one
+        if not callers:
+            continue
+        total += self_time
+        entries.append(
+            _entry(pstats.func_std_string(func), self_time, cumulative, calls=calls)
+        )
+    entries.sort(key=lambda e: e["selfMs"], reverse=True)
+    return {
+        "profiler": "cProfile",
+        "totalMs": round(total * 1000, 3),
+        "functions": entries[:top],
+    }
+
+
+def summarize_cpuprofile(path: str, top: int = PROFILE_TOP) -> dict:
+    with open(path) as f:
+        profile = json.load(f)
+
+    nodes = {node["id"]: node for node in profile["nodes"]}
+    parents = {}
+    for node in profile["nodes"]:
+        for child in node.get("children", ()):
+            parents[child] = node["id"]
+
+    def label(node: dict) -> str:
+        frame = node["callFrame"]
+        name = frame["functionName"] or "(anonymous)"
+        if name in V8_PSEUDO_FRAMES or not frame["url"]:
+            return name
+        return f"{frame['url']}:{frame['lineNumber'] + 1}({name})"
+
+    # A sample lasts until the next one is taken
+    samples = profile.get("samples", [])
+    deltas = profile.get("timeDeltas", [])
+    durations = deltas[1 : len(samples)] + [0]
+    if samples:
+        last = profile["startTime"] + sum(deltas[: len(samples)])
+        durations[-1] = max(profile["endTime"] - last, 0)
+
+    self_us, cumulative_us, hits = {}, {}, {}
+    total = 0
+    for node_id, duration in zip(samples, durations):
+        node = nodes[node_id]
+        name = label(node)
+        if name in V8_PSEUDO_FRAMES:
+            continue
+        total += duration
+        self_us[name] = self_us.get(name, 0) + duration
+        hits[name] = hits.get(name, 0) + 1
+        # Recursion puts a function on the stack more than once; count it once
+        seen = set()
+        while node_id is not None:
+            name = label(nodes[node_id])
+            if name not in seen and name not in V8_PSEUDO_FRAMES:
+                seen.add(name)
+                cumulative_us[name] = cumulative_us.get(name, 0) + duration
+            node_id = parents.get(node_id)
+
+    entries = [
+        _entry(
+            name,
+            self_us.get(name, 0) / 1e6,
+            cumulative / 1e6,
+            samples=hits.get(name, 0),
+        )
+        for name, cumulative in cumulative_us.items()
+    ]
+    entries.sort(key=lambda e: (e["selfMs"], e["cumulativeMs"]), reverse=True)
+    return {
+        "profiler": "v8",
+        "totalMs": round(total / 1000, 3),
+        "functions": entries[:top],
+    }
+
+
+class Profiler:
+    """Profiles one run: ``command`` wraps the snippet so the profile lands
+    in a scratch directory, and ``summary`` reads it back once the process
+    has exited. Use as a context manager to remove the directory."""
+
+    def __init__(self, language: str, top: int = PROFILE_TOP):
+        if language not in PROFILED_LANGUAGES:
+            raise ValueError(f"Profiling is not supported for {language}")
+        self.language = language
+        self.top = top
+        # Outside the run's working directory, so it is never collected
+        self.directory = tempfile.mkdtemp(prefix="code-mcp-profile-")
+
+    def command(self, code: str) -> list[str]:
+        if self.language == "python":
+            return [
+                "python",
+                RUNNER,
+                os.path.join(self.directory, "profile.pstats"),
+                code,
+            ]
+        return ["node", "--cpu-prof", f"--cpu-prof-dir={self.directory}", "-e", code]
+
+    def summary(self) -> dict | None:
+        """The hotspot summary, or None if the process left no profile,
+        for example because it was killed."""
+        try:
+            if self.language == "python":
+                path = os.path.join(self.directory, "profile.pstats")
+                if not os.path.exists(path):
+                    return None
+                return summarize_pstats(path, self.top)
+            paths = glob.glob(os.path.join(self.directory, "*.cpuprofile"))
+            if not paths:
+                return None
+            return summarize_cpuprofile(paths[0], self.top)
+        except Exception as e:  # noqa: BLE001 - a cut-off profile fails in many ways
+            logger.warning(f"Could not read {self.language} profile: {e!s}")
+            return None
+
+    def close(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
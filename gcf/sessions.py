@@ -0,0 +1,184 @@
+import logging
+import resource
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+try:
+    from .cancellation import Call
+    from .pool import WORKER_COMMANDS, Worker, WorkerCrashed
+except ImportError:  # loaded as a top-level module by functions-framework
+    from cancellation import Call
+    from pool import WORKER_COMMANDS, Worker, WorkerCrashed
+
+logger = logging.getLogger(__name__)
+
+
+class SessionError(Exception):
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    def __init__(self, language: str, worker: Worker):
+        self.id = uuid.uuid4().hex
+        self.language = language
+        self.worker = worker
+        self.last_used = time.monotonic()
+        # One run at a time: the interpreter's globals are shared state
+        self.lock = threading.Lock()
+
+
+def _session_command(language: str, memory_mb: int) -> tuple[list[str], object]:
+    cmd = WORKER_COMMANDS[language] + ["--persistent"]
+    if language == "javascript":
+        # V8 reserves far more address space than it uses, so cap its heap
+        # instead of RLIMIT_AS
+        return [cmd[0], f"--max-old-space-size={memory_mb}"] + cmd[1:], None
+
+    limit = memory_mb * 1024 * 1024
+
+    def limit_memory():
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    return cmd, limit_memory
+
+
+class SessionManager:
+    """Long-lived interpreters whose globals persist between runs.
+
+    At most ``max_sessions`` exist at once, each limited to ``memory_mb`` of
+    memory, and sessions idle for ``idle_timeout`` seconds are closed.
+    """
+
+    def __init__(self, max_sessions: int, memory_mb: int, idle_timeout: float):
+        self.max_sessions = max_sessions
+        self.memory_mb = memory_mb
+        self.idle_timeout = idle_timeout
+        self._sessions: dict[str, Session | None] = {}
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def create(self, language: str) -> Session:
+        if language not in WORKER_COMMANDS:
+            raise SessionError(
+                f"Sessions are not supported for language: {language}", 400
+            )
+
+        self.evict_idle()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise SessionError(
+                    f"Too many sessions: at most {self.max_sessions}", 429
+                )
+            # Reserve the slot while the interpreter starts
+            placeholder = uuid.uuid4().hex
+            self._sessions[placeholder] = None
+
+        try:
+            cmd, preexec_fn = _session_command(language, self.memory_mb)
+            session = Session(language, Worker(cmd, preexec_fn=preexec_fn))
+        finally:
+            with self._lock:
+                del self._sessions[placeholder]
+
+        with self._lock:
+            self._sessions[session.id] = session
+        logger.info(f"Created {language} session {session.id}")
+        return session
+
+    def get(self, session_id: str) -> Session:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise SessionError(f"Unknown session: {session_id}", 404)
+        return session
+
+    def run(
+        self,
+        session_id: str,
+        code: str,
+        language: str,
+        timeout: float,
+        usage: bool = False,
+        call: Call | None = None,
+    ) -> dict:
+        """Run code in the session; cancelling ``call`` kills the interpreter
+        and closes the session, as a timeout does."""
+        session = self.get(session_id)
+        if session.language != language:
+            raise SessionError(
+                f"Session {session_id} runs {session.language}, not {language}", 400
+            )
+
+        with session.lock:
+            session.last_used = time.monotonic()
+            try:
+                with (
+                    call.on_cancel(session.worker.proc.kill)
+                    if call is not None
+                    else nullcontext()
+                ):
+                    result = session.worker.run(code, timeout, usage)
+            except subprocess.TimeoutExpired:
+                self.close(session_id)
+                return {
+                    "stdout": "",
+                    "stderr": f"Code execution timed out after {timeout} seconds; session closed",
+                    "exitCode": -1,
+                }
+            except WorkerCrashed:
+                self.close(session_id)
+                if call is not None and call.cancelled:
+                    return {
+                        "stdout": "",
+                        "stderr": "Code execution cancelled; session closed",
+                        "exitCode": -1,
+                    }
+                return {
+                    "stdout": "",
+                    "stderr": "Session interpreter exited; session closed",
+                    "exitCode": session.worker.proc.returncode,
+                }
+            finally:
+                session.last_used = time.monotonic()
+
+        if not session.worker.alive():
+            self.close(session_id)
+        return result
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.worker.close()
+        logger.info(f"Closed session {session_id}")
+        return True
+
+    def start_reaper(self) -> None:
+        def reap():
+            while True:
+                time.sleep(max(self.idle_timeout / 2, 1))
+                self.evict_idle()
+
+        threading.Thread(target=reap, daemon=True).start()
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                session.id
+                for session in self._sessions.values()
+                if session is not None
+                and now - session.last_used > self.idle_timeout
+                and not session.lock.locked()
+            ]
+        for session_id in idle:
+            self.close(session_id)
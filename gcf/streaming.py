@@ -0,0 +1,153 @@
+import codecs
+import queue
+import subprocess
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    from .cancellation import Call
+    from .limits import MeasuredPopen, ResourceLimits, describe_exit, usage_report
+    from .output import MAX_OUTPUT_BYTES, BoundedBuffer, kill_group
+except ImportError:  # loaded as a top-level module by functions-framework
+    from cancellation import Call
+    from limits import MeasuredPopen, ResourceLimits, describe_exit, usage_report
+    from output import MAX_OUTPUT_BYTES, BoundedBuffer, kill_group
+
+CHUNK_SIZE = 4096
+# Seconds to keep reading after a timeout kill for output already written
+KILL_GRACE = 1
+
+
+def _pump(pipe, name: str, events: queue.Queue) -> None:
+    for chunk in iter(lambda: pipe.read1(CHUNK_SIZE), b""):
+        events.put((name, chunk))
+    events.put((name, None))
+
+
+class _StreamState:
+    """Forwards the head of a stream live and holds back its tail."""
+
+    def __init__(self, max_output: int):
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.buffer = BoundedBuffer(max_output)
+
+    def feed(self, chunk: bytes) -> str:
+        live = max(self.buffer.head_limit - self.buffer.total, 0)
+        self.buffer.write(chunk)
+        return self.decoder.decode(chunk[:live])
+
+    def remainder(self) -> str:
+        text = self.decoder.decode(b"", final=True)
+        if self.buffer.tail is None:
+            return text
+        tail = self.buffer.tail.getvalue().decode("utf-8", errors="replace")
+        if not self.buffer.truncated:
+            return text + tail
+        dropped = self.buffer.total - self.buffer.head_limit - self.buffer.tail_limit
+        return f"{text}\n... [{dropped} bytes truncated] ...\n{tail}"
+
+
+def stream_process(
+    cmd: list[str],
+    timeout: float,
+    max_output: int = MAX_OUTPUT_BYTES,
+    limits: ResourceLimits | None = None,
+    usage: bool = False,
+    timings: dict | None = None,
+    cwd: str | None = None,
+    call: Call | None = None,
+):
+    """Run cmd and yield output events as soon as the process produces them.
+
+    Yields ``{"stream": "stdout" | "stderr", "data": str}`` for each chunk
+    and finally ``{"exitCode": int}``. Only the first half of
+    ``max_output`` bytes per stream is forwarded live; the last half is
+    held back and sent once the stream ends, so memory stays bounded.
+    Closing the generator early (for example when the client disconnects)
+    kills the process. As in ``output.run_process`` the process leads its
+    own session, and children still holding the pipes at the deadline count
+    as a timeout. ``limits``, ``usage``, ``timings``, ``cwd`` and
+    ``call`` behave as in ``output.run_process``, with usage reported on the
+    final event.
+    """
+    preexec_fn = None
+    if limits is not None:
+        cmd, preexec_fn = limits.apply(cmd)
+
+    started = time.monotonic()
+    proc = MeasuredPopen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        preexec_fn=preexec_fn,
+        cwd=cwd,
+        start_new_session=True,
+    )
+    spawned = time.monotonic()
+    deadline = spawned + timeout
+    if timings is not None:
+        timings["spawn"] = spawned - started
+    events = queue.Queue()
+    streams = {"stdout": _StreamState(max_output), "stderr": _StreamState(max_output)}
+    for pipe, name in ((proc.stdout, "stdout"), (proc.stderr, "stderr")):
+        threading.Thread(target=_pump, args=(pipe, name, events), daemon=True).start()
+
+    timed_out = False
+    cancellable = (
+        call.on_cancel(lambda: kill_group(proc)) if call is not None else nullcontext()
+    )
+    with cancellable:
+        try:
+            open_streams = 2
+            while open_streams:
+                try:
+                    name, chunk = events.get(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except queue.Empty:
+                    if timed_out:
+                        break
+                    kill_group(proc)
+                    timed_out = True
+                    deadline = time.monotonic() + KILL_GRACE
+                    continue
+                if chunk is None:
+                    open_streams -= 1
+                    data = streams[name].remainder()
+                else:
+                    data = streams[name].feed(chunk)
+                if data:
+                    yield {"stream": name, "data": data}
+
+            proc.wait()
+            wall = time.monotonic() - started
+            if timings is not None:
+                timings["execute"] = time.monotonic() - spawned
+            if call is not None and call.cancelled:
+                yield {"stream": "stderr", "data": "Code execution cancelled"}
+                final = {"exitCode": -1}
+            elif timed_out:
+                yield {
+                    "stream": "stderr",
+                    "data": f"Code execution timed out after {timeout} seconds",
+                }
+                final = {"exitCode": -1}
+            else:
+                note = describe_exit(proc.returncode)
+                if note:
+                    yield {"stream": "stderr", "data": f"\n{note}\n"}
+                final = {"exitCode": proc.returncode}
+            if usage:
+                final["usage"] = usage_report(proc.rusage, wall)
+
+            stdout, stderr = streams["stdout"].buffer, streams["stderr"].buffer
+            if stdout.truncated or stderr.truncated:
+                final.update(
+                    truncated=True, stdoutBytes=stdout.total, stderrBytes=stderr.total
+                )
+            yield final
+        finally:
+            # Nothing the snippet started outlives its run
+            kill_group(proc)
+            proc.wait()
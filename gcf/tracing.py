@@ -0,0 +1,51 @@
+import json
+import threading
+import time
+
+# Set by the client on requests it traces; the executor then answers with
+# the spans it recorded, as offsets from when the request arrived
+TRACE_ID_HEADER = "X-Trace-Id"
+SPANS_HEADER = "X-Trace-Spans"
+
+# Keeps the response header small for large batches
+MAX_SPANS = 128
+
+
+class Trace:
+    """Spans of one traced request."""
+
+    def __init__(self, trace_id: str, started: float | None = None):
+        self.id = trace_id
+        self.started = time.perf_counter() if started is None else started
+        self.spans: list[dict] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_headers(cls, headers) -> "Trace | None":
+        trace_id = headers.get(TRACE_ID_HEADER)
+        return cls(trace_id) if trace_id else None
+
+    def add(self, name: str, seconds: float, end: float | None = None) -> None:
+        """Record a span of ``seconds`` that ended at ``end`` (a
+        time.perf_counter() value), or just now."""
+        end = time.perf_counter() if end is None else end
+        span = {
+            "name": name,
+            "startMs": round((end - seconds - self.started) * 1000, 3),
+            "durMs": round(seconds * 1000, 3),
+        }
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+
+    def add_stages(self, timings: dict, end: float | None = None) -> None:
+        """Record stages that ran back to back, in the order they were
+        added to ``timings``, the last one ending at ``end``."""
+        end = time.perf_counter() if end is None else end
+        for name, seconds in reversed(list(timings.items())):
+            self.add(name, seconds, end)
+            end -= seconds
+
+    def header(self) -> str:
+        with self._lock:
+            return json.dumps(self.spans, separators=(",", ":"))
@@ -0,0 +1,164 @@
+import gzip
+import io
+import json
+import os
+
+from flask import Response, jsonify
+
+try:
+    import msgpack
+except ImportError:  # optional, requests and responses stay JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Response bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+# Largest request body accepted once decompressed, so a small compressed
+# body can't expand to exhaust the instance's memory
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(32 * 1024 * 1024)))
+CHUNK_SIZE = 65536
+
+
+class UnsupportedMediaType(Exception):
+    """The request body uses an encoding or format this executor can't read."""
+
+    status = 415
+
+
+class RequestTooLarge(Exception):
+    status = 413
+
+
+def encodings() -> list[str]:
+    """Content encodings this executor reads and writes, preferred first."""
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def media_types() -> list[str]:
+    return [MSGPACK, JSON] if msgpack is not None else [JSON]
+
+
+def accepts(header: str, token: str) -> bool:
+    """Whether an Accept or Accept-Encoding header value names token.
+
+    Wildcards don't count: httpx sends ``Accept: */*`` by default, and older
+    clients must keep getting JSON.
+    """
+    for item in header.split(","):
+        name, *params = item.split(";")
+        if name.strip().lower() != token:
+            continue
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def _read_limited(stream, limit: int) -> bytes:
+    data = bytearray()
+    while chunk := stream.read(min(CHUNK_SIZE, limit + 1 - len(data))):
+        data += chunk
+        if len(data) > limit:
+            raise RequestTooLarge(
+                f"Request body too large: more than {limit} bytes decompressed"
+            )
+    return bytes(data)
+
+
+def decompress(body: bytes, encoding: str, limit: int = MAX_REQUEST_BYTES) -> bytes:
+    """Decompress body in chunks, stopping with RequestTooLarge once the
+    output passes ``limit`` bytes."""
+    if encoding not in encodings():
+        raise UnsupportedMediaType(f"Unsupported Content-Encoding: {encoding}")
+    if encoding == "zstd":
+        # Frames written by streaming compressors don't record their size
+        stream = zstandard.ZstdDecompressor().stream_reader(body)
+    else:
+        stream = gzip.GzipFile(fileobj=io.BytesIO(body))
+    with stream:
+        return _read_limited(stream, limit)
+
+
+def read_request(request):
+    """Parse the request body, decompressing and decoding it as its headers say.
+
+    Plain JSON bodies go through request.get_json() as before.
+    """
+    encoding = request.headers.get("Content-Encoding", "identity").strip().lower()
+    content_type = (
+        request.headers.get("Content-Type", JSON).split(";")[0].strip().lower()
+    )
+    if encoding == "identity" and content_type != MSGPACK:
+        return request.get_json()
+
+    body = request.get_data()
+    if encoding != "identity":
+        body = decompress(body, encoding)
+    if content_type == MSGPACK:
+        if msgpack is None:
+            raise UnsupportedMediaType(f"Unsupported Content-Type: {MSGPACK}")
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+
+def advertise(response: Response) -> Response:
+    """Tell the client which request encodings (RFC 7694) and body formats
+    this executor reads, so it can switch to them on its next request."""
+    response.headers["Accept-Encoding"] = ", ".join(encodings())
+    response.headers["Accept-Post"] = ", ".join(media_types())
+    return response
+
+
+class ResponseEncoder:
+    """Encodes results in the format and compression the client asked for.
+
+    Clients that don't send Accept or Accept-Encoding get jsonify() output.
+    """
+
+    def __init__(self, headers):
+        accept = headers.get("Accept", "")
+        self.content_type = (
+            MSGPACK if msgpack is not None and accepts(accept, MSGPACK) else JSON
+        )
+        accept_encoding = headers.get("Accept-Encoding", "")
+        self.encoding = next(
+            (e for e in encodings() if accepts(accept_encoding, e)), None
+        )
+
+    def response(self, payload: dict) -> Response:
+        if self.content_type == JSON and self.encoding is None:
+            return jsonify(payload)
+
+        if self.content_type == MSGPACK:
+            body = msgpack.packb(payload)
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode()
+
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        if self.encoding is not None and len(body) >= COMPRESS_MIN_BYTES:
+            body = compress(body, self.encoding)
+            headers["Content-Encoding"] = self.encoding
+        return Response(body, mimetype=self.content_type, headers=headers)
+
+
+PLAIN = ResponseEncoder({})
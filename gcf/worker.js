@@ -0,0 +1,189 @@
+// Long-lived Node.js worker used by the executor's warm pool.
+//
+// Reads one JSON request per line from the request fd, runs the code the way
+// `node -e` would and writes one JSON result per line to the response fd.
+// A run is complete once the code has returned and every timer, socket or
+// other handle it opened has been released.
+// Only the head and tail of each stream are kept, as in output.run_process.
+//
+// With --persistent, code runs in the worker's global scope so declarations
+// survive between runs (like a REPL) and the worker can back a session.
+//
+// Usage: node worker.js [--persistent] REQUEST_FD RESPONSE_FD
+
+"use strict";
+
+const fs = require("fs");
+const net = require("net");
+const path = require("path");
+const readline = require("readline");
+const vm = require("vm");
+const { createRequire } = require("module");
+
+const persistent = process.argv.includes("--persistent");
+const requests = new net.Socket({ fd: Number(process.argv.at(-2)), readable: true });
+const responseFd = Number(process.argv.at(-1));
+// Same per-stream cap as output.MAX_OUTPUT_BYTES
+const maxOutput = Number(process.env.MAX_OUTPUT_BYTES || 1024 * 1024);
+
+class ExitSignal {
+  constructor(code) {
+    this.code = code;
+  }
+}
+
+function pendingResources() {
+  return process.getActiveResourcesInfo().length;
+}
+
+function nextTick() {
+  return new Promise((resolve) => setImmediate(resolve));
+}
+
+// Keeps the head and tail of a stream within `limit` bytes, like
+// output.BoundedBuffer.
+class BoundedBuffer {
+  constructor(limit) {
+    this.headLimit = Math.floor(limit / 2);
+    this.tailLimit = limit - this.headLimit;
+    this.head = [];
+    this.headBytes = 0;
+    this.tail = [];
+    this.tailBytes = 0;
+    this.total = 0;
+  }
+
+  get truncated() {
+    return this.total > this.headLimit + this.tailLimit;
+  }
+
+  write(data) {
+    this.total += data.length;
+    const room = this.headLimit - this.headBytes;
+    if (room > 0) {
+      const head = data.subarray(0, room);
+      this.head.push(head);
+      this.headBytes += head.length;
+      data = data.subarray(room);
+    }
+    if (data.length === 0 || this.tailLimit === 0) return;
+    this.tail.push(data.subarray(-this.tailLimit));
+    this.tailBytes += Math.min(data.length, this.tailLimit);
+    while (this.tailBytes - this.tail[0].length >= this.tailLimit) {
+      this.tailBytes -= this.tail.shift().length;
+    }
+  }
+
+  getValue() {
+    const head = Buffer.concat(this.head).toString();
+    let tail = Buffer.concat(this.tail);
+    tail = tail.subarray(tail.length - Math.min(tail.length, this.tailLimit)).toString();
+    if (!this.truncated) return head + tail;
+    const dropped = this.total - this.headLimit - this.tailLimit;
+    return `${head}\n... [${dropped} bytes truncated] ...\n${tail}`;
+  }
+}
+
+function capture(stream, buffer) {
+  const write = stream.write;
+  stream.write = (chunk, encoding, callback) => {
+    buffer.write(typeof chunk === "string" ? Buffer.from(chunk, typeof encoding === "string" ? encoding : "utf8") : Buffer.from(chunk));
+    const done = typeof encoding === "function" ? encoding : callback;
+    if (done) done();
+    return true;
+  };
+  return () => {
+    stream.write = write;
+  };
+}
+
+function describe(error) {
+  if (!error || !error.stack) return String(error) + "\n";
+  // Hide this worker's own frames so stacks match `node -e`
+  const frames = error.stack.split("\n").filter((line) => !line.includes(__filename));
+  return frames.join("\n") + "\n";
+}
+
+async function run(code, usage) {
+  const cpuStart = process.cpuUsage();
+  const stdout = new BoundedBuffer(maxOutput);
+  const stderr = new BoundedBuffer(maxOutput);
+  let exitCode = 0;
+
+  const fail = (error) => {
+    if (error instanceof ExitSignal) {
+      exitCode = error.code;
+      return;
+    }
+    stderr.write(Buffer.from(describe(error)));
+    exitCode = 1;
+  };
+
+  await nextTick();
+  const baseline = pendingResources();
+  const restoreStdout = capture(process.stdout, stdout);
+  const restoreStderr = capture(process.stderr, stderr);
+  const exit = process.exit;
+  process.exit = (code) => {
+    throw new ExitSignal(code === undefined ? 0 : Number(code));
+  };
+  process.on("uncaughtException", fail);
+  process.on("unhandledRejection", fail);
+
+  try {
+    const filename = path.join(process.cwd(), "[eval]");
+    const require = createRequire(filename);
+    if (persistent) {
+      globalThis.require = require;
+      vm.runInThisContext(code, { filename: "[eval]" });
+    } else {
+      const fn = vm.compileFunction(code, ["require", "module", "exports", "__filename", "__dirname"], {
+        filename: "[eval]",
+      });
+      const module = { exports: {} };
+      fn.call(globalThis, require, module, module.exports, "[eval]", ".");
+    }
+    // Give rejected promises a turn to surface before checking for handles
+    await nextTick();
+    while (pendingResources() > baseline) {
+      await nextTick();
+    }
+  } catch (error) {
+    fail(error);
+  } finally {
+    process.removeListener("uncaughtException", fail);
+    process.removeListener("unhandledRejection", fail);
+    process.exit = exit;
+    restoreStdout();
+    restoreStderr();
+  }
+
+  const result = { stdout: stdout.getValue(), stderr: stderr.getValue(), exitCode };
+  if (stdout.truncated || stderr.truncated) {
+    result.truncated = true;
+    result.stdoutBytes = stdout.total;
+    result.stderrBytes = stderr.total;
+  }
+  if (usage) {
+    // CPU time is this run's share; peak RSS covers the worker's lifetime
+    const cpu = process.cpuUsage(cpuStart);
+    result.usage = {
+      cpuUserMs: Math.round(cpu.user / 100) / 10,
+      cpuSysMs: Math.round(cpu.system / 100) / 10,
+      maxRssKb: process.resourceUsage().maxRSS,
+    };
+  }
+  return result;
+}
+
+async function main() {
+  const lines = readline.createInterface({ input: requests });
+  for await (const line of lines) {
+    const request = JSON.parse(line);
+    const result = await run(request.code, request.usage);
+    fs.writeSync(responseFd, JSON.stringify(result) + "\n");
+  }
+  process.exit(0);
+}
+
+main();
@@ -0,0 +1,112 @@
+"""Long-lived Python worker used by the executor's warm pool.
+
+Reads one JSON request per line from the request fd, runs the code the way
+``python -c`` would and writes one JSON result per line to the response fd.
+File descriptors 1 and 2 are pointed at temporary files for each run so that
+output from child processes and C extensions is captured as well; only the
+head and tail of each are read back, as in ``output.run_process``.
+
+With --persistent, globals are kept between runs so the worker can back a
+session; otherwise every run starts from a fresh ``__main__`` namespace.
+
+Usage: python worker.py [--persistent] REQUEST_FD RESPONSE_FD
+"""
+
+import json
+import os
+import resource
+import sys
+import tempfile
+import traceback
+
+from output import CHUNK_SIZE, BoundedBuffer, build_result
+
+
+def _exit_code(exc: SystemExit) -> int:
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def _execute(code: str, namespace: dict) -> int:
+    try:
+        exec(compile(code, "<string>", "exec"), namespace)  # noqa: S102
+    except SystemExit as e:
+        return _exit_code(e)
+    except SyntaxError as e:
+        traceback.print_exception(type(e), e, None)
+        return 1
+    except BaseException as e:  # noqa: BLE001
+        # Drop this module's frame so tracebacks match `python -c`
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+    return 0
+
+
+def _read(f) -> BoundedBuffer:
+    buffer = BoundedBuffer()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+        buffer.write(chunk)
+    return buffer
+
+
+def _cpu_times() -> tuple[float, float]:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + children.ru_utime, own.ru_stime + children.ru_stime
+
+
+def _peak_rss() -> int:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return max(own.ru_maxrss, children.ru_maxrss)
+
+
+def run(code: str, namespace: dict, usage: bool = False) -> dict:
+    user, system = _cpu_times()
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        exit_code = _execute(code, namespace)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        result = build_result(_read(out), _read(err), exit_code)
+    if usage:
+        # CPU time is this run's share; peak RSS covers the worker's lifetime
+        end_user, end_system = _cpu_times()
+        result["usage"] = {
+            "cpuUserMs": round((end_user - user) * 1000, 1),
+            "cpuSysMs": round((end_system - system) * 1000, 1),
+            "maxRssKb": _peak_rss(),
+        }
+    return result
+
+
+def new_namespace() -> dict:
+    return {"__name__": "__main__", "__builtins__": __builtins__}
+
+
+def main():
+    persistent = "--persistent" in sys.argv
+    requests = os.fdopen(int(sys.argv[-2]), "r")
+    responses = os.fdopen(int(sys.argv[-1]), "w")
+    # Look like `python -c` to user code
+    sys.argv = ["-c"]
+    sys.path[0] = ""
+
+    namespace = new_namespace()
+    for line in requests:
+        request = json.loads(line)
+        if not persistent:
+            namespace = new_namespace()
+        result = run(request["code"], namespace, request.get("usage", False))
+        responses.write(json.dumps(result) + "\n")
+        responses.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""Fork Python snippets from a process that has already imported heavy modules.
+
+The zygote runs as ``python zygote.py numpy,pandas``. It imports the listed
+modules once, then waits on a Unix socket for requests. Each request carries
+three file descriptors: a socket for the conversation and the write ends of
+the run's stdout and stderr pipes.
+
+For every request the zygote forks a supervisor and goes back to waiting,
+so it stays single-threaded and its memory stays as it was after the
+imports. The supervisor reads the code and forks the runner. The runner
+starts a new session, applies the resource limits, and executes the code
+as ``__main__``, like ``python -c``. The supervisor reports the runner's
+pid, then its exit status and resource usage, and exits.
+"""
+
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import types
+from contextlib import nullcontext
+
+try:
+    from .cancellation import Call, Cancelled
+    from .limits import ResourceLimits, describe_exit, usage_report
+    from .output import MAX_OUTPUT_BYTES, BoundedBuffer, _drain, build_result
+except (
+    ImportError
+):  # loaded as a top-level module by functions-framework, or run as the zygote
+    from cancellation import Call, Cancelled
+    from limits import ResourceLimits, describe_exit, usage_report
+    from output import MAX_OUTPUT_BYTES, BoundedBuffer, _drain, build_result
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the zygote to finish its imports
+START_TIMEOUT = 120
+
+
+def _send(conn: socket.socket, message: dict) -> None:
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+def _run_code(code: str) -> int:
+    """Execute code as python -c would and return the exit status."""
+    main = types.ModuleType("__main__")
+    main.__builtins__ = __builtins__
+    sys.modules["__main__"] = main
+    sys.argv = ["-c"]
+    try:
+        exec(compile(code, "<string>", "exec"), main.__dict__)  # noqa: S102
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:  # noqa: BLE001
+        exc_type, exc, tb = sys.exc_info()
+        # Start the traceback at the snippet, as python -c does
+        sys.excepthook(exc_type, exc.with_traceback(tb.tb_next), tb.tb_next)
+        return 1
+    return 0
+
+
+def _runner(request: dict, stdout_fd: int, stderr_fd: int) -> None:
+    """Body of the forked runner process. Never returns."""
+    status = 1
+    try:
+        os.setsid()
+        for signum in (signal.SIGCHLD, signal.SIGINT, signal.SIGTERM, signal.SIGPIPE):
+            signal.signal(signum, signal.SIG_DFL)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+        # The child exits rather than closing these
+        sys.stdin = open(0, closefd=False)  # noqa: SIM115
+        sys.stdout = open(1, "w", closefd=False)  # noqa: SIM115
+        sys.stderr = open(2, "w", closefd=False, buffering=1)  # noqa: SIM115
+
+        if request.get("cwd"):
+            os.chdir(request["cwd"])
+        _, set_limits = ResourceLimits(**request.get("limits", {})).apply(
+            [sys.executable]
+        )
+        if set_limits is not None:
+            set_limits()
+        # The preloaded generators would otherwise repeat across runs
+        if "numpy" in sys.modules:
+            sys.modules["numpy"].random.seed()
+
+        status = _run_code(request["code"])
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(status & 0xFF)
+
+
+def _supervise(conn: socket.socket, stdout_fd: int, stderr_fd: int) -> None:
+    """Body of the forked supervisor process. Never returns."""
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        request = json.loads(conn.makefile("rb").readline())
+        pid = os.fork()
+        if pid == 0:
+            conn.close()
+            _runner(request, stdout_fd, stderr_fd)
+        os.close(stdout_fd)
+        os.close(stderr_fd)
+        _send(conn, {"pid": pid})
+
+        _, status, rusage = os.wait4(pid, 0)
+        exit_code = (
+            -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        )
+        _send(
+            conn,
+            {
+                "exitCode": exit_code,
+                "rusage": {
+                    "ru_utime": rusage.ru_utime,
+                    "ru_stime": rusage.ru_stime,
+                    "ru_maxrss": rusage.ru_maxrss,
+                },
+            },
+        )
+    finally:
+        os._exit(0)
+
+
+def serve(control: socket.socket, modules: list[str]) -> None:
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception as e:  # noqa: BLE001
+            print(f"zygote: could not preload {module}: {e}", file=sys.stderr)
+    # Supervisors are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    control.sendall(b"R")
+
+    while True:
+        try:
+            _, fds, _, _ = socket.recv_fds(control, 1, 3)
+        except InterruptedError:
+            continue
+        if not fds:
+            # The executor went away
+            return
+        conn_fd, stdout_fd, stderr_fd = fds
+        if os.fork() == 0:
+            control.close()
+            _supervise(socket.socket(fileno=conn_fd), stdout_fd, stderr_fd)
+        for fd in fds:
+            os.close(fd)
+
+
+class _Replies:
+    """Reads the supervisor's newline-delimited JSON replies."""
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.buffer = b""
+
+    def read(self, timeout: float | None = None) -> dict | None:
+        """Next reply, None if the supervisor went away. Raises TimeoutError."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while b"\n" not in self.buffer:
+            if deadline is not None:
+                self.conn.settimeout(max(deadline - time.monotonic(), 0.001))
+            chunk = self.conn.recv(65536)
+            if not chunk:
+                return None
+            self.buffer += chunk
+        line, _, self.buffer = self.buffer.partition(b"\n")
+        return json.loads(line)
+
+
+class Zygote:
+    """Executor-side handle on a zygote process, started on first use and
+    restarted if it dies."""
+
+    def __init__(self, modules: list[str], limits: ResourceLimits | None = None):
+        self.modules = modules
+        self.limits = limits
+        self.runs = 0
+        self.restarts = -1
+        self._proc: subprocess.Popen | None = None
+        self._control: socket.socket | None = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        if self._control is not None:
+            self._control.close()
+            self._control = None
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._proc = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                str(child.fileno()),
+                ",".join(self.modules),
+            ],
+            pass_fds=[child.fileno()],
+            stdin=subprocess.DEVNULL,
+        )
+        child.close()
+        parent.settimeout(START_TIMEOUT)
+        try:
+            if parent.recv(1) != b"R":
+                raise RuntimeError("Zygote exited during startup")
+        except BaseException:
+            parent.close()
+            self._proc.kill()
+            self._proc.wait()
+            raise
+        parent.settimeout(None)
+        self._control = parent
+        self.restarts += 1
+        logger.info(
+            f"Zygote {self._proc.pid} ready with {', '.join(self.modules) or 'no modules'} preloaded"
+        )
+
+    def start(self) -> None:
+        """Start the zygote now rather than on the first run."""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+
+    def _submit(self, fds: list[int]) -> None:
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            socket.send_fds(self._control, [b"r"], fds)
+
+    def run(
+        self,
+        code: str,
+        timeout: float,
+        max_output: int = MAX_OUTPUT_BYTES,
+        usage: bool = False,
+        timings: dict | None = None,
+        cwd: str | None = None,
+        call: Call | None = None,
+        limits: ResourceLimits | None = None,
+    ) -> dict:
+        """Run code in a forked child; same result and errors as
+        output.run_process. ``limits`` replace the zygote's own for this
+        run."""
+        conn, remote = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        limits = limits or self.limits or ResourceLimits()
+        started = time.monotonic()
+        try:
+            self._submit([remote.fileno(), stdout_w, stderr_w])
+        except BaseException:
+            conn.close()
+            os.close(stdout_r)
+            os.close(stderr_r)
+            raise
+        finally:
+            remote.close()
+            os.close(stdout_w)
+            os.close(stderr_w)
+
+        stdout, stderr = BoundedBuffer(max_output), BoundedBuffer(max_output)
+        readers = [
+            threading.Thread(
+                target=_drain, args=(os.fdopen(stdout_r, "rb"), stdout), daemon=True
+            ),
+            threading.Thread(
+                target=_drain, args=(os.fdopen(stderr_r, "rb"), stderr), daemon=True
+            ),
+        ]
+        for reader in readers:
+            reader.start()
+
+        with conn:
+            replies = _Replies(conn)
+            _send(conn, {"code": code, "cwd": cwd, "limits": vars(limits)})
+            reply = replies.read()
+            if reply is None:
+                raise RuntimeError(
+                    "Zygote closed the connection before starting the run"
+                )
+            pid = reply["pid"]
+            spawned = time.monotonic()
+            deadline = spawned + timeout
+            if timings is not None:
+                timings["spawn"] = spawned - started
+            self.runs += 1
+
+            # The runner leads its own session, so this takes its children too
+            def kill():
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            timed_out = False
+            try:
+                with call.on_cancel(kill) if call is not None else nullcontext():
+                    status = replies.read(timeout)
+                    wall = time.monotonic() - started
+                    # Background children may still hold the pipes open
+                    for reader in readers:
+                        reader.join(timeout=max(deadline - time.monotonic(), 0))
+                    timed_out = any(reader.is_alive() for reader in readers)
+            except TimeoutError:
+                kill()
+                replies.read()
+                timed_out = True
+
+            if timed_out or (call is not None and call.cancelled):
+                kill()
+                if timings is not None:
+                    timings["execute"] = time.monotonic() - spawned
+                for reader in readers:
+                    reader.join(timeout=1)
+                if timed_out:
+                    raise subprocess.TimeoutExpired(["python", "-c", code], timeout)
+                raise Cancelled()
+
+        # Nothing the snippet started outlives its run
+        kill()
+        if timings is not None:
+            timings["execute"] = time.monotonic() - spawned
+        if status is None:
+            raise RuntimeError(
+                "Zygote supervisor exited without reporting the run's status"
+            )
+
+        result = build_result(stdout, stderr, status["exitCode"])
+        note = describe_exit(status["exitCode"])
+        if note:
+            result["stderr"] += f"\n{note}\n"
+        if usage:
+            result["usage"] = usage_report(
+                types.SimpleNamespace(**status["rusage"]), wall
+            )
+        return result
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "restarts": max(self.restarts, 0)}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._control is not None:
+                self._control.close()
+                self._control = None
+            if self._proc is not None and self._proc.poll() is None:
+                self._proc.wait(timeout=5)
+
+
+if __name__ == "__main__":
+    serve(
+        socket.socket(fileno=int(sys.argv[1])), [m for m in sys.argv[2].split(",") if m]
+    )
@@ -0,0 +1,300 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from .endpoints import GCF_URLS, EndpointSet
+from .hedging import get_policy, is_hedgeable, run_key
+from .http_client import (
+    DEADLINE_HEADER,
+    REQUEST_ID_HEADER,
+    Overloaded,
+    _raise_for_status,
+    call_deadline,
+    get_client,
+)
+from .tracing import SPANS_HEADER, TRACE_ID_HEADER, current_trace, parse_spans
+
+logger = logging.getLogger(__name__)
+
+# "gcf" sends every call to the Cloud Function at GCF_URL; "local" runs the
+# executor (gcf/main.py) inside this process, skipping the network entirely.
+BACKEND = os.getenv("CODE_MCP_BACKEND", "gcf").lower()
+LOCAL_THREADS = int(os.getenv("CODE_MCP_LOCAL_THREADS", "32"))
+
+OnOutput = Callable[[str, str], Awaitable[None]] | None
+
+
+class Backend:
+    """Where executor requests go. Payloads and results have the executor's
+    JSON shapes whichever backend handles them."""
+
+    async def execute(self, payload: dict) -> dict:
+        raise NotImplementedError
+
+    async def stream(self, payload: dict, on_output: OnOutput = None) -> dict:
+        raise NotImplementedError
+
+    async def metrics_text(self) -> str:
+        raise NotImplementedError
+
+
+class GCFBackend(Backend):
+    def __init__(self, url: str):
+        self.url = url
+
+    async def execute(self, payload: dict) -> dict:
+        return await get_policy().run(
+            lambda: get_client().post_json(self.url, payload, call_deadline(payload)),
+            hedge=is_hedgeable(payload),
+            key=run_key(payload),
+        )
+
+    async def stream(self, payload: dict, on_output: OnOutput = None) -> dict:
+        # Never hedged: both copies would report progress
+        return await get_policy().run(
+            lambda: get_client().stream_result(
+                self.url, payload, on_output, call_deadline(payload)
+            ),
+            hedge=False,
+        )
+
+    async def metrics_text(self) -> str:
+        return await get_client().get_text(self.url.rstrip("/") + "/metrics")
+
+
+class MultiGCFBackend(Backend):
+    """Spreads calls over several Cloud Functions (GCF_URLS).
+
+    Sessions and jobs live in one function instance, so calls for a session
+    or job go to the endpoint that created it.
+    """
+
+    def __init__(self, endpoints: EndpointSet):
+        self.endpoints = endpoints
+        self._sessions: dict[str, str] = {}
+        self._jobs: dict[str, str] = {}
+
+    def _pinned(self, payload: dict) -> str | None:
+        # Unknown sessions and jobs are sent anywhere and rejected by the executor
+        if payload.get("sessionId") is not None:
+            return self._sessions.get(payload["sessionId"])
+        if payload.get("jobId") is not None:
+            return self._jobs.get(payload["jobId"])
+        return None
+
+    async def execute(self, payload: dict) -> dict:
+        used = None
+
+        async def send(url: str) -> dict:
+            nonlocal used
+            used = url
+            return await get_client().post_json(url, payload, call_deadline(payload))
+
+        result = await get_policy().run(
+            lambda: self.endpoints.call(send, self._pinned(payload)),
+            hedge=is_hedgeable(payload),
+            key=run_key(payload),
+        )
+        action = payload.get("action")
+        if action == "create_session":
+            self._sessions[result["sessionId"]] = used
+        elif action == "close_session":
+            self._sessions.pop(payload.get("sessionId"), None)
+        elif payload.get("async"):
+            self._jobs[result["jobId"]] = used
+        return result
+
+    async def stream(self, payload: dict, on_output: OnOutput = None) -> dict:
+        async def send(url: str) -> dict:
+            return await get_client().stream_result(
+                url, payload, on_output, call_deadline(payload)
+            )
+
+        return await get_policy().run(
+            lambda: self.endpoints.call(send, self._pinned(payload)), hedge=False
+        )
+
+    async def metrics_text(self) -> str:
+        sections = []
+        for endpoint in self.endpoints.endpoints:
+            try:
+                text = await get_client().get_text(
+                    endpoint.url.rstrip("/") + "/metrics"
+                )
+            except (httpx.HTTPError, Overloaded) as e:
+                text = f"# unavailable: {str(e) or type(e).__name__}\n"
+            sections.append(f"# endpoint: {endpoint.url}\n{text}")
+        return "".join(sections)
+
+
+class _LocalRequest:
+    """The parts of a Flask request that gcf.main.execute_code reads."""
+
+    def __init__(
+        self,
+        payload: dict | None,
+        method: str = "POST",
+        path: str = "/",
+        headers: dict | None = None,
+    ):
+        self.payload = payload
+        self.method = method
+        self.path = path
+        self.headers = headers or {}
+
+    def get_json(self):
+        return self.payload
+
+
+class LocalBackend(Backend):
+    """Runs gcf.main.execute_code in this process.
+
+    Snippets still run in child processes (or the executor's warm worker
+    pool when WORKER_POOL_SIZE is set); only the HTTP hop is skipped. The
+    executor's own settings are read from this process's environment.
+    """
+
+    def __init__(self, threads: int = LOCAL_THREADS):
+        from flask import Flask
+
+        from gcf import main as executor
+
+        self._executor = executor
+        self._app = Flask("code-mcp-local")
+        self._threads = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="local-executor"
+        )
+
+    def _call(self, request: _LocalRequest):
+        with self._app.app_context():
+            return self._executor.execute_code(request)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._threads, fn, *args
+        )
+
+    @staticmethod
+    def _check(response, status_code: int) -> None:
+        if status_code >= 400:
+            # Same error type and message as a failed HTTP call to the executor
+            _raise_for_status(
+                httpx.Response(
+                    status_code,
+                    content=response.get_data(),
+                    headers=dict(response.headers),
+                    request=httpx.Request("POST", "local://executor"),
+                )
+            )
+
+    async def _submit(self, payload: dict, request_id: str):
+        """Call the executor, killing the run if the caller is cancelled
+        while it is still going: the executor thread can't be interrupted."""
+        headers = {REQUEST_ID_HEADER: request_id}
+        deadline = call_deadline(payload)
+        if deadline is not None:
+            headers[DEADLINE_HEADER] = str(int(deadline * 1000))
+        trace = current_trace()
+        if trace is not None:
+            headers[TRACE_ID_HEADER] = trace.id
+        try:
+            return await self._run(self._call, _LocalRequest(payload, headers=headers))
+        except asyncio.CancelledError:
+            if "action" not in payload:
+                self._threads.submit(
+                    self._call,
+                    _LocalRequest({"action": "cancel", "requestId": request_id}),
+                )
+            raise
+
+    async def execute(self, payload: dict) -> dict:
+        request_id = uuid.uuid4().hex
+        started = time.perf_counter()
+        response, status_code = await self._submit(payload, request_id)
+        trace = current_trace()
+        if trace is not None:
+            spans = parse_spans(response.headers.get(SPANS_HEADER))
+            trace.add_remote(spans, started, time.perf_counter() - started, request_id)
+        self._check(response, status_code)
+        return response.get_json()
+
+    async def stream(self, payload: dict, on_output: OnOutput = None) -> dict:
+        request_id = uuid.uuid4().hex
+        started = time.perf_counter()
+        response, status_code = await self._submit(
+            {**payload, "stream": True}, request_id
+        )
+        self._check(response, status_code)
+
+        result = {"stdout": "", "stderr": "", "exitCode": 0}
+        lines = response.iter_encoded()
+        try:
+            while True:
+                line = await self._run(next, lines, None)
+                if line is None:
+                    break
+                event = json.loads(line)
+                if "data" in event:
+                    result[event["stream"]] += event["data"]
+                    if on_output is not None:
+                        await on_output(event["stream"], event["data"])
+                else:
+                    result.update(event)
+        finally:
+            # Stops the process if the call was cancelled mid-stream
+            await self._run(response.close)
+        # Streamed runs send their spans with the final event
+        spans = result.pop("trace", None)
+        trace = current_trace()
+        if trace is not None:
+            trace.add_remote(spans, started, time.perf_counter() - started, request_id)
+        return result
+
+    async def metrics_text(self) -> str:
+        response, _ = await self._run(
+            self._call, _LocalRequest(None, method="GET", path="/metrics")
+        )
+        return response.get_data(as_text=True)
+
+
+_local: LocalBackend | None = None
+_multi: MultiGCFBackend | None = None
+
+
+def get_backend(gcf_url: str | None = None, name: str | None = None) -> Backend:
+    """Return the configured backend.
+
+    gcf_url is only used by the gcf backend, and only when GCF_URLS is unset.
+    """
+    global _local, _multi
+    name = name or BACKEND
+    if name == "local":
+        if _local is None:
+            _local = LocalBackend()
+        return _local
+    if name != "gcf":
+        raise ValueError(f"Unknown backend: {name}")
+    if GCF_URLS:
+        if _multi is None:
+            _multi = MultiGCFBackend(EndpointSet(GCF_URLS))
+        return _multi
+    if not gcf_url:
+        raise RuntimeError("GCF_URL not configured")
+    return GCFBackend(gcf_url)
+
+
+def needs_gcf_url(name: str | None = None) -> bool:
+    """Whether the configured backend needs GCF_URL (or a deployment)."""
+    return (name or BACKEND) == "gcf" and not GCF_URLS
+
+
+def endpoint_states() -> list[dict]:
+    """Routing state of each GCF_URLS endpoint, once any call has used them."""
+    return _multi.endpoints.snapshot() if _multi is not None else []
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# The cache is opt-in: identical code is only assumed to produce identical
+# output when the deployment says so.
+CACHE_ENABLED = os.getenv("CODE_MCP_CACHE", "").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.getenv("CODE_MCP_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("CODE_MCP_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("CODE_MCP_CACHE_TTL", "3600"))
+CACHE_DIR = os.getenv("CODE_MCP_CACHE_DIR")
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("CODE_MCP_CACHE_DISK_MAX_ENTRIES", "10000"))
+# Changing the executor runtime invalidates every cached result
+RUNTIME_VERSION = os.getenv("CODE_MCP_RUNTIME_VERSION", "python311")
+
+
+def cache_key(
+    language: str,
+    code: str,
+    timeout: float | None = None,
+    runtime: str = RUNTIME_VERSION,
+) -> str:
+    # A shorter timeout can change the result, as in singleflight.flight_key
+    material = json.dumps([runtime, language, code, timeout], separators=(",", ":"))
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def is_cacheable(result: dict) -> bool:
+    # Timeouts and executor failures report -1 and say nothing about the code
+    return "error" not in result and result.get("exitCode", 0) != -1
+
+
+class ResultCache:
+    """In-memory LRU of executor results with a TTL and an optional on-disk
+    tier that survives restarts."""
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl: float = CACHE_TTL,
+        directory: str | Path | None = CACHE_DIR,
+        disk_max_entries: int = CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = Path(directory) if directory else None
+        self.disk_max_entries = disk_max_entries
+        self._entries: OrderedDict[str, tuple[float, dict, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._disk_entries = len(list(self.directory.glob("*.json")))
+
+    def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result, _ = entry
+            if expires > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self._evict(key)
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            expires, result = entry
+            self._remember(key, result, expires)
+            self.disk_hits += 1
+            return result
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: dict) -> None:
+        expires = time.time() + self.ttl
+        self._remember(key, result, expires)
+        self._write_disk(key, result, expires)
+
+    def _remember(self, key: str, result: dict, expires: float) -> None:
+        size = len(json.dumps(result))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (expires, result, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _read_disk(self, key: str) -> tuple[float, dict] | None:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] <= time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return entry["expires"], entry["result"]
+
+    def _write_disk(self, key: str, result: dict, expires: float) -> None:
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        try:
+            existed = path.exists()
+            tmp.write_text(json.dumps({"expires": expires, "result": result}))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry: {e!s}")
+            return
+        if not existed:
+            self._disk_entries += 1
+        if self._disk_entries > self.disk_max_entries:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        # Trim to 90% of the limit so the directory isn't rescanned on every put
+        files = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        keep = int(self.disk_max_entries * 0.9)
+        for path in files[: max(len(files) - keep, 0)]:
+            path.unlink(missing_ok=True)
+        self._disk_entries = min(len(files), keep)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+
+_cache: ResultCache | None = None
+
+
+def get_cache() -> ResultCache | None:
+    """Return the shared cache, or None when caching is not enabled."""
+    global _cache
+    if CACHE_ENABLED and _cache is None:
+        _cache = ResultCache()
+    return _cache
+
+
+async def run_cached(
+    language: str,
+    code: str,
+    fetch: Callable[[], Awaitable[dict]],
+    use_cache: bool = True,
+    timeout: float | None = None,
+) -> dict:
+    cache = get_cache()
+    if cache is None or not use_cache:
+        return await fetch()
+
+    key = cache_key(language, code, timeout)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    result = await fetch()
+    if is_cacheable(result):
+        cache.put(key, result)
+    return result
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from .gcf_deployer import GCFDeployer
+
+logger = logging.getLogger(__name__)
+
+# Function URLs resolved by earlier deployments, keyed by project/region/name
+CACHE_FILE = Path(
+    os.getenv("CODE_MCP_DEPLOY_CACHE", "~/.cache/code-mcp/deployments.json")
+).expanduser()
+# Read before asking gcloud for its default project
+PROJECT_ENV_VARS = ("GOOGLE_CLOUD_PROJECT", "CLOUDSDK_CORE_PROJECT")
+
+
+def cache_key(project_id: str, region: str, function_name: str) -> str:
+    return f"{project_id}/{region}/{function_name}"
+
+
+def _read_cache(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(path: Path, entries: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(entries, indent=2, sort_keys=True))
+    os.replace(tmp, path)
+
+
+class Deployment:
+    """Resolves the function URL without blocking the event loop.
+
+    A cached URL for the project, region and function name is used as long
+    as it was deployed from the current source and settings; otherwise
+    GCFDeployer runs in a worker thread and its URL is cached, with the
+    source hash, for the next start. Callers await ``url()``; concurrent callers share one
+    deployment, and a failed one is retried on the next call.
+    """
+
+    def __init__(
+        self, deployer: GCFDeployer | None = None, cache_file: Path = CACHE_FILE
+    ):
+        self.deployer = deployer or GCFDeployer()
+        self.cache_file = cache_file
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or (
+            self._task.done() and self._task.exception() is not None
+        ):
+            self._task = asyncio.get_running_loop().create_task(self._resolve())
+        return self._task
+
+    async def url(self) -> str:
+        return await asyncio.shield(self.start())
+
+    async def _project_id(self) -> str | None:
+        if self.deployer.project_id:
+            return self.deployer.project_id
+        for name in PROJECT_ENV_VARS:
+            if os.getenv(name):
+                return os.getenv(name)
+        try:
+            return await asyncio.to_thread(self.deployer.get_current_project)
+        except FileNotFoundError:
+            return None
+
+    async def _resolve(self) -> str:
+        source_hash = await asyncio.to_thread(self.deployer.source_hash)
+        project_id = await self._project_id()
+        if project_id:
+            self.deployer.project_id = project_id
+            key = cache_key(
+                project_id, self.deployer.region, self.deployer.function_name
+            )
+            cached = _read_cache(self.cache_file).get(key)
+            if cached and cached.get("source_hash") == source_hash:
+                logger.info(f"Using cached function URL for {key}")
+                return cached["url"]
+            if cached:
+                logger.info(
+                    f"Executor source changed since {key} was deployed, redeploying"
+                )
+
+        logger.info("Deploying the executor function in the background")
+        deployment = await asyncio.to_thread(self.deployer.deploy)
+        if not deployment["success"]:
+            raise RuntimeError(
+                f"GCF_URL not configured and deployment failed: {deployment.get('error')}"
+            )
+
+        key = cache_key(
+            deployment["project_id"], self.deployer.region, self.deployer.function_name
+        )
+        entries = _read_cache(self.cache_file)
+        entries[key] = {
+            "url": deployment["function_url"],
+            "source_hash": source_hash,
+            "deployed_at": time.time(),
+        }
+        try:
+            _write_cache(self.cache_file, entries)
+        except OSError as e:
+            logger.warning(f"Could not write deployment cache {self.cache_file}: {e!s}")
+        logger.info(f"GCF deployed at: {deployment['function_url']}")
+        return deployment["function_url"]
+
+
+_deployment: Deployment | None = None
+
+
+def get_deployment() -> Deployment:
+    """Return the process-wide deployment shared by both server implementations."""
+    global _deployment
+    if _deployment is None:
+        _deployment = Deployment()
+    return _deployment
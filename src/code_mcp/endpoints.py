@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import httpx
+
+from .http_client import ExecutorError, get_client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Comma-separated executor URLs, used instead of GCF_URL when set
+GCF_URLS = [url.strip() for url in os.getenv("GCF_URLS", "").split(",") if url.strip()]
+# Consecutive failures that open an endpoint's circuit, and seconds before a
+# single trial request is let through again
+BREAKER_FAILURES = int(os.getenv("CODE_MCP_BREAKER_FAILURES", "3"))
+BREAKER_RESET = float(os.getenv("CODE_MCP_BREAKER_RESET", "30"))
+HEALTH_INTERVAL = float(os.getenv("CODE_MCP_HEALTH_INTERVAL", "15"))
+HEALTH_TIMEOUT = float(os.getenv("CODE_MCP_HEALTH_TIMEOUT", "5"))
+
+# Weight of the newest sample in the latency average
+LATENCY_ALPHA = 0.3
+
+
+class EndpointsUnavailable(Exception):
+    """Every executor endpoint is failing or has its circuit open."""
+
+
+class UnknownEndpoint(Exception):
+    """A call was pinned to a URL that isn't one of the endpoints."""
+
+
+def _is_failure(error: Exception) -> bool:
+    """Errors that say the endpoint is unhealthy, not that the request was bad."""
+    if isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, ExecutorError) and error.response.status_code >= 500
+
+
+def _can_retry(error: Exception) -> bool:
+    """Errors after which the code certainly did not run, so another
+    endpoint may be tried."""
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return isinstance(error, ExecutorError) and error.response.status_code in (429, 503)
+
+
+class Endpoint:
+    def __init__(
+        self,
+        url: str,
+        failure_threshold: int = BREAKER_FAILURES,
+        reset_timeout: float = BREAKER_RESET,
+    ):
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency: float | None = None
+        self.in_flight = 0
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def score(self) -> float:
+        # Endpoints without a sample yet score 0 so each gets tried early
+        return (self.latency or 0.0) * (self.in_flight + 1)
+
+    def record_success(self, latency: float | None = None) -> None:
+        if latency is not None:
+            self.latency = (
+                latency
+                if self.latency is None
+                else (LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * self.latency)
+            )
+        if self.opened_at is not None:
+            logger.info(f"Circuit closed for {self.url}")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        half_open = self.state == "half_open"
+        self.probing = False
+        if half_open or (
+            self.opened_at is None and self.failures >= self.failure_threshold
+        ):
+            logger.warning(
+                f"Circuit opened for {self.url} after {self.failures} failures"
+            )
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "latency_ms": self.latency * 1000 if self.latency is not None else None,
+            "in_flight": self.in_flight,
+            "failures": self.failures,
+        }
+
+
+class EndpointSet:
+    """Routes each call to the endpoint with the lowest latency weighted by
+    its in-flight calls, skipping endpoints whose circuit is open.
+
+    Calls that fail before reaching user code (connection errors, 429 and
+    503) move on to the next endpoint; others are not retried, since the
+    code may already have run.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        failure_threshold: int = BREAKER_FAILURES,
+        reset_timeout: float = BREAKER_RESET,
+        health_interval: float = HEALTH_INTERVAL,
+    ):
+        if not urls:
+            raise ValueError("At least one endpoint URL is required")
+        self.endpoints = [
+            Endpoint(url, failure_threshold, reset_timeout) for url in urls
+        ]
+        self.health_interval = health_interval
+        self._health_task: asyncio.Task | None = None
+
+    def get(self, url: str) -> Endpoint | None:
+        for endpoint in self.endpoints:
+            if endpoint.url == url:
+                return endpoint
+        return None
+
+    def pick(self, exclude: set[str] = frozenset()) -> Endpoint | None:
+        candidates = [
+            e for e in self.endpoints if e.url not in exclude and e.available()
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=Endpoint.score)
+
+    async def call(
+        self, send: Callable[[str], Awaitable[T]], pinned: str | None = None
+    ) -> T:
+        """Await send(url) on the best endpoint, or on ``pinned`` only."""
+        self.start_health_checks()
+        tried: set[str] = set()
+        last_error: Exception | None = None
+
+        while True:
+            endpoint = self.get(pinned) if pinned else self.pick(tried)
+            if endpoint is None and pinned:
+                raise UnknownEndpoint(
+                    f"Executor endpoint {pinned} is not one of GCF_URLS"
+                )
+            if endpoint is None:
+                if last_error is not None:
+                    raise last_error
+                raise EndpointsUnavailable(
+                    "No executor endpoint available: all circuits are open"
+                )
+            tried.add(endpoint.url)
+
+            probe = endpoint.state == "half_open"
+            if probe:
+                endpoint.probing = True
+            endpoint.in_flight += 1
+            started = time.perf_counter()
+            try:
+                result = await send(endpoint.url)
+            except Exception as e:
+                if _is_failure(e):
+                    endpoint.record_failure()
+                else:
+                    endpoint.record_success()
+                if pinned or not _can_retry(e):
+                    raise
+                logger.info(
+                    f"Failing over from {endpoint.url}: {str(e) or type(e).__name__}"
+                )
+                last_error = e
+                continue
+            else:
+                endpoint.record_success(time.perf_counter() - started)
+                return result
+            finally:
+                endpoint.in_flight -= 1
+                # A cancelled probe says nothing either way; let another call try
+                if probe:
+                    endpoint.probing = False
+
+    def start_health_checks(self) -> None:
+        if self._health_task is not None or self.health_interval <= 0:
+            return
+        try:
+            self._health_task = asyncio.get_running_loop().create_task(
+                self._health_loop()
+            )
+        except RuntimeError:
+            pass
+
+    async def check(self, endpoint: Endpoint) -> bool:
+        try:
+            await get_client().probe(
+                endpoint.url.rstrip("/") + "/metrics", timeout=HEALTH_TIMEOUT
+            )
+        except httpx.HTTPError as e:
+            if _is_failure(e):
+                endpoint.record_failure()
+                return False
+        endpoint.record_success()
+        return True
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*(self.check(endpoint) for endpoint in self.endpoints))
+
+    async def aclose(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    def snapshot(self) -> list[dict]:
+        return [endpoint.snapshot() for endpoint in self.endpoints]
@@ -0,0 +1,145 @@
+import base64
+import hashlib
+import os
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from .backends import Backend
+from .http_client import ExecutorError
+
+# Local files the tools may read as inputs or write as outputs must be under
+# this directory, after symlinks are resolved. Relative paths are taken from
+# here.
+FILES_ROOT = os.path.realpath(
+    os.path.expanduser(os.getenv("CODE_MCP_FILES_ROOT", os.getcwd()))
+)
+
+# Digests the executor is known to hold, so repeated runs with the same
+# input files skip the missing_blobs round trip. A stale entry costs one
+# retry with the content attached (the executor answers 409).
+MAX_KNOWN_BLOBS = 4096
+
+
+class KnownBlobs:
+    def __init__(self, size: int = MAX_KNOWN_BLOBS):
+        self.size = size
+        self._digests: OrderedDict[str, None] = OrderedDict()
+
+    def __contains__(self, digest: str) -> bool:
+        if digest in self._digests:
+            self._digests.move_to_end(digest)
+            return True
+        return False
+
+    def add(self, digest: str) -> None:
+        self._digests[digest] = None
+        self._digests.move_to_end(digest)
+        while len(self._digests) > self.size:
+            self._digests.popitem(last=False)
+
+    def discard(self, digest: str) -> None:
+        self._digests.pop(digest, None)
+
+
+KNOWN = KnownBlobs()
+
+
+def resolve_path(path: str) -> str:
+    """Real path of path, which must be under FILES_ROOT."""
+    resolved = os.path.realpath(os.path.join(FILES_ROOT, os.path.expanduser(path)))
+    if os.path.commonpath([FILES_ROOT, resolved]) != FILES_ROOT:
+        raise ValueError(
+            f"{path} is outside {FILES_ROOT}; set CODE_MCP_FILES_ROOT to allow it"
+        )
+    return resolved
+
+
+class InputFiles:
+    """Local files to place in a run's working directory, by file name."""
+
+    def __init__(self, paths: list[str]):
+        self.files: dict[str, str] = {}
+        self.blobs: dict[str, bytes] = {}
+        for path in paths:
+            name = os.path.basename(os.path.normpath(path))
+            if name in self.files:
+                raise ValueError(f"Two input files are named {name}")
+            with open(resolve_path(path), "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            self.files[name] = digest
+            self.blobs[digest] = data
+
+    async def missing(self, backend: Backend) -> list[str]:
+        """Digests the executor doesn't have yet."""
+        unknown = [digest for digest in self.blobs if digest not in KNOWN]
+        if not unknown:
+            return []
+        result = await backend.execute({"action": "missing_blobs", "digests": unknown})
+        return result["missing"]
+
+    def options(self, digests: list[str]) -> dict:
+        """Run request fields with the content of ``digests`` attached."""
+        options = {"files": self.files}
+        if digests:
+            options["blobs"] = {
+                digest: base64.b64encode(self.blobs[digest]).decode()
+                for digest in digests
+            }
+        return options
+
+
+async def send_with_files(
+    backend: Backend,
+    inputs: InputFiles | None,
+    collect: bool,
+    send: Callable[[dict], Awaitable[dict]],
+) -> dict:
+    """Await send(options) with the input files and collectFiles flag set.
+
+    Only blobs the executor is missing are uploaded. If it has evicted one
+    since (or the call reached another instance), the run is rejected before
+    any code runs and is sent once more with every blob attached.
+    """
+    options = {"collectFiles": True} if collect else {}
+    if inputs is None:
+        result = await send(options)
+    else:
+        missing = await inputs.missing(backend)
+        try:
+            result = await send({**options, **inputs.options(missing)})
+        except ExecutorError as e:
+            if e.response.status_code != 409:
+                raise
+            for digest in inputs.blobs:
+                KNOWN.discard(digest)
+            result = await send({**options, **inputs.options(list(inputs.blobs))})
+        for digest in inputs.blobs:
+            KNOWN.add(digest)
+
+    # Collected outputs are kept by the executor too, so they can be used as
+    # inputs without another upload
+    for entry in result.get("files", []):
+        if "sha256" in entry:
+            KNOWN.add(entry["sha256"])
+    return result
+
+
+def save_outputs(result: dict, output_dir: str, overwrite: bool = False) -> None:
+    """Write collected files under output_dir, recording where in each entry.
+    Existing files are only replaced with ``overwrite``."""
+    root = resolve_path(output_dir)
+    for entry in result.get("files", []):
+        if "content" not in entry:
+            continue
+        path = os.path.realpath(os.path.join(root, entry["name"]))
+        if os.path.commonpath([root, path]) != root:
+            entry["skipped"] = "path outside the output directory"
+            continue
+        if os.path.lexists(path) and not overwrite:
+            entry["skipped"] = "file exists; pass overwrite to replace it"
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(entry.pop("content")))
+        entry["path"] = path
@@ -1,10 +1,20 @@
-import os
-import subprocess
+import hashlib
+import json
 import logging
+import subprocess
+import sys
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Label holding the hash of the source and settings a function was deployed
+# with; a deploy is skipped when it matches
+SOURCE_HASH_LABEL = "code-mcp-source-hash"
+# Label values are limited to 63 characters
+HASH_LENGTH = 32
+IGNORED_DIRS = {"__pycache__", "node_modules"}
+IGNORED_SUFFIXES = (".pyc", ".pyo")
+
 
 class GCFDeployer:
     def __init__(self, project_id=None):
@@ -12,96 +22,193 @@ class GCFDeployer:
         self.function_name = "code-interpreter"
         self.region = "us-central1"
         self.gcf_source_dir = Path(__file__).parent.parent.parent / "gcf"
-    
+        self.runtime = "python311"
+        self.entry_point = "execute_code"
+        self.timeout = "60s"
+        self.memory = "256MB"
+
     def check_gcloud_installed(self) -> bool:
         try:
-            print("🔍 Checking for gcloud CLI...")
+            print("🔍 Checking for gcloud CLI...", file=sys.stderr)
             subprocess.run(["gcloud", "--version"], capture_output=True, text=True)
-            print("✅ gcloud CLI found")
+            print("✅ gcloud CLI found", file=sys.stderr)
             return True
         except FileNotFoundError:
             logger.error("gcloud CLI not found. Please install Google Cloud SDK.")
             return False
-    
+
     def get_current_project(self) -> str:
-        print("🔍 Getting current GCP project...")
+        print("🔍 Getting current GCP project...", file=sys.stderr)
         result = subprocess.run(
-            ["gcloud", "config", "get-value", "project"],
-            capture_output=True,
-            text=True
+            ["gcloud", "config", "get-value", "project"], capture_output=True, text=True
         )
-        
+
         if result.returncode == 0:
             project = result.stdout.strip()
-            print(f"📋 Current project: {project}")
+            print(f"📋 Current project: {project}", file=sys.stderr)
             return project
-        print("⚠️  No default project set")
+        print("⚠️  No default project set", file=sys.stderr)
         return None
-    
-    def deploy_function(self) -> bool:
+
+    def source_files(self) -> list[Path]:
+        files = []
+        for path in sorted(self.gcf_source_dir.rglob("*")):
+            relative = path.relative_to(self.gcf_source_dir)
+            if not path.is_file() or IGNORED_DIRS.intersection(relative.parts):
+                continue
+            if path.suffix in IGNORED_SUFFIXES:
+                continue
+            files.append(path)
+        return files
+
+    def source_hash(self) -> str:
+        """Hash of the executor source and every setting passed to the deploy."""
+        digest = hashlib.sha256()
+        config = {
+            "runtime": self.runtime,
+            "entry_point": self.entry_point,
+            "region": self.region,
+            "timeout": self.timeout,
+            "memory": self.memory,
+        }
+        digest.update(json.dumps(config, sort_keys=True).encode())
+        for path in self.source_files():
+            digest.update(
+                b"\0"
+                + path.relative_to(self.gcf_source_dir).as_posix().encode()
+                + b"\0"
+            )
+            digest.update(path.read_bytes())
+        return digest.hexdigest()[:HASH_LENGTH]
+
+    def describe_function(self) -> dict | None:
+        """The deployed function's description, or None if it doesn't exist."""
         cmd = [
-            "gcloud", "functions", "deploy", self.function_name,
-            "--runtime=python311",
+            "gcloud",
+            "functions",
+            "describe",
+            self.function_name,
+            "--region",
+            self.region,
+            "--format",
+            "json",
+        ]
+
+        if self.project_id:
+            cmd.append(f"--project={self.project_id}")
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        except FileNotFoundError:
+            return None
+
+        if result.returncode != 0:
+            return None
+        try:
+            return json.loads(result.stdout)
+        except ValueError:
+            logger.warning("Could not parse gcloud functions describe output")
+            return None
+
+    def deploy_function(self, source_hash: str | None = None) -> bool:
+        cmd = [
+            "gcloud",
+            "functions",
+            "deploy",
+            self.function_name,
+            f"--runtime={self.runtime}",
             "--trigger-http",
             "--allow-unauthenticated",
-            "--entry-point=execute_code",
+            f"--entry-point={self.entry_point}",
             f"--source={self.gcf_source_dir}",
             f"--region={self.region}",
-            "--timeout=60s",
-            "--memory=256MB"
+            f"--timeout={self.timeout}",
+            f"--memory={self.memory}",
         ]
-        
+
+        if source_hash:
+            cmd.append(f"--update-labels={SOURCE_HASH_LABEL}={source_hash}")
+
         if self.project_id:
             cmd.append(f"--project={self.project_id}")
-        
+
         logger.info(f"Deploying function with command: {' '.join(cmd)}")
-        print(f"⏳ Deploying function (this may take 1-2 minutes)...")
-        
-        result = subprocess.run(cmd, capture_output=False, text=True)
-        
+        print("⏳ Deploying function (this may take 1-2 minutes)...", file=sys.stderr)
+
+        # gcloud's progress output must stay off stdout, which carries the
+        # MCP protocol when deploying from the stdio server
+        result = subprocess.run(cmd, stdout=sys.stderr, text=True, check=False)
+
         if result.returncode == 0:
             logger.info("Function deployed successfully")
             return True
         else:
-            logger.error(f"Deployment failed: {result.stderr}")
+            # gcloud has already printed its error to stderr
+            logger.error(
+                f"Deployment failed: gcloud exited with code {result.returncode}"
+            )
             return False
-    
+
     def get_function_url(self) -> str:
         cmd = [
-            "gcloud", "functions", "describe", self.function_name,
-            "--region", self.region,
-            "--format", "value(httpsTrigger.url)"
+            "gcloud",
+            "functions",
+            "describe",
+            self.function_name,
+            "--region",
+            self.region,
+            "--format",
+            "value(httpsTrigger.url)",
         ]
-        
+
         if self.project_id:
             cmd.append(f"--project={self.project_id}")
-        
+
         result = subprocess.run(cmd, capture_output=True, text=True)
-        
+
         if result.returncode == 0:
             return result.stdout.strip()
         return None
-    
-    def deploy(self) -> dict:
+
+    def deploy(self, force: bool = False) -> dict:
+        """Deploy the function unless it already runs this source and config.
+
+        ``force`` deploys even when the source hash label matches.
+        """
         if not self.check_gcloud_installed():
             return {"success": False, "error": "gcloud CLI not installed"}
-        
+
         if not self.project_id:
             self.project_id = self.get_current_project()
             if not self.project_id:
                 return {"success": False, "error": "No GCP project configured"}
-        
+
         logger.info(f"Using GCP project: {self.project_id}")
-        
-        if not self.deploy_function():
+
+        source_hash = self.source_hash()
+        if not force:
+            described = self.describe_function() or {}
+            deployed_hash = (described.get("labels") or {}).get(SOURCE_HASH_LABEL)
+            function_url = (described.get("httpsTrigger") or {}).get("url")
+            if deployed_hash == source_hash and function_url:
+                logger.info(
+                    f"Function source unchanged ({source_hash}), skipping deploy"
+                )
+                return {
+                    "success": True,
+                    "function_url": function_url,
+                    "project_id": self.project_id,
+                }
+
+        if not self.deploy_function(source_hash):
             return {"success": False, "error": "Function deployment failed"}
-        
+
         function_url = self.get_function_url()
         if not function_url:
             return {"success": False, "error": "Could not retrieve function URL"}
-        
+
         return {
             "success": True,
             "function_url": function_url,
-            "project_id": self.project_id
-        }
\ No newline at end of file
+            "project_id": self.project_id,
+        }
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Hedging is opt-in: a hedged snippet may run twice, so only enable it for
+# code without side effects outside the sandbox.
+HEDGE = os.getenv("CODE_MCP_HEDGE", "").lower() in ("1", "true", "yes")
+# A duplicate request is sent once the first has taken longer than this
+# percentile of recent latencies, clamped to [MIN_DELAY, MAX_DELAY]. Until
+# MIN_SAMPLES latencies are known, MAX_DELAY is used.
+#
+# Latencies include the code's own run time, so a slow answer may just be a
+# long run. Snippets seen taking longer than MAX_DELAY are not hedged again,
+# and nothing is hedged while the percentile itself is above MAX_DELAY.
+HEDGE_PERCENTILE = float(os.getenv("CODE_MCP_HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.getenv("CODE_MCP_HEDGE_MIN_DELAY", "0.05"))
+HEDGE_MAX_DELAY = float(os.getenv("CODE_MCP_HEDGE_MAX_DELAY", "2"))
+HEDGE_MIN_SAMPLES = int(os.getenv("CODE_MCP_HEDGE_MIN_SAMPLES", "20"))
+# Retries for failures where the request never reached the executor
+RETRIES = int(os.getenv("CODE_MCP_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("CODE_MCP_RETRY_BACKOFF", "0.1"))
+
+WINDOW_SIZE = 512
+# Snippets remembered as running longer than MAX_DELAY
+SLOW_RUNS = 1024
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transport failures that happen before the request is sent."""
+    return isinstance(
+        error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    )
+
+
+class LatencyWindow:
+    def __init__(self, size: int = WINDOW_SIZE):
+        self._samples = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> float:
+        ordered = sorted(self._samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class HedgingPolicy:
+    def __init__(
+        self,
+        enabled: bool = HEDGE,
+        percentile: float = HEDGE_PERCENTILE,
+        min_delay: float = HEDGE_MIN_DELAY,
+        max_delay: float = HEDGE_MAX_DELAY,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        retries: int = RETRIES,
+        backoff: float = RETRY_BACKOFF,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.retries = retries
+        self.backoff = backoff
+        self.latencies = LatencyWindow()
+        self._slow: OrderedDict[str, None] = OrderedDict()
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_skipped = 0
+        self.hedges_won = 0
+        self.retried = 0
+
+    def expected_latency(self) -> float | None:
+        if len(self.latencies) < self.min_samples:
+            return None
+        return self.latencies.percentile(self.percentile)
+
+    def hedge_delay(self) -> float:
+        expected = self.expected_latency()
+        if expected is None:
+            return self.max_delay
+        return min(max(expected, self.min_delay), self.max_delay)
+
+    def _runs_long(self, key: str | None) -> bool:
+        """Whether waiting past the hedge delay is normal for this call."""
+        expected = self.expected_latency()
+        if expected is not None and expected > self.max_delay:
+            return True
+        if key is not None and key in self._slow:
+            self._slow.move_to_end(key)
+            return True
+        return False
+
+    def _observe(self, key: str | None, seconds: float) -> None:
+        if key is None:
+            return
+        if seconds > self.max_delay:
+            self._slow[key] = None
+            self._slow.move_to_end(key)
+            if len(self._slow) > SLOW_RUNS:
+                self._slow.popitem(last=False)
+        else:
+            # A cold start, say, made it slow last time
+            self._slow.pop(key, None)
+
+    async def _with_retries(self, send: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                result = await send()
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                self.retried += 1
+                # Full jitter keeps retries from many callers from lining up
+                await asyncio.sleep(random.uniform(0, self.backoff * 2**attempt))
+                continue
+            self.latencies.add(time.perf_counter() - started)
+            return result
+
+    async def run(
+        self,
+        send: Callable[[], Awaitable[T]],
+        hedge: bool = True,
+        key: str | None = None,
+    ) -> T:
+        """Await send(), retrying requests that never reached the executor.
+
+        With hedging enabled and ``hedge`` set, a second send() starts if the
+        first is still pending after ``hedge_delay()``; the first to succeed
+        wins and the other is cancelled. ``key`` identifies the code being
+        run (see run_key), so that snippets known to run long aren't hedged.
+        """
+        self.requests += 1
+        if not (self.enabled and hedge):
+            return await self._with_retries(send)
+        if self._runs_long(key):
+            self.hedges_skipped += 1
+            started = time.perf_counter()
+            result = await self._with_retries(send)
+            self._observe(key, time.perf_counter() - started)
+            return result
+
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(self._with_retries(send))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+        except BaseException:
+            primary.cancel()
+            raise
+        if done:
+            result = primary.result()
+            self._observe(key, time.perf_counter() - started)
+            return result
+
+        self.hedges_fired += 1
+        hedged = asyncio.ensure_future(self._with_retries(send))
+        pending = {primary, hedged}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedged:
+                            self.hedges_won += 1
+                        else:
+                            # The duplicate didn't help: the code itself takes this long
+                            self._observe(key, time.perf_counter() - started)
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedges_skipped": self.hedges_skipped,
+            "retries": self.retried,
+            "hedge_delay_ms": self.hedge_delay() * 1000,
+        }
+
+
+_policy: HedgingPolicy | None = None
+
+
+def get_policy() -> HedgingPolicy:
+    global _policy
+    if _policy is None:
+        _policy = HedgingPolicy()
+    return _policy
+
+
+def is_hedgeable(payload: dict) -> bool:
+    """Only stateless runs may be duplicated: session runs, async
+    submissions and actions change executor state."""
+    return (
+        "action" not in payload
+        and "sessionId" not in payload
+        and not payload.get("async")
+    )
+
+
+def run_key(payload: dict) -> str:
+    """Identifies the code a payload runs, for remembering slow snippets."""
+    material = json.dumps(
+        [payload.get("language"), payload.get("code"), payload.get("batch")],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
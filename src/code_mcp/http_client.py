@@ -0,0 +1,438 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from .metrics import METRICS, language_label
+from .tracing import SPANS_HEADER, TRACE_ID_HEADER, current_trace, parse_spans
+from .wire import JSON, WireCodec
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing, overridable from the environment so deployments can tune it
+# against the hit/miss and wait-time counters below.
+REQUEST_TIMEOUT = float(os.getenv("GCF_REQUEST_TIMEOUT", "35"))
+# A dead endpoint should fail fast rather than after the full request timeout
+CONNECT_TIMEOUT = float(os.getenv("GCF_CONNECT_TIMEOUT", "5"))
+MAX_CONNECTIONS = int(os.getenv("GCF_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("GCF_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("GCF_KEEPALIVE_EXPIRY", "60"))
+MAX_PER_HOST = int(os.getenv("GCF_MAX_PER_HOST", "0"))
+HTTP2 = os.getenv("GCF_HTTP2", "").lower() in ("1", "true", "yes")
+
+# Tool calls beyond MAX_CONCURRENT_REQUESTS wait for a slot; once
+# MAX_QUEUED_REQUESTS are already waiting, further calls fail immediately.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("GCF_MAX_CONCURRENT_REQUESTS", "32"))
+MAX_QUEUED_REQUESTS = int(os.getenv("GCF_MAX_QUEUED_REQUESTS", "128"))
+
+# Every request carries an id and the milliseconds the client will wait for
+# it, so the executor never runs code past the point anyone is listening.
+# A run the caller stops waiting for (cancelled, or timed out) is killed
+# with a cancel action naming that id.
+REQUEST_ID_HEADER = "X-Request-Id"
+DEADLINE_HEADER = "X-Deadline-Ms"
+CANCEL_TIMEOUT = float(os.getenv("GCF_CANCEL_TIMEOUT", "5"))
+
+
+class ExecutorError(httpx.HTTPStatusError):
+    """The executor rejected a request; the message is its error field."""
+
+
+class Overloaded(Exception):
+    """Too many tool calls are already waiting for the executor."""
+
+
+class AdmissionLimiter:
+    """Bounds concurrent executor requests with a fail-fast wait queue.
+
+    ``max_concurrent`` of 0 disables the limit.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._slots = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the block, yielding the seconds spent waiting."""
+        if self._slots is None:
+            yield 0.0
+            return
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(
+                f"Too many pending executions: {self.active} running, {self.waiting} queued"
+            )
+
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - started
+        self.admitted += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+        self.active += 1
+        try:
+            yield wait
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_ms_avg": self.wait_total * 1000 / self.admitted
+            if self.admitted
+            else 0.0,
+            "wait_ms_max": self.wait_max * 1000,
+        }
+
+
+def call_deadline(payload: dict) -> float | None:
+    """Seconds the caller will wait for the answer to payload: the run's own
+    timeout, if it set one and isn't a background job."""
+    if "async" in payload:
+        return None
+    return payload.get("timeout")
+
+
+def _raise_for_status(response: httpx.Response) -> None:
+    if response.is_success:
+        return
+    try:
+        message = response.json()["error"]
+    except (ValueError, KeyError, TypeError):
+        message = f"Executor returned HTTP {response.status_code}"
+    raise ExecutorError(message, request=response.request, response=response)
+
+
+class PoolStats:
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.in_flight = 0
+
+    def record(self, reused: bool, wait: float) -> None:
+        self.requests += 1
+        if reused:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def snapshot(self) -> dict:
+        observed = self.hits + self.misses
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / observed if observed else 0.0,
+            "wait_ms_avg": self.wait_total * 1000 / observed if observed else 0.0,
+            "wait_ms_max": self.wait_max * 1000,
+            "in_flight": self.in_flight,
+        }
+
+
+class _PoolProbe:
+    """httpcore trace hook: a request that opens a TCP connection missed the
+    pool, one that goes straight to sending headers reused a connection.
+    Time until either event is the time spent waiting for a connection."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.reused = None
+        self.wait = 0.0
+
+    async def __call__(self, event: str, info: dict) -> None:
+        if self.reused is not None:
+            return
+        if event == "connection.connect_tcp.started":
+            self.reused = False
+        elif event.endswith(".send_request_headers.started"):
+            self.reused = True
+        else:
+            return
+        self.wait = time.perf_counter() - self.started
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class GCFClient:
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive: int = MAX_KEEPALIVE,
+        max_per_host: int = MAX_PER_HOST,
+        http2: bool = HTTP2,
+        timeout: float = REQUEST_TIMEOUT,
+        max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+        max_queue: int = MAX_QUEUED_REQUESTS,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        if http2 and not _h2_available():
+            logger.warning(
+                "GCF_HTTP2 requested but the h2 package is not installed, using HTTP/1.1"
+            )
+            http2 = False
+
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.stats = PoolStats()
+        self.cancels_sent = 0
+        self._cancels: set[asyncio.Task] = set()
+        self.admission = AdmissionLimiter(max_concurrent, max_queue)
+        self.wire = WireCodec()
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            http2=http2,
+            timeout=httpx.Timeout(timeout, connect=min(CONNECT_TIMEOUT, timeout)),
+            transport=transport,
+        )
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str):
+        if self.max_per_host <= 0:
+            yield
+            return
+        host = urlsplit(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        async with limit:
+            yield
+
+    @asynccontextmanager
+    async def _tracked(self, url: str, payload: dict):
+        language = language_label(payload)
+        async with self.admission.slot() as wait:
+            METRICS.observe("queue_wait", wait, language)
+            probe = _PoolProbe(time.perf_counter())
+            self.stats.in_flight += 1
+            try:
+                with METRICS.timed("http", language):
+                    async with self._host_slot(url):
+                        yield probe
+            finally:
+                self.stats.in_flight -= 1
+                if probe.reused is not None:
+                    self.stats.record(probe.reused, probe.wait)
+
+    @asynccontextmanager
+    async def _cancel_on_abort(self, url: str, payload: dict, request_id: str):
+        """Have the executor kill the run if the block is cancelled or times
+        out while waiting for it."""
+        try:
+            yield
+        except (asyncio.CancelledError, httpx.ReadTimeout):
+            if "action" not in payload:
+                task = asyncio.get_running_loop().create_task(
+                    self._cancel(url, request_id)
+                )
+                self._cancels.add(task)
+                task.add_done_callback(self._cancels.discard)
+            raise
+
+    async def _cancel(self, url: str, request_id: str) -> None:
+        try:
+            response = await self._client.post(
+                url,
+                json={"action": "cancel", "requestId": request_id},
+                timeout=CANCEL_TIMEOUT,
+            )
+            _raise_for_status(response)
+            self.cancels_sent += 1
+        except httpx.HTTPError as e:
+            logger.warning(
+                f"Could not cancel request {request_id} at {url}: {str(e) or type(e).__name__}"
+            )
+
+    async def _send(
+        self,
+        url: str,
+        payload: dict,
+        probe: _PoolProbe,
+        request_id: str,
+        stream: bool = False,
+        deadline: float | None = None,
+    ) -> httpx.Response:
+        # The executor stops the run when this call stops waiting for it
+        wait = self.timeout if deadline is None else min(deadline, self.timeout)
+        call_headers = {
+            REQUEST_ID_HEADER: request_id,
+            DEADLINE_HEADER: str(int(wait * 1000)),
+        }
+        trace = current_trace()
+        if trace is not None:
+            call_headers[TRACE_ID_HEADER] = trace.id
+        while True:
+            content, headers = self.wire.encode(url, payload)
+            request = self._client.build_request(
+                "POST",
+                url,
+                content=content,
+                headers={**self.wire.headers(), **headers, **call_headers},
+                extensions={"trace": probe},
+            )
+            response = await self._client.send(request, stream=stream)
+            if response.status_code == 415 and headers != {"Content-Type": JSON}:
+                # The executor could not read the body, so nothing ran
+                logger.warning(
+                    f"Executor at {url} could not read the request body, falling back to plain JSON"
+                )
+                await response.aclose()
+                self.wire.forget(url)
+                continue
+            self.wire.learn(url, response)
+            return response
+
+    async def post_json(
+        self, url: str, payload: dict, deadline: float | None = None
+    ) -> dict:
+        """POST payload and decode the result. ``deadline`` is how many
+        seconds this call waits, if less than the client's timeout."""
+        request_id = uuid.uuid4().hex
+        async with (
+            self._tracked(url, payload) as probe,
+            self._cancel_on_abort(url, payload, request_id),
+        ):
+            sent = time.perf_counter()
+            response = await self._send(
+                url, payload, probe, request_id, deadline=deadline
+            )
+            elapsed = time.perf_counter() - sent
+            _raise_for_status(response)
+
+        trace = current_trace()
+        if trace is not None:
+            trace.add_remote(
+                parse_spans(response.headers.get(SPANS_HEADER)),
+                sent,
+                elapsed,
+                request_id,
+            )
+        return self.wire.decode(response)
+
+    async def stream_result(
+        self,
+        url: str,
+        payload: dict,
+        on_output: Callable[[str, str], Awaitable[None]] | None = None,
+        deadline: float | None = None,
+    ) -> dict:
+        """Request a streamed run and assemble its NDJSON events into a result.
+
+        ``on_output(stream, data)`` is awaited for every chunk as it arrives.
+        ``deadline`` is as for post_json.
+        """
+        result = {"stdout": "", "stderr": "", "exitCode": 0}
+        payload = {**payload, "stream": True}
+
+        request_id = uuid.uuid4().hex
+        async with (
+            self._tracked(url, payload) as probe,
+            self._cancel_on_abort(url, payload, request_id),
+        ):
+            sent = time.perf_counter()
+            response = await self._send(
+                url, payload, probe, request_id, stream=True, deadline=deadline
+            )
+            try:
+                if not response.is_success:
+                    await response.aread()
+                    _raise_for_status(response)
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if "data" in event:
+                        result[event["stream"]] += event["data"]
+                        if on_output is not None:
+                            await on_output(event["stream"], event["data"])
+                    else:
+                        result.update(event)
+            finally:
+                await response.aclose()
+
+        # Streamed runs send their spans with the final event
+        spans = result.pop("trace", None)
+        trace = current_trace()
+        if trace is not None:
+            trace.add_remote(spans, sent, time.perf_counter() - sent, request_id)
+        return result
+
+    async def get_text(self, url: str, timeout: float | None = None) -> str:
+        options = {"timeout": timeout} if timeout is not None else {}
+        async with self._tracked(url, {}) as probe:
+            response = await self._client.get(
+                url, extensions={"trace": probe}, **options
+            )
+            _raise_for_status(response)
+
+        return response.text
+
+    async def probe(self, url: str, timeout: float) -> None:
+        """GET url as a health check. Probes skip the admission limit and
+        the request metrics, so they neither wait behind tool calls nor
+        skew their latencies."""
+        response = await self._client.get(url, timeout=timeout)
+        _raise_for_status(response)
+
+    async def aclose(self) -> None:
+        # Let cancellations already under way reach the executor
+        if self._cancels:
+            await asyncio.gather(*self._cancels, return_exceptions=True)
+        await self._client.aclose()
+
+
+_client: GCFClient | None = None
+
+
+def get_client() -> GCFClient:
+    """Return the process-wide client shared by both server implementations."""
+    global _client
+    if _client is None:
+        _client = GCFClient()
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
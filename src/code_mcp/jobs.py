@@ -0,0 +1,34 @@
+import os
+import time
+
+from .backends import Backend
+from .files import save_outputs
+
+# Seconds each get_job request asks the executor to wait for the job; kept
+# below the executor's JOB_MAX_WAIT and the HTTP client's timeout
+JOB_POLL_WAIT = float(os.getenv("CODE_MCP_JOB_POLL_WAIT", "20"))
+
+# Where to save the output files of jobs submitted with output_dir, and
+# whether to replace existing files
+_output_dirs: dict[str, tuple[str, bool]] = {}
+
+
+def save_outputs_to(job_id: str, output_dir: str, overwrite: bool = False) -> None:
+    """Save the job's collected files under output_dir once it is done."""
+    _output_dirs[job_id] = (output_dir, overwrite)
+
+
+async def wait_for_job(backend: Backend, job_id: str, timeout: float) -> dict:
+    """Poll the executor until the job is done or ``timeout`` seconds have
+    passed, and return its last snapshot."""
+    deadline = time.monotonic() + timeout
+    while True:
+        wait = max(min(deadline - time.monotonic(), JOB_POLL_WAIT), 0)
+        job = await backend.execute(
+            {"action": "get_job", "jobId": job_id, "wait": wait}
+        )
+        if job["status"] == "done" or time.monotonic() >= deadline:
+            break
+    if job["status"] == "done" and job_id in _output_dirs:
+        save_outputs(job["result"], *_output_dirs.pop(job_id))
+    return job
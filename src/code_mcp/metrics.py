@@ -0,0 +1,163 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from .tracing import current_trace, get_writer
+
+# Upper bounds in seconds. The executor keeps its own copy of these
+# histograms in gcf/metrics.py since it is deployed on its own.
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+class StageMetrics:
+    """Latency histograms keyed by stage, language and outcome. Stages of a
+    traced tool call are added to its trace as well."""
+
+    def __init__(self, name: str, buckets: tuple = BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self._histograms: dict[tuple[str, str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self, stage: str, seconds: float, language: str = "none", outcome: str = "ok"
+    ) -> None:
+        key = (stage, language, outcome)
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                # Bucket counts, then sum and count
+                entry = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            entry[1] += seconds
+            entry[2] += 1
+        trace = current_trace()
+        if trace is not None:
+            trace.add(
+                stage,
+                time.perf_counter() - seconds,
+                seconds,
+                language=language,
+                outcome=outcome,
+            )
+
+    @contextmanager
+    def timed(self, stage: str, language: str = "none"):
+        """Time the block; it may set ``outcome["outcome"]`` before exiting.
+        Exceptions are recorded as failed."""
+        outcome = {"outcome": "ok"}
+        started = time.perf_counter()
+        try:
+            yield outcome
+        except BaseException:
+            outcome["outcome"] = "failed"
+            raise
+        finally:
+            self.observe(
+                stage, time.perf_counter() - started, language, outcome["outcome"]
+            )
+
+    def render(self) -> str:
+        """Render the histograms in the Prometheus text exposition format."""
+        with self._lock:
+            entries = sorted(
+                (key, [list(counts), total, count])
+                for key, (counts, total, count) in self._histograms.items()
+            )
+
+        lines = [
+            f"# HELP {self.name} Time spent in each stage of a tool call",
+            f"# TYPE {self.name} histogram",
+        ]
+        for (stage, language, outcome), (counts, total, count) in entries:
+            labels = f'stage="{stage}",language="{language}",outcome="{outcome}"'
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(prefix: str, values: dict) -> str:
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def language_label(payload: dict) -> str:
+    if "language" in payload:
+        return payload["language"]
+    if "batch" in payload:
+        return "batch"
+    return "action"
+
+
+def outcome_of(result: dict) -> str:
+    if "error" in result:
+        return "invalid"
+    exit_code = result.get("exitCode", 0)
+    if exit_code == 0:
+        return "ok"
+    if exit_code == -1:
+        return "failed"
+    return "error"
+
+
+METRICS = StageMetrics("code_mcp_stage_seconds")
+
+
+def render_all() -> str:
+    """Server histograms plus connection pool, admission, wire, cancellation,
+    hedging, coalescing, cache, tracing and endpoint gauges."""
+    from .backends import endpoint_states
+    from .cache import get_cache
+    from .hedging import get_policy
+    from .http_client import get_client
+    from .singleflight import get_flights
+
+    client = get_client()
+    body = METRICS.render()
+    body += render_gauges("code_mcp_pool", client.stats.snapshot())
+    body += render_gauges("code_mcp_admission", client.admission.snapshot())
+    body += render_gauges("code_mcp_wire", client.wire.stats())
+    body += render_gauges("code_mcp_cancel", {"sent": client.cancels_sent})
+    body += render_gauges("code_mcp_hedging", get_policy().stats())
+    body += render_gauges("code_mcp_singleflight", get_flights().stats())
+    cache = get_cache()
+    if cache is not None:
+        body += render_gauges("code_mcp_cache", cache.stats())
+    writer = get_writer()
+    if writer is not None:
+        body += render_gauges("code_mcp_trace", writer.stats())
+    for endpoint in endpoint_states():
+        labels = f'url="{endpoint["url"]}",state="{endpoint["state"]}"'
+        body += f"code_mcp_endpoint_in_flight{{{labels}}} {endpoint['in_flight']}\n"
+        body += f"code_mcp_endpoint_failures{{{labels}}} {endpoint['failures']}\n"
+        if endpoint["latency_ms"] is not None:
+            body += f"code_mcp_endpoint_latency_ms{{{labels}}} {endpoint['latency_ms']:.1f}\n"
+    return body
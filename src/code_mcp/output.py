@@ -0,0 +1,84 @@
+def format_usage(usage: dict) -> str:
+    parts = [f"{usage.get('wallMs', 0)} ms wall"]
+    if "cpuUserMs" in usage:
+        parts.append(f"{usage['cpuUserMs']} ms user CPU")
+        parts.append(f"{usage['cpuSysMs']} ms system CPU")
+    if "maxRssKb" in usage:
+        parts.append(f"peak RSS {usage['maxRssKb'] / 1024:.1f} MiB")
+    return "Resource usage: " + ", ".join(parts)
+
+
+def format_profile(profile: dict) -> str:
+    counts = "calls" if profile.get("profiler") == "cProfile" else "samples"
+    lines = [
+        f"Profile ({profile.get('profiler')}, {profile.get('totalMs', 0)} ms profiled, by self time):",
+        f"{'self ms':>10} {'cum ms':>10} {counts:>9}  function",
+    ]
+    for entry in profile.get("functions", []):
+        lines.append(
+            f"{entry['selfMs']:>10.3f} {entry['cumulativeMs']:>10.3f} {entry.get(counts, 0):>9}  {entry['function']}"
+        )
+    return "\n".join(lines)
+
+
+def format_files(files: list[dict]) -> str:
+    lines = ["Files:"]
+    for entry in files:
+        line = f"- {entry['name']} ({entry.get('size', 0)} bytes)"
+        if "path" in entry:
+            line += f", saved to {entry['path']}"
+        elif entry.get("omitted"):
+            line += ", too large to return"
+        elif "skipped" in entry:
+            line += f", not saved: {entry['skipped']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def format_result(result: dict) -> str:
+    """Render an executor result as the text returned by run_code."""
+    if "error" in result:
+        return f"Error: {result['error']}"
+
+    stdout = result.get("stdout", "")
+    stderr = result.get("stderr", "")
+    exit_code = result.get("exitCode", 0)
+
+    output = stdout
+    if stderr:
+        output += f"\n\nErrors:\n{stderr}"
+    if exit_code != 0:
+        output += f"\n\nExit code: {exit_code}"
+    if result.get("truncated"):
+        output += (
+            f"\n\nOutput truncated: produced {result.get('stdoutBytes', 0)} bytes of stdout"
+            f" and {result.get('stderrBytes', 0)} bytes of stderr"
+        )
+    if result.get("usage"):
+        output += f"\n\n{format_usage(result['usage'])}"
+    if result.get("profile"):
+        output += f"\n\n{format_profile(result['profile'])}"
+    if result.get("files"):
+        output += f"\n\n{format_files(result['files'])}"
+
+    return output.strip()
+
+
+def format_job(job: dict) -> str:
+    """Render a job snapshot: the result once done, otherwise how to wait for it."""
+    if job["status"] == "done":
+        return format_result(job["result"])
+    return (
+        f"Job {job['jobId']} is {job['status']} after {job.get('elapsedMs', 0) / 1000:.1f} s;"
+        f" call get_job_result with job_id {job['jobId']} to wait for its output"
+    )
+
+
+def format_batch(snippets: list[dict], results: list[dict]) -> str:
+    sections = []
+    for index, (snippet, result) in enumerate(zip(snippets, results), start=1):
+        language = snippet.get("language", "?") if isinstance(snippet, dict) else "?"
+        sections.append(
+            f"--- Snippet {index} ({language}) ---\n{format_result(result)}"
+        )
+    return "\n\n".join(sections)
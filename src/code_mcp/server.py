@@ -1,23 +1,43 @@
-import os
-import json
 import asyncio
 import logging
-from typing import Any, Sequence
-import requests
+import os
+from collections.abc import Sequence
+from typing import Any
+
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
-from mcp.types import Tool, TextContent, CallToolRequest, ListToolsRequest
+from mcp.types import TextContent, Tool
+
+from .backends import BACKEND, Backend, get_backend, needs_gcf_url
+from .cache import run_cached
+from .deployment import get_deployment
+from .files import InputFiles, resolve_path, save_outputs, send_with_files
+from .jobs import save_outputs_to, wait_for_job
+from .metrics import METRICS, outcome_of, render_all
+from .output import format_batch, format_job, format_result
+from .singleflight import flight_key, run_coalesced
+from .tracing import traced
 
 logger = logging.getLogger(__name__)
 
+TOOL_NAMES = (
+    "run_code",
+    "get_job_result",
+    "run_code_batch",
+    "create_session",
+    "close_session",
+    "get_metrics",
+)
+
 
 class CodeInterpreterServer(Server):
     def __init__(self):
         super().__init__("code-interpreter")
+        self.backend_name = BACKEND
         self.gcf_url = os.getenv("GCF_URL")
-        if not self.gcf_url:
+        if not self.gcf_url and needs_gcf_url(self.backend_name):
             logger.warning("GCF_URL not set, will need to be configured")
-    
+
     async def list_tools(self) -> list[Tool]:
         return [
             Tool(
@@ -28,78 +48,415 @@ class CodeInterpreterServer(Server):
                     "properties": {
                         "code": {
                             "type": "string",
-                            "description": "The code to execute"
+                            "description": "The code to execute",
                         },
                         "language": {
                             "type": "string",
-                            "description": "Programming language (python, javascript, bash)",
-                            "enum": ["python", "javascript", "bash"]
+                            "description": "Programming language (python, javascript, bash; c, cpp, go, rust where the executor has the compiler)",
+                            "enum": [
+                                "python",
+                                "javascript",
+                                "bash",
+                                "c",
+                                "cpp",
+                                "go",
+                                "rust",
+                            ],
+                        },
+                        "stream": {
+                            "type": "boolean",
+                            "description": "Report output as progress notifications while the code runs",
+                            "default": False,
+                        },
+                        "cache": {
+                            "type": "boolean",
+                            "description": "Allow a cached result for identical code; set to false for non-deterministic code",
+                            "default": True,
+                        },
+                        "coalesce": {
+                            "type": "boolean",
+                            "description": "Share the execution of identical code already running; only for deterministic code",
+                            "default": False,
+                        },
+                        "session_id": {
+                            "type": "string",
+                            "description": "Run inside a session created with create_session, keeping its globals",
+                        },
+                        "usage": {
+                            "type": "boolean",
+                            "description": "Report CPU time, peak memory and wall time of the run",
+                            "default": False,
+                        },
+                        "profile": {
+                            "type": "boolean",
+                            "description": "Run Python or JavaScript under a profiler and report the functions with the most self time",
+                            "default": False,
+                        },
+                        "files": {
+                            "type": "array",
+                            "description": "Local file paths to copy into the run's working directory, by file name",
+                            "items": {"type": "string"},
+                        },
+                        "output_dir": {
+                            "type": "string",
+                            "description": "Local directory to save the files the run creates or changes in its working directory",
+                        },
+                        "overwrite": {
+                            "type": "boolean",
+                            "description": "Replace files that already exist in output_dir",
+                            "default": False,
+                        },
+                        "background": {
+                            "type": "boolean",
+                            "description": "Start the run as a job and return its id at once; collect the output with get_job_result",
+                            "default": False,
+                        },
+                        "timeout": {
+                            "type": "number",
+                            "description": "Seconds the run may take before it is killed, up to the executor's limit",
+                        },
+                    },
+                    "required": ["code", "language"],
+                },
+            ),
+            Tool(
+                name="get_job_result",
+                description="Wait for a job started with run_code(background=true) and return its output",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "job_id": {
+                            "type": "string",
+                            "description": "Job id returned by run_code",
+                        },
+                        "timeout": {
+                            "type": "number",
+                            "description": "Seconds to wait for the job before reporting that it is still running",
+                            "default": 30,
+                        },
+                    },
+                    "required": ["job_id"],
+                },
+            ),
+            Tool(
+                name="run_code_batch",
+                description="Execute several code snippets in a sandboxed environment in one round trip",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "snippets": {
+                            "type": "array",
+                            "description": "Snippets to execute, results are returned in the same order",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "code": {"type": "string"},
+                                    "language": {
+                                        "type": "string",
+                                        "enum": [
+                                            "python",
+                                            "javascript",
+                                            "bash",
+                                            "c",
+                                            "cpp",
+                                            "go",
+                                            "rust",
+                                        ],
+                                    },
+                                },
+                                "required": ["code", "language"],
+                            },
+                            "minItems": 1,
+                        },
+                        "parallel": {
+                            "type": "boolean",
+                            "description": "Run the snippets concurrently instead of one after another",
+                            "default": False,
+                        },
+                    },
+                    "required": ["snippets"],
+                },
+            ),
+            Tool(
+                name="create_session",
+                description="Start a persistent interpreter whose globals are kept between run_code calls",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "language": {
+                            "type": "string",
+                            "description": "Programming language (python, javascript)",
+                            "enum": ["python", "javascript"],
                         }
                     },
-                    "required": ["code", "language"]
-                }
-            )
+                    "required": ["language"],
+                },
+            ),
+            Tool(
+                name="close_session",
+                description="Stop a session's interpreter and free its resources",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "session_id": {
+                            "type": "string",
+                            "description": "Session returned by create_session",
+                        }
+                    },
+                    "required": ["session_id"],
+                },
+            ),
+            Tool(
+                name="get_metrics",
+                description="Report per-stage latency histograms and pool, queue and cache counters",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "executor": {
+                            "type": "boolean",
+                            "description": "Also fetch the executor's own metrics",
+                            "default": False,
+                        }
+                    },
+                },
+            ),
         ]
-    
+
     async def handle_call_tool(
         self, name: str, arguments: dict[str, Any] | None
     ) -> Sequence[TextContent]:
-        if name != "run_code":
+        if name not in TOOL_NAMES:
             raise ValueError(f"Unknown tool: {name}")
-        
+
+        if name == "get_metrics":
+            return await self.get_metrics((arguments or {}).get("executor", False))
+
         if not arguments:
             raise ValueError("Missing arguments")
-        
+
+        if name == "create_session":
+            language = arguments.get("language")
+            if not language:
+                raise ValueError("Missing required argument: language")
+            return await self.create_session(language)
+
+        if name == "close_session":
+            session_id = arguments.get("session_id")
+            if not session_id:
+                raise ValueError("Missing required argument: session_id")
+            return await self.close_session(session_id)
+
+        if name == "get_job_result":
+            job_id = arguments.get("job_id")
+            if not job_id:
+                raise ValueError("Missing required argument: job_id")
+            return await self.get_job_result(job_id, arguments.get("timeout", 30))
+
+        if name == "run_code_batch":
+            snippets = arguments.get("snippets")
+            if not snippets:
+                raise ValueError("Missing required argument: snippets")
+            return await self.run_code_batch(snippets, arguments.get("parallel", False))
+
         code = arguments.get("code")
         language = arguments.get("language")
-        
+
         if not code or not language:
             raise ValueError("Missing required arguments: code and language")
-        
-        result = await self.run_code(code, language)
+
+        result = await self.run_code(
+            code,
+            language,
+            stream=arguments.get("stream", False),
+            cache=arguments.get("cache", True),
+            coalesce=arguments.get("coalesce", False),
+            session_id=arguments.get("session_id"),
+            usage=arguments.get("usage", False),
+            profile=arguments.get("profile", False),
+            files=arguments.get("files"),
+            output_dir=arguments.get("output_dir"),
+            overwrite=arguments.get("overwrite", False),
+            background=arguments.get("background", False),
+            timeout=arguments.get("timeout"),
+        )
         return result
-    
-    async def run_code(self, code: str, language: str) -> list[TextContent]:
-        response = await self._call_gcf(code, language)
-        
-        stdout = response.get("stdout", "")
-        stderr = response.get("stderr", "")
-        exit_code = response.get("exitCode", 0)
-        
-        output = stdout
-        if stderr:
-            output += f"\n\nErrors:\n{stderr}"
-        if exit_code != 0:
-            output += f"\n\nExit code: {exit_code}"
-        
-        return [TextContent(type="text", text=output.strip())]
-    
-    async def _call_gcf(self, code: str, language: str) -> dict:
-        loop = asyncio.get_event_loop()
-        
-        def make_request():
-            return requests.post(
-                self.gcf_url,
-                json={"code": code, "language": language},
-                timeout=35
+
+    async def run_code(
+        self,
+        code: str,
+        language: str,
+        stream: bool = False,
+        cache: bool = True,
+        coalesce: bool = False,
+        session_id: str | None = None,
+        usage: bool = False,
+        profile: bool = False,
+        files: list[str] | None = None,
+        output_dir: str | None = None,
+        overwrite: bool = False,
+        background: bool = False,
+        timeout: float | None = None,
+    ) -> list[TextContent]:
+        options = {"usage": True} if usage else {}
+        if profile:
+            options["profile"] = True
+        if timeout is not None:
+            options["timeout"] = timeout
+        inputs = InputFiles(files) if files else None
+        collect = output_dir is not None
+        if collect:
+            # Refuse a directory outside the root before running anything
+            output_dir = resolve_path(output_dir)
+
+        if session_id:
+            if inputs is not None or collect:
+                raise ValueError("files and output_dir can't be used with session_id")
+            # Session state makes results depend on earlier calls
+            response = await self._call_gcf(
+                code, language, sessionId=session_id, **options
+            )
+            return [TextContent(type="text", text=format_result(response))]
+
+        if background:
+            # Never cached: the output is collected later with get_job_result
+            async def submit(file_options: dict):
+                return await self._post_gcf(
+                    {
+                        "code": code,
+                        "language": language,
+                        **options,
+                        **file_options,
+                        "async": True,
+                    }
+                )
+
+            if inputs is None and not collect:
+                job = await submit({})
+            else:
+                job = await send_with_files(
+                    await self._backend(), inputs, collect, submit
+                )
+            if collect:
+                save_outputs_to(job["jobId"], output_dir, overwrite)
+            return [TextContent(type="text", text=format_job(job))]
+
+        async def send(file_options: dict):
+            if stream:
+                return await self._stream_gcf(code, language, **options, **file_options)
+            return await self._call_gcf(code, language, **options, **file_options)
+
+        async def fetch():
+            if inputs is None and not collect:
+                return await send({})
+            return await send_with_files(await self._backend(), inputs, collect, send)
+
+        with (
+            traced("run_code", language=language),
+            METRICS.timed("tool", language) as outcome,
+        ):
+            # A cached result says nothing about what this run would cost,
+            # and is keyed on the code and timeout alone
+            measured = usage or profile
+            use_cache = cache and not measured and inputs is None and not collect
+            # Progress notifications only reach the caller that started a run
+            shared = (
+                coalesce
+                and not measured
+                and not stream
+                and inputs is None
+                and not collect
+            )
+            key = flight_key(language, code, timeout) if shared else None
+            response = await run_cached(
+                language,
+                code,
+                lambda: run_coalesced(key, fetch),
+                use_cache=use_cache,
+                timeout=timeout,
+            )
+            outcome["outcome"] = outcome_of(response)
+        if collect:
+            save_outputs(response, output_dir, overwrite)
+        return [TextContent(type="text", text=format_result(response))]
+
+    async def get_job_result(
+        self, job_id: str, timeout: float = 30
+    ) -> list[TextContent]:
+        job = await wait_for_job(await self._backend(), job_id, timeout)
+        return [TextContent(type="text", text=format_job(job))]
+
+    async def run_code_batch(
+        self, snippets: list[dict], parallel: bool = False
+    ) -> list[TextContent]:
+        with traced("run_code_batch", snippets=len(snippets)):
+            response = await self._call_gcf_batch(snippets, parallel)
+        text = format_batch(snippets, response.get("results", []))
+        return [TextContent(type="text", text=text)]
+
+    async def create_session(self, language: str) -> list[TextContent]:
+        response = await self._post_gcf(
+            {"action": "create_session", "language": language}
+        )
+        return [TextContent(type="text", text=response["sessionId"])]
+
+    async def close_session(self, session_id: str) -> list[TextContent]:
+        await self._post_gcf({"action": "close_session", "sessionId": session_id})
+        return [TextContent(type="text", text=f"Session {session_id} closed")]
+
+    async def get_metrics(self, executor: bool = False) -> list[TextContent]:
+        body = render_all()
+        if executor:
+            backend = await self._backend()
+            body += await backend.metrics_text()
+        return [TextContent(type="text", text=body)]
+
+    async def _backend(self) -> Backend:
+        if not self.gcf_url and needs_gcf_url(self.backend_name):
+            # Cached from an earlier start, or deployed in the background
+            self.gcf_url = await get_deployment().url()
+        return get_backend(self.gcf_url, self.backend_name)
+
+    async def _post_gcf(self, payload: dict) -> dict:
+        backend = await self._backend()
+        return await backend.execute(payload)
+
+    async def _call_gcf(self, code: str, language: str, **options) -> dict:
+        return await self._post_gcf({"code": code, "language": language, **options})
+
+    async def _stream_gcf(self, code: str, language: str, **options) -> dict:
+        received = 0
+
+        async def on_output(stream: str, data: str) -> None:
+            nonlocal received
+            received += len(data)
+            await self._report_progress(received, data)
+
+        backend = await self._backend()
+        return await backend.stream(
+            {"code": code, "language": language, **options}, on_output
+        )
+
+    async def _report_progress(self, progress: float, message: str) -> None:
+        try:
+            ctx = self.request_context
+        except LookupError:
+            return
+
+        token = ctx.meta.progressToken if ctx.meta else None
+        if token is not None:
+            await ctx.session.send_progress_notification(
+                token, progress, message=message
             )
-        
-        response = await loop.run_in_executor(None, make_request)
-        response.raise_for_status()
-        return response.json()
-    
+
+    async def _call_gcf_batch(self, snippets: list[dict], parallel: bool) -> dict:
+        return await self._post_gcf({"batch": snippets, "parallel": parallel})
+
     async def initialize(self, params: InitializationOptions) -> None:
         await super().initialize(params)
-        
-        if not self.gcf_url:
-            from .gcf_deployer import GCFDeployer
-            deployer = GCFDeployer()
-            deployment = deployer.deploy()
-            if deployment["success"]:
-                self.gcf_url = deployment["function_url"]
-                logger.info(f"GCF deployed at: {self.gcf_url}")
-            else:
-                logger.error("Failed to deploy GCF")
+
+        if not self.gcf_url and needs_gcf_url(self.backend_name):
+            # Tool calls await the URL; initialization does not
+            get_deployment().start()
 
 
 def create_server():
@@ -108,11 +465,12 @@ def create_server():
 
 async def main():
     server = create_server()
-    
+
     from mcp.server.stdio import StdioServerTransport
+
     transport = StdioServerTransport()
     await server.connect(transport)
-    
+
     # Keep server running
     try:
         await asyncio.Event().wait()
@@ -121,4 +479,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
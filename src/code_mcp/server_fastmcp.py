@@ -1,82 +1,280 @@
-import os
 import logging
-import asyncio
-import requests
-from mcp.server.fastmcp import FastMCP
+import os
+from contextlib import asynccontextmanager
+
+from mcp.server.fastmcp import Context, FastMCP
+from typing_extensions import TypedDict
+
+from .backends import BACKEND, Backend, get_backend, needs_gcf_url
+from .cache import run_cached
+from .deployment import get_deployment
+from .files import InputFiles, resolve_path, save_outputs, send_with_files
+from .jobs import save_outputs_to, wait_for_job
+from .metrics import METRICS, outcome_of, render_all
+from .output import format_batch, format_job, format_result
+from .singleflight import flight_key, run_coalesced
+from .tracing import traced
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
 logger = logging.getLogger(__name__)
 
-# Create MCP server
-mcp = FastMCP("code-interpreter")
-
 # Global GCF URL
 GCF_URL = os.getenv("GCF_URL")
 
 
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    # Resolve or deploy the function while the client is still connecting
+    if needs_gcf_url() and not GCF_URL:
+        get_deployment().start()
+    yield
+
+
+# Create MCP server
+mcp = FastMCP("code-interpreter", lifespan=lifespan)
+
+
+class Snippet(TypedDict):
+    code: str
+    language: str
+
+
+async def _ensure_gcf_url() -> str:
+    global GCF_URL
+
+    if not GCF_URL:
+        # Cached from an earlier start, or deployed in the background
+        GCF_URL = await get_deployment().url()
+
+    return GCF_URL
+
+
+async def _backend() -> Backend:
+    if not needs_gcf_url():
+        return get_backend()
+    return get_backend(await _ensure_gcf_url())
+
+
 @mcp.tool()
-async def run_code(code: str, language: str) -> str:
+async def run_code(
+    code: str,
+    language: str,
+    ctx: Context,
+    stream: bool = False,
+    cache: bool = True,
+    coalesce: bool = False,
+    session_id: str | None = None,
+    usage: bool = False,
+    profile: bool = False,
+    files: list[str] | None = None,
+    output_dir: str | None = None,
+    overwrite: bool = False,
+    background: bool = False,
+    timeout: float | None = None,
+) -> str:
     """
     Execute code in a sandboxed environment using Google Cloud Functions.
-    
+
     Args:
         code: The code to execute
-        language: Programming language (python, javascript, bash)
-    
+        language: Programming language (python, javascript, bash; c, cpp, go, rust where the executor has the compiler)
+        stream: Report output as progress notifications while the code runs
+        cache: Allow a cached result for identical code; set to false for non-deterministic code
+        coalesce: Share the execution of identical code already running; only for deterministic code
+        session_id: Run inside a session created with create_session, keeping its globals
+        usage: Report CPU time, peak memory and wall time of the run
+        profile: Run Python or JavaScript under a profiler and report the functions with the most self time
+        files: Local file paths to copy into the run's working directory, by file name
+        output_dir: Local directory to save the files the run creates or changes in its working directory
+        overwrite: Replace files that already exist in output_dir
+        background: Start the run as a job and return its id at once; collect the output with get_job_result
+        timeout: Seconds the run may take before it is killed, up to the executor's limit
+
     Returns:
-        The output from code execution
+        The output from code execution, or the job id when run in the background
     """
-    global GCF_URL
-    
-    if not GCF_URL:
-        # Try to deploy if not configured
-        from .gcf_deployer import GCFDeployer
-        deployer = GCFDeployer()
-        deployment = deployer.deploy()
-        if deployment["success"]:
-            GCF_URL = deployment["function_url"]
-            logger.info(f"GCF deployed at: {GCF_URL}")
-        else:
-            raise RuntimeError("GCF_URL not configured and deployment failed")
-    
-    # Call GCF
-    loop = asyncio.get_event_loop()
-    
-    def make_request():
-        return requests.post(
-            GCF_URL,
-            json={"code": code, "language": language},
-            timeout=35
+    backend = await _backend()
+    payload = {"code": code, "language": language}
+    if usage:
+        payload["usage"] = True
+    if profile:
+        payload["profile"] = True
+    if timeout is not None:
+        payload["timeout"] = timeout
+    inputs = InputFiles(files) if files else None
+    collect = output_dir is not None
+    if collect:
+        # Refuse a directory outside the root before running anything
+        output_dir = resolve_path(output_dir)
+
+    if session_id:
+        if inputs is not None or collect:
+            raise ValueError("files and output_dir can't be used with session_id")
+        # Session state makes results depend on earlier calls, so skip the cache
+        result = await backend.execute({**payload, "sessionId": session_id})
+        return format_result(result)
+
+    if background:
+        # Never cached: the output is collected later with get_job_result
+        job = await send_with_files(
+            backend,
+            inputs,
+            collect,
+            lambda options: backend.execute({**payload, **options, "async": True}),
         )
-    
+        if collect:
+            save_outputs_to(job["jobId"], output_dir, overwrite)
+        return format_job(job)
+
+    async def send(options: dict) -> dict:
+        if not stream:
+            return await backend.execute({**payload, **options})
+
+        received = 0
+
+        async def on_output(stream_name: str, data: str) -> None:
+            nonlocal received
+            received += len(data)
+            await ctx.report_progress(received, message=data)
+
+        return await backend.stream({**payload, **options}, on_output)
+
+    async def fetch() -> dict:
+        return await send_with_files(backend, inputs, collect, send)
+
+    try:
+        with (
+            traced("run_code", language=language),
+            METRICS.timed("tool", language) as outcome,
+        ):
+            # A cached result says nothing about what this run would cost,
+            # and is keyed on the code and timeout alone
+            measured = usage or profile
+            use_cache = cache and not measured and inputs is None and not collect
+            # Progress notifications only reach the caller that started a run
+            shared = (
+                coalesce
+                and not measured
+                and not stream
+                and inputs is None
+                and not collect
+            )
+            key = flight_key(language, code, timeout) if shared else None
+            result = await run_cached(
+                language,
+                code,
+                lambda: run_coalesced(key, fetch),
+                use_cache=use_cache,
+                timeout=timeout,
+            )
+            outcome["outcome"] = outcome_of(result)
+        if collect:
+            save_outputs(result, output_dir, overwrite)
+        return format_result(result)
+    except Exception as e:
+        logger.error(f"Error calling GCF: {e!s}")
+        raise
+
+
+@mcp.tool()
+async def get_job_result(job_id: str, timeout: float = 30) -> str:
+    """
+    Wait for a job started with run_code(background=true) and return its output.
+
+    Args:
+        job_id: Job id returned by run_code
+        timeout: Seconds to wait for the job before reporting that it is still running
+
+    Returns:
+        The output from code execution, or the job's status if it hasn't finished
+    """
+    backend = await _backend()
+    return format_job(await wait_for_job(backend, job_id, timeout))
+
+
+@mcp.tool()
+async def run_code_batch(snippets: list[Snippet], parallel: bool = False) -> str:
+    """
+    Execute several code snippets in one round trip to the sandbox.
+
+    Args:
+        snippets: List of {code, language} objects, results keep this order
+        parallel: Run the snippets concurrently instead of one after another
+
+    Returns:
+        The output of each snippet, in order
+    """
+    backend = await _backend()
+
     try:
-        response = await loop.run_in_executor(None, make_request)
-        response.raise_for_status()
-        result = response.json()
-        
-        stdout = result.get("stdout", "")
-        stderr = result.get("stderr", "")
-        exit_code = result.get("exitCode", 0)
-        
-        output = stdout
-        if stderr:
-            output += f"\n\nErrors:\n{stderr}"
-        if exit_code != 0:
-            output += f"\n\nExit code: {exit_code}"
-        
-        return output.strip()
+        with traced("run_code_batch", snippets=len(snippets)):
+            result = await backend.execute({"batch": snippets, "parallel": parallel})
+        return format_batch(snippets, result.get("results", []))
     except Exception as e:
-        logger.error(f"Error calling GCF: {str(e)}")
+        logger.error(f"Error calling GCF: {e!s}")
         raise
 
 
+@mcp.tool()
+async def create_session(language: str) -> str:
+    """
+    Start a persistent interpreter whose globals are kept between run_code calls.
+
+    Args:
+        language: Programming language (python, javascript)
+
+    Returns:
+        The session id to pass to run_code and close_session
+    """
+    backend = await _backend()
+    result = await backend.execute({"action": "create_session", "language": language})
+    return result["sessionId"]
+
+
+@mcp.tool()
+async def close_session(session_id: str) -> str:
+    """
+    Stop a session's interpreter and free its resources.
+
+    Args:
+        session_id: Session returned by create_session
+    """
+    backend = await _backend()
+    await backend.execute({"action": "close_session", "sessionId": session_id})
+    return f"Session {session_id} closed"
+
+
+@mcp.tool()
+async def get_metrics(executor: bool = False) -> str:
+    """
+    Report per-stage latency histograms and pool, queue and cache counters.
+
+    Args:
+        executor: Also fetch the executor's own metrics
+
+    Returns:
+        Metrics in the Prometheus text format
+    """
+    body = render_all()
+    if executor:
+        backend = await _backend()
+        body += await backend.metrics_text()
+    return body
+
+
 def main():
     """Entry point for the MCP server"""
-    if not GCF_URL:
-        logger.warning("GCF_URL not set, will attempt to deploy on first use")
+    if BACKEND == "local":
+        logger.info("Using the local execution backend")
+    elif needs_gcf_url() and not GCF_URL:
+        logger.warning(
+            "GCF_URL not set, will use a cached deployment or deploy in the background"
+        )
     mcp.run()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
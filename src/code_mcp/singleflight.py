@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections.abc import Awaitable, Callable
+
+# Identical run_code calls in flight at the same time may share one
+# execution. Code that is not deterministic would silently get another
+# call's output, so it is off unless enabled here and asked for per call
+# with coalesce=true.
+COALESCE = os.getenv("CODE_MCP_COALESCE", "0").lower() in ("1", "true", "yes")
+
+
+def flight_key(language: str, code: str, timeout: float | None = None) -> str:
+    """Calls with the same key may share an execution. A shorter timeout
+    can change the result, so it is part of the key."""
+    material = json.dumps([language, code, timeout], separators=(",", ":"))
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs concurrent calls with the same key once and hands the result,
+    or the error, to every caller.
+
+    The execution belongs to no single caller: it keeps running when the
+    caller that started it goes away, and is cancelled only once every
+    caller has.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def run(self, key: str, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fetch()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Nobody is left to read the result
+                self.abandoned += 1
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _land(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+
+
+_flights: SingleFlight | None = None
+
+
+def get_flights() -> SingleFlight:
+    global _flights
+    if _flights is None:
+        _flights = SingleFlight()
+    return _flights
+
+
+async def run_coalesced(key: str | None, fetch: Callable[[], Awaitable[dict]]) -> dict:
+    """Share ``fetch`` with identical calls in flight; a None key, or
+    CODE_MCP_COALESCE unset, runs it alone."""
+    if key is None or not COALESCE:
+        return await fetch()
+    return await get_flights().run(key, fetch)
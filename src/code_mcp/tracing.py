@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Tracing is off unless CODE_MCP_TRACE_FILE is set. A sampled tool call
+# records a span for each stage (the tool call, queueing for a connection,
+# each HTTP request and the executor's own stages) and appends them to the
+# file in the Chrome trace event format, for chrome://tracing or Perfetto.
+# Calls that aren't sampled only pay for the random draw.
+TRACE_FILE = os.getenv("CODE_MCP_TRACE_FILE")
+TRACE_SAMPLE = float(os.getenv("CODE_MCP_TRACE_SAMPLE", "1"))
+
+# Must match gcf/tracing.py
+TRACE_ID_HEADER = "X-Trace-Id"
+SPANS_HEADER = "X-Trace-Spans"
+
+# Chrome traces want wall-clock microseconds; spans are timed with perf_counter
+_EPOCH = time.time() - time.perf_counter()
+
+_current: ContextVar["Trace | None"] = ContextVar("code_mcp_trace", default=None)
+
+
+class Trace:
+    """Spans of one sampled tool call. Tasks started during the call, such
+    as hedged requests, inherit it."""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: list[dict] = []
+
+    def add(
+        self, name: str, start: float, seconds: float, category: str = "server", **args
+    ) -> None:
+        self.spans.append(
+            {
+                "name": name,
+                "start": start,
+                "seconds": seconds,
+                "category": category,
+                "args": args,
+            }
+        )
+
+    def add_remote(
+        self, spans: list[dict] | None, start: float, seconds: float, request_id: str
+    ) -> None:
+        """Place the executor's spans for a request that took ``seconds``
+        from ``start``. Its clock can't be compared with ours, so its time
+        is centred in the request, splitting network time evenly."""
+        if not spans:
+            return
+        total = max(
+            (s["durMs"] for s in spans if s["name"] == "execute_code"), default=None
+        )
+        offset = (
+            start + max(seconds - total / 1000, 0) / 2 if total is not None else start
+        )
+        for span in spans:
+            self.add(
+                span["name"],
+                offset + span["startMs"] / 1000,
+                span["durMs"] / 1000,
+                "executor",
+                requestId=request_id,
+            )
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+def parse_spans(value: str | None) -> list[dict] | None:
+    """The executor's spans from its response header."""
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {SPANS_HEADER} header")
+        return None
+
+
+class TraceWriter:
+    """Appends traces to a file as Chrome trace events, one tool call per
+    row. The closing bracket of the JSON array is optional in this format,
+    so the file stays valid while it grows."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.written = 0
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def events(self, trace: Trace, row: int) -> list[dict]:
+        pid = os.getpid()
+        events = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": row,
+                "args": {"name": f"{trace.name} {trace.id[:8]}"},
+            }
+        ]
+        for span in trace.spans:
+            events.append(
+                {
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": round((_EPOCH + span["start"]) * 1e6, 1),
+                    "dur": round(span["seconds"] * 1e6, 1),
+                    "pid": pid,
+                    "tid": row,
+                    "args": {"traceId": trace.id, **span["args"]},
+                }
+            )
+        return events
+
+    def write(self, trace: Trace) -> None:
+        with self._lock:
+            self._rows += 1
+            lines = "".join(
+                json.dumps(event) + ",\n" for event in self.events(trace, self._rows)
+            )
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a") as f:
+                    if f.tell() == 0:
+                        f.write("[\n")
+                    f.write(lines)
+            except OSError as e:
+                logger.warning(f"Could not write trace: {e!s}")
+                return
+            self.written += 1
+
+    def stats(self) -> dict:
+        return {"written": self.written}
+
+
+_writer: TraceWriter | None = None
+
+
+def get_writer() -> TraceWriter | None:
+    """Return the shared writer, or None when tracing is not enabled."""
+    global _writer
+    if TRACE_FILE and _writer is None:
+        _writer = TraceWriter(TRACE_FILE)
+    return _writer
+
+
+@contextmanager
+def traced(name: str, **args):
+    """Trace the block as one tool call if it is sampled. Nested calls join
+    the trace already in progress."""
+    writer = get_writer()
+    if writer is None or _current.get() is not None or random.random() >= TRACE_SAMPLE:
+        yield
+        return
+    trace = Trace(name)
+    token = _current.set(trace)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        trace.add(name, trace.started, time.perf_counter() - trace.started, **args)
+        writer.write(trace)
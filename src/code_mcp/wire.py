@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import msgpack
+except ImportError:  # optional, payloads stay JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# "auto" uses msgpack and compression once the executor advertises them;
+# "json" always sends plain JSON. The executor keeps its own copy of the
+# codecs in gcf/wire.py since it is deployed on its own.
+WIRE_FORMAT = os.getenv("GCF_WIRE_FORMAT", "auto").lower()
+# Request bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("GCF_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+def _encodings() -> list[str]:
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def _tokens(header: str) -> set[str]:
+    return {
+        item.split(";")[0].strip().lower() for item in header.split(",") if item.strip()
+    }
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class Peer:
+    """What an executor said it accepts in its last response."""
+
+    def __init__(self, msgpack: bool = False, encoding: str | None = None):
+        self.msgpack = msgpack
+        self.encoding = encoding
+
+
+class WireCodec:
+    """Negotiates request and response bodies with each executor host.
+
+    The first request to a host is plain JSON. The executor's response lists
+    the encodings (Accept-Encoding) and body formats (Accept-Post) it reads,
+    and later requests use the best ones both sides support. Executors that
+    send neither header keep getting plain JSON.
+    """
+
+    def __init__(
+        self,
+        wire_format: str = WIRE_FORMAT,
+        compress_min_bytes: int = COMPRESS_MIN_BYTES,
+    ):
+        self.enabled = wire_format != "json"
+        self.compress_min_bytes = compress_min_bytes
+        self._peers: dict[str, Peer] = {}
+        self.bytes_sent = 0
+        self.bytes_uncompressed = 0
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlsplit(url).netloc
+
+    def headers(self) -> dict:
+        """Headers asking for msgpack responses when this side can read them.
+
+        httpx fills in Accept-Encoding with the encodings it can decode.
+        """
+        if self.enabled and msgpack is not None:
+            return {"Accept": f"{MSGPACK}, {JSON};q=0.9"}
+        return {}
+
+    def encode(self, url: str, payload: dict) -> tuple[bytes, dict]:
+        """Serialize payload for url, returning the body and its headers."""
+        peer = self._peers.get(self._host(url)) if self.enabled else None
+        if peer is not None and peer.msgpack:
+            body = msgpack.packb(payload)
+            headers = {"Content-Type": MSGPACK}
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            headers = {"Content-Type": JSON}
+
+        self.bytes_uncompressed += len(body)
+        if (
+            peer is not None
+            and peer.encoding is not None
+            and len(body) >= self.compress_min_bytes
+        ):
+            body = _compress(body, peer.encoding)
+            headers["Content-Encoding"] = peer.encoding
+        self.bytes_sent += len(body)
+        return body, headers
+
+    def learn(self, url: str, response: httpx.Response) -> None:
+        if not self.enabled:
+            return
+        accepted = _tokens(response.headers.get("Accept-Encoding", ""))
+        encoding = next((e for e in _encodings() if e in accepted), None)
+        types = _tokens(response.headers.get("Accept-Post", ""))
+        self._peers[self._host(url)] = Peer(
+            msgpack is not None and MSGPACK in types, encoding
+        )
+
+    def forget(self, url: str) -> None:
+        """Go back to plain JSON for url's host, e.g. after a 415."""
+        self._peers.pop(self._host(url), None)
+
+    @staticmethod
+    def decode(response: httpx.Response) -> dict:
+        content_type = (
+            response.headers.get("Content-Type", JSON).split(";")[0].strip().lower()
+        )
+        if content_type == MSGPACK:
+            return msgpack.unpackb(response.content)
+        return response.json()
+
+    def stats(self) -> dict:
+        return {
+            "bytes_sent": self.bytes_sent,
+            "bytes_uncompressed": self.bytes_uncompressed,
+        }
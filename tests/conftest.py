@@ -0,0 +1,22 @@
+import pytest
+from flask import Flask
+
+
+class MockRequest:
+    """Stands in for the flask.Request that execute_code receives."""
+
+    def __init__(self, json_data, headers=None, method="POST", path="/"):
+        self.json_data = json_data
+        self.headers = headers or {}
+        self.method = method
+        self.path = path
+
+    def get_json(self):
+        return self.json_data
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    with app.app_context():
+        yield app
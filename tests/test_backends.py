@@ -0,0 +1,97 @@
+from unittest.mock import AsyncMock, call, patch
+
+import pytest
+
+from src.code_mcp.backends import GCFBackend, LocalBackend, get_backend
+from src.code_mcp.http_client import ExecutorError
+from src.code_mcp.server import CodeInterpreterServer
+
+
+@pytest.fixture(scope="module")
+def local():
+    return LocalBackend(threads=4)
+
+
+async def test_local_backend_runs_code(local):
+    result = await local.execute({"code": "print(6 * 7)", "language": "python"})
+    assert result == {"stdout": "42\n", "stderr": "", "exitCode": 0}
+
+
+async def test_local_backend_runs_batch(local):
+    result = await local.execute(
+        {
+            "batch": [
+                {"code": "echo one", "language": "bash"},
+                {"code": "echo two", "language": "bash"},
+            ]
+        }
+    )
+    assert [r["stdout"] for r in result["results"]] == ["one\n", "two\n"]
+
+
+async def test_local_backend_raises_executor_errors(local):
+    with pytest.raises(ExecutorError) as exc_info:
+        await local.execute({"code": "x", "language": "cobol"})
+
+    assert str(exc_info.value) == "Unsupported language: cobol"
+    assert exc_info.value.response.status_code == 400
+
+
+async def test_local_backend_streams_output(local):
+    chunks = []
+
+    async def on_output(stream, data):
+        chunks.append((stream, data))
+
+    result = await local.stream(
+        {"code": "echo out; echo err >&2; exit 3", "language": "bash"}, on_output
+    )
+
+    assert result["stdout"] == "out\n"
+    assert result["stderr"] == "err\n"
+    assert result["exitCode"] == 3
+    assert "".join(data for stream, data in chunks if stream == "stdout") == "out\n"
+
+
+async def test_local_backend_metrics(local):
+    await local.execute({"code": "true", "language": "bash"})
+    text = await local.metrics_text()
+    assert "executor_stage_seconds_count" in text
+
+
+def test_get_backend_selects_by_name():
+    assert isinstance(get_backend("https://gcf.test/run", "gcf"), GCFBackend)
+    assert isinstance(get_backend(name="local"), LocalBackend)
+    with pytest.raises(RuntimeError):
+        get_backend(None, "gcf")
+    with pytest.raises(ValueError):
+        get_backend("https://gcf.test/run", "lambda")
+
+
+async def test_gcf_backend_uses_shared_client():
+    client = AsyncMock()
+    client.post_json.return_value = {"stdout": "", "stderr": "", "exitCode": 0}
+
+    with patch("src.code_mcp.backends.get_client", return_value=client):
+        await GCFBackend("https://gcf.test/run").execute(
+            {"code": "x", "language": "python"}
+        )
+        await GCFBackend("https://gcf.test/run").execute(
+            {"code": "x", "language": "python", "timeout": 5}
+        )
+
+    assert client.post_json.call_args_list == [
+        call("https://gcf.test/run", {"code": "x", "language": "python"}, None),
+        call(
+            "https://gcf.test/run", {"code": "x", "language": "python", "timeout": 5}, 5
+        ),
+    ]
+
+
+async def test_server_with_local_backend():
+    server = CodeInterpreterServer()
+    server.backend_name = "local"
+
+    result = await server.run_code("print(1 + 1)", "python", cache=False)
+
+    assert result[0].text == "2"
@@ -0,0 +1,98 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.code_mcp.cache import ResultCache, cache_key, is_cacheable, run_cached
+
+RESULT = {"stdout": "2\n", "stderr": "", "exitCode": 0}
+
+
+def test_cache_key_depends_on_language_code_timeout_and_runtime():
+    key = cache_key("python", "print(1+1)")
+    assert key == cache_key("python", "print(1+1)")
+    assert key != cache_key("python", "print(1+2)")
+    assert key != cache_key("bash", "print(1+1)")
+    assert key != cache_key("python", "print(1+1)", runtime="python312")
+    assert key != cache_key("python", "print(1+1)", timeout=5)
+
+
+def test_is_cacheable():
+    assert is_cacheable(RESULT)
+    assert is_cacheable({"stdout": "", "stderr": "SyntaxError", "exitCode": 1})
+    assert not is_cacheable({"stdout": "", "stderr": "timed out", "exitCode": -1})
+    assert not is_cacheable({"error": "Unsupported language: cobol"})
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2, directory=None)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    cache.get("a")
+    cache.put("c", RESULT)
+
+    assert cache.get("a") == RESULT
+    assert cache.get("b") is None
+    assert cache.get("c") == RESULT
+
+
+def test_byte_budget_evicts_entries():
+    big = {"stdout": "x" * 100, "stderr": "", "exitCode": 0}
+    cache = ResultCache(max_bytes=300, directory=None)
+    cache.put("a", big)
+    cache.put("b", big)
+    cache.put("c", big)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= 300
+
+
+def test_ttl_expires_entries():
+    cache = ResultCache(ttl=10, directory=None)
+    with patch("src.code_mcp.cache.time.time", return_value=1000.0):
+        cache.put("a", RESULT)
+    with patch("src.code_mcp.cache.time.time", return_value=1011.0):
+        assert cache.get("a") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    cache = ResultCache(directory=tmp_path)
+    cache.put("a", RESULT)
+
+    restarted = ResultCache(directory=tmp_path)
+    assert restarted.get("a") == RESULT
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get("a") == RESULT
+    assert restarted.stats()["hits"] == 1
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = ResultCache(directory=tmp_path, disk_max_entries=10)
+    for i in range(15):
+        cache.put(f"k{i}", RESULT)
+
+    assert len(list(tmp_path.glob("*.json"))) <= 10
+
+
+async def test_run_cached_hits_and_bypass():
+    cache = ResultCache(directory=None)
+    fetch = AsyncMock(return_value=RESULT)
+
+    with patch("src.code_mcp.cache.get_cache", return_value=cache):
+        assert await run_cached("python", "print(1+1)", fetch) == RESULT
+        assert await run_cached("python", "print(1+1)", fetch) == RESULT
+        assert fetch.await_count == 1
+
+        await run_cached("python", "print(1+1)", fetch, use_cache=False)
+        assert fetch.await_count == 2
+
+    assert cache.stats()["hit_rate"] == pytest.approx(0.5)
+
+
+async def test_run_cached_disabled_always_fetches():
+    fetch = AsyncMock(return_value=RESULT)
+
+    with patch("src.code_mcp.cache.get_cache", return_value=None):
+        await run_cached("python", "print(1+1)", fetch)
+        await run_cached("python", "print(1+1)", fetch)
+
+    assert fetch.await_count == 2
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.code_mcp.deployment import Deployment, cache_key
+
+
+def make_deployer(project_id="test-project", result=None, delay=0.0):
+    deployer = MagicMock()
+    deployer.project_id = project_id
+    deployer.region = "us-central1"
+    deployer.function_name = "code-interpreter"
+    deployer.source_hash.return_value = "abc123"
+
+    def deploy():
+        time.sleep(delay)
+        return result or {
+            "success": True,
+            "function_url": "https://fn.test",
+            "project_id": project_id,
+        }
+
+    deployer.deploy.side_effect = deploy
+    return deployer
+
+
+async def test_cached_url_skips_deployment(tmp_path):
+    cache_file = tmp_path / "deployments.json"
+    key = cache_key("test-project", "us-central1", "code-interpreter")
+    cache_file.write_text(
+        json.dumps(
+            {
+                key: {
+                    "url": "https://cached.test",
+                    "source_hash": "abc123",
+                    "deployed_at": 0,
+                }
+            }
+        )
+    )
+    deployer = make_deployer()
+
+    assert await Deployment(deployer, cache_file).url() == "https://cached.test"
+    deployer.deploy.assert_not_called()
+
+
+async def test_changed_source_is_redeployed(tmp_path):
+    cache_file = tmp_path / "deployments.json"
+    key = cache_key("test-project", "us-central1", "code-interpreter")
+    for source_hash in ("old", None):
+        entry = {"url": "https://cached.test", "deployed_at": 0}
+        if source_hash:
+            entry["source_hash"] = source_hash
+        cache_file.write_text(json.dumps({key: entry}))
+        deployer = make_deployer()
+
+        assert await Deployment(deployer, cache_file).url() == "https://fn.test"
+        deployer.deploy.assert_called_once()
+        assert json.loads(cache_file.read_text())[key]["source_hash"] == "abc123"
+
+
+async def test_deployment_is_cached_for_next_start(tmp_path):
+    cache_file = tmp_path / "deployments.json"
+
+    assert await Deployment(make_deployer(), cache_file).url() == "https://fn.test"
+
+    entries = json.loads(cache_file.read_text())
+    assert (
+        entries[cache_key("test-project", "us-central1", "code-interpreter")]["url"]
+        == "https://fn.test"
+    )
+    deployer = make_deployer()
+    assert await Deployment(deployer, cache_file).url() == "https://fn.test"
+    deployer.deploy.assert_not_called()
+
+
+async def test_deployment_does_not_block_event_loop(tmp_path):
+    deployer = make_deployer(delay=0.3)
+    deployment = Deployment(deployer, tmp_path / "deployments.json")
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    urls = await asyncio.gather(deployment.url(), deployment.url())
+    ticker.cancel()
+
+    assert urls == ["https://fn.test", "https://fn.test"]
+    assert deployer.deploy.call_count == 1
+    assert ticks > 10
+
+
+async def test_failed_deployment_is_retried(tmp_path):
+    deployer = make_deployer(
+        result={"success": False, "error": "Function deployment failed"}
+    )
+    deployment = Deployment(deployer, tmp_path / "deployments.json")
+
+    with pytest.raises(RuntimeError, match="Function deployment failed"):
+        await deployment.url()
+
+    deployer.deploy.side_effect = lambda: {
+        "success": True,
+        "function_url": "https://fn.test",
+        "project_id": "test-project",
+    }
+    assert await deployment.url() == "https://fn.test"
@@ -0,0 +1,205 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from src.code_mcp.backends import MultiGCFBackend
+from src.code_mcp.endpoints import (
+    Endpoint,
+    EndpointSet,
+    EndpointsUnavailable,
+    UnknownEndpoint,
+)
+from src.code_mcp.http_client import ExecutorError, GCFClient
+
+
+def executor_error(status_code):
+    request = httpx.Request("POST", "https://a.test")
+    return ExecutorError(
+        "boom", request=request, response=httpx.Response(status_code, request=request)
+    )
+
+
+def make_set(*urls, **kwargs):
+    kwargs.setdefault("health_interval", 0)
+    return EndpointSet(list(urls), **kwargs)
+
+
+async def test_prefers_lowest_latency():
+    endpoints = make_set("https://a.test", "https://b.test")
+    endpoints.get("https://a.test").record_success(0.5)
+    endpoints.get("https://b.test").record_success(0.05)
+
+    seen = []
+
+    async def send(url):
+        seen.append(url)
+        return url
+
+    await endpoints.call(send)
+    assert seen == ["https://b.test"]
+
+
+async def test_in_flight_calls_weigh_on_score():
+    endpoint = Endpoint("https://a.test")
+    endpoint.record_success(0.1)
+    idle = endpoint.score()
+    endpoint.in_flight = 3
+    assert endpoint.score() == pytest.approx(idle * 4)
+
+
+async def test_fails_over_on_connection_error():
+    endpoints = make_set("https://a.test", "https://b.test")
+
+    async def send(url):
+        if url == "https://a.test":
+            raise httpx.ConnectError("refused")
+        return "ok"
+
+    assert await endpoints.call(send) == "ok"
+    assert endpoints.get("https://a.test").failures == 1
+
+
+async def test_fails_over_when_executor_is_busy():
+    endpoints = make_set("https://a.test", "https://b.test")
+
+    async def send(url):
+        if url == "https://a.test":
+            raise executor_error(429)
+        return "ok"
+
+    assert await endpoints.call(send) == "ok"
+    # Being busy is not a health failure
+    assert endpoints.get("https://a.test").failures == 0
+
+
+async def test_does_not_retry_after_code_may_have_run():
+    endpoints = make_set("https://a.test", "https://b.test")
+    send = AsyncMock(side_effect=httpx.ReadTimeout("slow"))
+
+    with pytest.raises(httpx.ReadTimeout):
+        await endpoints.call(send)
+    assert send.await_count == 1
+
+
+async def test_circuit_opens_and_half_opens():
+    endpoints = make_set("https://a.test", failure_threshold=2, reset_timeout=0.1)
+    endpoint = endpoints.get("https://a.test")
+    send = AsyncMock(side_effect=executor_error(500))
+
+    for _ in range(2):
+        with pytest.raises(ExecutorError):
+            await endpoints.call(send)
+    assert endpoint.state == "open"
+
+    started = time.perf_counter()
+    with pytest.raises(EndpointsUnavailable):
+        await endpoints.call(send)
+    assert time.perf_counter() - started < 0.05
+
+    await asyncio.sleep(0.15)
+    assert endpoint.state == "half_open"
+    send.side_effect = None
+    send.return_value = "ok"
+    assert await endpoints.call(send) == "ok"
+    assert endpoint.state == "closed"
+
+
+async def test_cancelled_trial_lets_another_through():
+    endpoints = make_set("https://a.test", failure_threshold=1, reset_timeout=0.05)
+    endpoint = endpoints.get("https://a.test")
+    endpoint.record_failure()
+    endpoint.opened_at -= 0.05
+    started = asyncio.Event()
+
+    async def send(url):
+        started.set()
+        await asyncio.sleep(10)
+
+    task = asyncio.create_task(endpoints.call(send))
+    await started.wait()
+    assert not endpoint.available()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert endpoint.state == "half_open"
+    assert endpoint.available()
+    assert endpoint.in_flight == 0
+
+
+async def test_failed_trial_reopens_circuit():
+    endpoint = Endpoint("https://a.test", failure_threshold=1, reset_timeout=0.05)
+    endpoint.record_failure()
+    await asyncio.sleep(0.06)
+    assert endpoint.state == "half_open"
+
+    endpoint.record_failure()
+    assert endpoint.state == "open"
+
+
+async def test_health_check_closes_circuit():
+    endpoints = make_set("https://a.test", failure_threshold=1)
+    endpoint = endpoints.get("https://a.test")
+    endpoint.record_failure()
+    client = AsyncMock()
+    client.probe.return_value = None
+
+    with patch("src.code_mcp.endpoints.get_client", return_value=client):
+        assert await endpoints.check(endpoint)
+
+    assert endpoint.state == "closed"
+    client.get_text.assert_not_called()
+
+
+async def test_probe_bypasses_admission_and_metrics():
+    client = GCFClient(
+        max_concurrent=1,
+        max_queue=0,
+        transport=httpx.MockTransport(lambda r: httpx.Response(200)),
+    )
+
+    async with client.admission.slot():
+        # The only slot is taken, yet the probe goes through
+        await client.probe("https://a.test/metrics", timeout=1)
+    await client.aclose()
+
+    assert client.stats.snapshot()["requests"] == 0
+
+
+async def test_unknown_pinned_endpoint():
+    endpoints = make_set("https://a.test")
+    send = AsyncMock()
+
+    with pytest.raises(UnknownEndpoint, match="https://b.test"):
+        await endpoints.call(send, pinned="https://b.test")
+    send.assert_not_called()
+
+
+async def test_sessions_stay_on_their_endpoint():
+    endpoints = make_set("https://a.test", "https://b.test")
+    backend = MultiGCFBackend(endpoints)
+    calls = []
+
+    async def post_json(url, payload, deadline=None):
+        calls.append(url)
+        if payload.get("action") == "create_session":
+            return {"sessionId": "s1", "language": "python"}
+        return {"stdout": "", "stderr": "", "exitCode": 0}
+
+    client = AsyncMock()
+    client.post_json.side_effect = post_json
+
+    with patch("src.code_mcp.backends.get_client", return_value=client):
+        await backend.execute({"action": "create_session", "language": "python"})
+        # Make the other endpoint look faster
+        other = next(e for e in endpoints.endpoints if e.url != calls[0])
+        other.latency = 0.0
+        endpoints.get(calls[0]).latency = 10.0
+        await backend.execute(
+            {"code": "x = 1", "language": "python", "sessionId": "s1"}
+        )
+
+    assert calls[1] == calls[0]
@@ -0,0 +1,182 @@
+import base64
+import hashlib
+
+import httpx
+import pytest
+
+from src.code_mcp import files
+from src.code_mcp.backends import LocalBackend
+from src.code_mcp.files import InputFiles, KnownBlobs, save_outputs, send_with_files
+from src.code_mcp.http_client import ExecutorError
+from src.code_mcp.output import format_result
+
+
+@pytest.fixture(autouse=True)
+def known(monkeypatch):
+    known = KnownBlobs()
+    monkeypatch.setattr(files, "KNOWN", known)
+    return known
+
+
+@pytest.fixture(autouse=True)
+def files_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(files, "FILES_ROOT", str(tmp_path.resolve()))
+    return tmp_path
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(b"a,b\n1,2\n")
+    return path
+
+
+class FakeBackend:
+    def __init__(self, missing):
+        self.missing = missing
+        self.calls = []
+
+    async def execute(self, payload):
+        self.calls.append(payload)
+        return {"missing": [d for d in payload["digests"] if d in self.missing]}
+
+
+async def test_uploads_only_missing_blobs(tmp_path, data_file):
+    other = tmp_path / "other.txt"
+    other.write_bytes(b"already there")
+    inputs = InputFiles([str(data_file), str(other)])
+    missing = hashlib.sha256(b"a,b\n1,2\n").hexdigest()
+    backend = FakeBackend({missing})
+    sent = []
+
+    async def send(options):
+        sent.append(options)
+        return {"stdout": "", "stderr": "", "exitCode": 0}
+
+    await send_with_files(backend, inputs, False, send)
+
+    assert sent[0]["files"] == {
+        "data.csv": missing,
+        "other.txt": hashlib.sha256(b"already there").hexdigest(),
+    }
+    assert list(sent[0]["blobs"]) == [missing]
+    assert base64.b64decode(sent[0]["blobs"][missing]) == b"a,b\n1,2\n"
+
+    # Known digests skip the check entirely
+    await send_with_files(backend, inputs, False, send)
+    assert len(backend.calls) == 1
+    assert "blobs" not in sent[1]
+
+
+async def test_resends_all_blobs_after_conflict(data_file, known):
+    inputs = InputFiles([str(data_file)])
+    for digest in inputs.blobs:
+        known.add(digest)
+    sent = []
+
+    async def send(options):
+        sent.append(options)
+        if len(sent) == 1:
+            response = httpx.Response(
+                409, request=httpx.Request("POST", "https://gcf.test")
+            )
+            raise ExecutorError(
+                "Missing 1 input blob(s)", request=response.request, response=response
+            )
+        return {"stdout": "ok", "stderr": "", "exitCode": 0}
+
+    result = await send_with_files(FakeBackend(set()), inputs, True, send)
+
+    assert result["stdout"] == "ok"
+    assert "blobs" not in sent[0]
+    assert list(sent[1]["blobs"]) == list(inputs.blobs)
+    assert sent[1]["collectFiles"] is True
+
+
+def test_duplicate_input_names_rejected(tmp_path, data_file):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "data.csv").write_bytes(b"")
+
+    with pytest.raises(ValueError):
+        InputFiles([str(data_file), str(tmp_path / "sub" / "data.csv")])
+
+
+def test_save_outputs_stays_in_output_dir(tmp_path):
+    result = {
+        "files": [
+            {
+                "name": "out/result.txt",
+                "size": 2,
+                "content": base64.b64encode(b"hi").decode(),
+            },
+            {
+                "name": "../escape.txt",
+                "size": 1,
+                "content": base64.b64encode(b"x").decode(),
+            },
+            {"name": "big.bin", "size": 10**9, "omitted": True},
+        ]
+    }
+
+    save_outputs(result, str(tmp_path / "outputs"))
+
+    assert (tmp_path / "outputs" / "out" / "result.txt").read_bytes() == b"hi"
+    assert not (tmp_path / "escape.txt").exists()
+    text = format_result({"stdout": "", "exitCode": 0, **result})
+    assert "out/result.txt (2 bytes), saved to" in text
+    assert "../escape.txt (1 bytes), not saved" in text
+    assert "big.bin (1000000000 bytes), too large to return" in text
+
+
+def test_paths_outside_the_root_are_rejected(tmp_path, data_file):
+    secret = tmp_path.parent / f"{tmp_path.name}-secret"
+    secret.write_bytes(b"key")
+    (tmp_path / "link").symlink_to(secret)
+
+    for path in (str(secret), "../" + secret.name, str(tmp_path / "link")):
+        with pytest.raises(ValueError, match="outside"):
+            InputFiles([path])
+    with pytest.raises(ValueError, match="outside"):
+        save_outputs({"files": []}, str(tmp_path.parent))
+
+    # Relative paths are taken from the root
+    assert InputFiles(["data.csv"]).files == InputFiles([str(data_file)]).files
+
+
+def test_save_outputs_keeps_existing_files(tmp_path):
+    (tmp_path / "outputs").mkdir()
+    (tmp_path / "outputs" / "notes.txt").write_bytes(b"mine")
+
+    def result():
+        return {
+            "files": [
+                {
+                    "name": "notes.txt",
+                    "size": 6,
+                    "content": base64.b64encode(b"theirs").decode(),
+                }
+            ]
+        }
+
+    kept = result()
+    save_outputs(kept, str(tmp_path / "outputs"))
+    assert (tmp_path / "outputs" / "notes.txt").read_bytes() == b"mine"
+    assert "file exists" in kept["files"][0]["skipped"]
+
+    save_outputs(result(), str(tmp_path / "outputs"), overwrite=True)
+    assert (tmp_path / "outputs" / "notes.txt").read_bytes() == b"theirs"
+
+
+async def test_round_trip_through_local_backend(data_file, tmp_path):
+    backend = LocalBackend(threads=2)
+    inputs = InputFiles([str(data_file)])
+    code = "import csv; rows = list(csv.reader(open('data.csv'))); open('count.txt', 'w').write(str(len(rows)))"
+
+    async def send(options):
+        return await backend.execute({"code": code, "language": "python", **options})
+
+    result = await send_with_files(backend, inputs, True, send)
+    save_outputs(result, str(tmp_path / "outputs"))
+
+    assert result["exitCode"] == 0
+    assert (tmp_path / "outputs" / "count.txt").read_text() == "2"
@@ -0,0 +1,153 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from gcf.admission import AdmissionController, AdmissionRejected
+from gcf.main import execute_code
+from tests.conftest import MockRequest
+
+
+def test_admit_tracks_wait_and_counts():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=1)
+
+    with controller.admit() as wait:
+        assert wait < 0.1
+        assert controller.stats()["active"] == 1
+
+    stats = controller.stats()
+    assert stats["active"] == 0
+    assert stats["admitted"] == 1
+    assert stats["rejected"] == 0
+
+
+def test_full_queue_rejects_immediately():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=5)
+    controller.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as exc_info:
+        controller.acquire()
+
+    assert time.monotonic() - started < 1
+    assert exc_info.value.retry_after >= 1
+    assert controller.stats()["rejected"] == 1
+
+
+def test_queued_caller_runs_when_slot_frees():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5)
+    controller.acquire()
+    waits = []
+
+    waiter = threading.Thread(target=lambda: waits.append(controller.acquire()))
+    waiter.start()
+    time.sleep(0.1)
+    assert controller.stats()["queued"] == 1
+
+    controller.release(0.1)
+    waiter.join(timeout=2)
+
+    assert waits and waits[0] >= 0.1
+    assert controller.stats()["active"] == 1
+
+
+def test_queue_timeout_rejects():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.1)
+    controller.acquire()
+
+    with pytest.raises(AdmissionRejected):
+        controller.acquire()
+
+    assert controller.stats()["queued"] == 0
+
+
+def test_handler_returns_429_with_retry_after(app):
+    controller = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=1)
+    controller.acquire()
+
+    with patch("gcf.main.ADMISSION", controller):
+        response, status_code = execute_code(
+            MockRequest({"code": "print(1)", "language": "python"})
+        )
+
+    assert status_code == 429
+    assert "Executor busy" in response.get_json()["error"]
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_handler_reports_queue_wait(app):
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=1)
+
+    with (
+        patch("gcf.main.ADMISSION", controller),
+        patch(
+            "gcf.main.run_process",
+            return_value={"stdout": "1\n", "stderr": "", "exitCode": 0},
+        ),
+    ):
+        response, status_code = execute_code(
+            MockRequest({"code": "print(1)", "language": "python"})
+        )
+
+    assert status_code == 200
+    assert "X-Queue-Wait-Ms" in response.headers
+    assert controller.stats()["active"] == 0
+
+
+def test_stream_holds_slot_until_finished(app):
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=1)
+
+    with patch("gcf.main.ADMISSION", controller):
+        response, status_code = execute_code(
+            MockRequest({"code": "print(1)", "language": "python", "stream": True})
+        )
+        assert controller.stats()["active"] == 1
+        response.get_data()
+        response.close()
+
+    assert status_code == 200
+    assert controller.stats()["active"] == 0
+
+
+def test_borrow_takes_only_free_slots():
+    controller = AdmissionController(max_concurrent=3, max_queue=1, queue_timeout=1)
+    controller.acquire()
+
+    with controller.borrow(5) as taken:
+        assert taken == 2
+        assert controller.stats()["active"] == 3
+        with controller.borrow(1) as none_left:
+            assert none_left == 0
+
+    assert controller.stats()["active"] == 1
+    assert controller.stats()["admitted"] == 1
+
+
+def test_parallel_batch_stays_within_admission(app):
+    controller = AdmissionController(max_concurrent=2, max_queue=1, queue_timeout=1)
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_run(cmd, *args, **kwargs):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return {"stdout": "", "stderr": "", "exitCode": 0}
+
+    request = {"batch": [{"code": "pass", "language": "bash"}] * 6, "parallel": True}
+    with (
+        patch("gcf.main.ADMISSION", controller),
+        patch("gcf.main.run_process", side_effect=fake_run),
+    ):
+        response, status_code = execute_code(MockRequest(request))
+
+    assert status_code == 200
+    assert len(response.get_json()["results"]) == 6
+    assert peak == 2
+    assert controller.stats()["active"] == 0
@@ -0,0 +1,174 @@
+import base64
+import hashlib
+import os
+from unittest.mock import patch
+
+import pytest
+
+from gcf.blobs import BlobError, BlobStore, MissingBlobs, Workspace, validate_files
+from gcf.main import execute_code
+from tests.conftest import MockRequest
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"), max_bytes=100)
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_store_deduplicates_and_reports_missing(store):
+    digest = store.put(b"hello")
+
+    assert digest == sha(b"hello")
+    assert store.put(b"hello") == digest
+    assert store.total == 5
+    assert store.missing([digest, sha(b"other")]) == [sha(b"other")]
+
+
+def test_store_rejects_wrong_digest(store):
+    with pytest.raises(BlobError):
+        store.put(b"hello", sha(b"bye"))
+
+
+def test_store_evicts_least_recently_used(store):
+    first = store.put(b"a" * 40)
+    second = store.put(b"b" * 40)
+    store.missing([first])
+    store.put(b"c" * 40)
+
+    assert store.missing([first, second]) == [second]
+    assert store.total == 80
+    assert store.stats()["evicted"] == 1
+
+
+def test_store_reloads_existing_blobs(store):
+    digest = store.put(b"kept")
+
+    assert BlobStore(store.root, max_bytes=100).missing([digest]) == []
+
+
+def test_validate_files():
+    digest = sha(b"x")
+
+    assert validate_files({"data/input.csv": digest}) is None
+    assert "Invalid file name" in validate_files({"../escape": digest})
+    assert "Invalid file name" in validate_files({"/etc/passwd": digest})
+    assert "Invalid digest" in validate_files({"a.txt": "not-a-digest"})
+
+
+def test_workspace_collects_new_and_changed_files(store):
+    keep, change = store.put(b"keep"), store.put(b"change")
+
+    with Workspace(store, {"keep.txt": keep, "sub/change.txt": change}) as workspace:
+        with open(f"{workspace.path}/sub/change.txt", "wb") as f:
+            f.write(b"changed!")
+        with open(f"{workspace.path}/new.txt", "wb") as f:
+            f.write(b"new")
+        files = workspace.collect()
+        path = workspace.path
+
+    assert [entry["name"] for entry in files] == ["new.txt", "sub/change.txt"]
+    assert base64.b64decode(files[1]["content"]) == b"changed!"
+    # Outputs can be used as inputs without uploading them
+    assert store.missing([sha(b"new")]) == []
+    assert not os.path.exists(path)
+
+
+def test_workspace_raises_for_missing_blobs(store):
+    with (
+        pytest.raises(MissingBlobs) as exc_info,
+        Workspace(store, {"a.txt": sha(b"gone")}),
+    ):
+        pass
+
+    assert exc_info.value.missing == [sha(b"gone")]
+
+
+def test_run_with_files(app, tmp_path):
+    data = b"1,2,3\n"
+    digest = sha(data)
+    store = BlobStore(str(tmp_path / "blobs"))
+
+    with app.app_context(), patch("gcf.main.BLOBS", store):
+        response, status_code = execute_code(
+            MockRequest(
+                {
+                    "code": "print(open('data.csv').read().strip()); open('out.txt', 'w').write('done')",
+                    "language": "python",
+                    "files": {"data.csv": digest},
+                }
+            )
+        )
+        assert status_code == 409
+        assert response.json["missing"] == [digest]
+
+        response, status_code = execute_code(
+            MockRequest({"action": "missing_blobs", "digests": [digest]})
+        )
+        assert response.json == {"missing": [digest]}
+
+        response, status_code = execute_code(
+            MockRequest(
+                {
+                    "action": "put_blobs",
+                    "blobs": {digest: base64.b64encode(data).decode()},
+                }
+            )
+        )
+        assert response.json == {"stored": [digest]}
+
+        response, status_code = execute_code(
+            MockRequest(
+                {
+                    "code": "print(open('data.csv').read().strip()); open('out.txt', 'w').write('done')",
+                    "language": "python",
+                    "files": {"data.csv": digest},
+                    "collectFiles": True,
+                }
+            )
+        )
+
+    assert status_code == 200
+    assert response.json["stdout"] == "1,2,3\n"
+    assert [
+        (f["name"], base64.b64decode(f["content"])) for f in response.json["files"]
+    ] == [("out.txt", b"done")]
+
+
+def test_run_with_inline_blobs(app, tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+
+    with app.app_context(), patch("gcf.main.BLOBS", store):
+        response, status_code = execute_code(
+            MockRequest(
+                {
+                    "code": "cat in.txt",
+                    "language": "bash",
+                    "files": {"in.txt": sha(b"inline")},
+                    "blobs": {sha(b"inline"): base64.b64encode(b"inline").decode()},
+                }
+            )
+        )
+
+    assert status_code == 200
+    assert response.json["stdout"] == "inline"
+
+
+def test_files_rejected_in_sessions(app):
+    with app.app_context():
+        response, status_code = execute_code(
+            MockRequest(
+                {
+                    "code": "x",
+                    "language": "python",
+                    "sessionId": "abc",
+                    "files": {},
+                }
+            )
+        )
+
+    assert status_code == 400
+    assert response.json["error"] == "Files are not supported in sessions"
@@ -0,0 +1,161 @@
+import json
+import shutil
+import threading
+
+import pytest
+
+from gcf.builds import BuildCache, BuildFailed, Toolchain, default_toolchains
+from gcf.main import execute_code
+from gcf.output import run_process
+from tests.conftest import MockRequest
+
+pytestmark = pytest.mark.skipif(shutil.which("cc") is None, reason="needs a C compiler")
+
+HELLO = (
+    '#include <stdio.h>\nint main(void) { printf("hello %d\\n", 6 * 7); return 0; }\n'
+)
+
+
+@pytest.fixture
+def toolchains(tmp_path):
+    return default_toolchains(str(tmp_path))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return BuildCache(str(tmp_path / "builds"))
+
+
+def test_builds_once_then_reuses_binary(cache, toolchains):
+    timings = {}
+    with cache.binary(toolchains["c"], HELLO, timings) as binary:
+        assert run_process([binary], 5)["stdout"] == "hello 42\n"
+    assert "build" in timings
+
+    timings = {}
+    with cache.binary(toolchains["c"], HELLO, timings) as binary:
+        assert run_process([binary], 5)["stdout"] == "hello 42\n"
+    assert "build" not in timings
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_key_covers_source_and_flags(toolchains):
+    c = toolchains["c"]
+    debug = Toolchain(
+        "c", "main.c", ["cc", "-O0", "-o", "{out}", "{src}"], ["cc", "--version"]
+    )
+
+    assert c.key(HELLO) == c.key(HELLO)
+    assert c.key(HELLO) != c.key(HELLO + "\n")
+    assert c.key(HELLO) != debug.key(HELLO)
+
+
+def test_build_failure_reports_compiler_output(cache, toolchains):
+    with (
+        pytest.raises(BuildFailed) as exc_info,
+        cache.binary(toolchains["c"], "int main(void) { return missing; }"),
+    ):
+        pass
+
+    result = exc_info.value.result
+    assert result["stderr"].startswith("Compilation failed:\n")
+    assert "missing" in result["stderr"]
+    assert result["exitCode"] != 0
+    assert cache.stats()["failures"] == 1
+
+
+def test_concurrent_requests_share_one_build(cache, toolchains):
+    outputs = []
+
+    def run():
+        with cache.binary(toolchains["c"], HELLO) as binary:
+            outputs.append(run_process([binary], 5)["stdout"])
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outputs == ["hello 42\n"] * 4
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used_but_not_binaries_in_use(tmp_path, toolchains):
+    cache = BuildCache(str(tmp_path / "builds"), max_bytes=1)
+    other = HELLO.replace("hello", "other")
+
+    with cache.binary(toolchains["c"], HELLO) as first:
+        with cache.binary(toolchains["c"], other):
+            assert cache.stats()["binaries"] == 2
+        assert run_process([first], 5)["stdout"] == "hello 42\n"
+
+    assert cache.stats()["binaries"] == 0
+    assert cache.stats()["evicted"] == 2
+
+
+def test_toolchain_caches_count_towards_size(tmp_path):
+    caches = str(tmp_path / "compiler-cache")
+    script = 'mkdir -p "$CACHE" && head -c 4096 /dev/zero > "$CACHE/$$" && cp "$0" "$1" && chmod +x "$1"'
+    toolchain = Toolchain(
+        "sh",
+        "main.sh",
+        ["sh", "-c", script, "{src}", "{out}"],
+        ["sh", "-c", "echo 1"],
+        {"CACHE": caches},
+        [caches],
+    )
+    cache = BuildCache(str(tmp_path / "builds"), max_bytes=10000)
+
+    for i in range(2):
+        with cache.binary(toolchain, f"#!/bin/sh\necho {i}\n") as binary:
+            assert run_process([binary], 5)["stdout"] == f"{i}\n"
+            assert cache.stats()["cache_bytes"] == 4096 * (i + 1)
+
+    # Evicting both binaries isn't enough, so the compiler cache goes too
+    with cache.binary(toolchain, "#!/bin/sh\necho 2\n"):
+        pass
+    stats = cache.stats()
+    assert stats["caches_cleared"] == 1
+    assert stats["cache_bytes"] == 0
+    assert stats["bytes"] <= 10000
+    assert not (tmp_path / "compiler-cache").exists()
+
+
+def test_unavailable_compiler():
+    assert not Toolchain(
+        "x", "main.x", ["no-such-compiler", "{src}"], ["no-such-compiler"]
+    ).available()
+
+
+def test_compiled_run_through_handler(app):
+    with app.app_context():
+        response, status_code = execute_code(
+            MockRequest({"code": HELLO, "language": "c"})
+        )
+        broken, _ = execute_code(MockRequest({"code": "int main(", "language": "c"}))
+
+    assert status_code == 200
+    assert response.get_json() == {"stdout": "hello 42\n", "stderr": "", "exitCode": 0}
+    assert broken.get_json()["stderr"].startswith("Compilation failed:\n")
+
+
+def test_compiled_stream_through_handler(app):
+    with app.app_context():
+        response, _ = execute_code(
+            MockRequest({"code": HELLO, "language": "c", "stream": True})
+        )
+        events = [json.loads(line) for line in response.response]
+        response.close()
+
+    assert events == [{"stream": "stdout", "data": "hello 42\n"}, {"exitCode": 0}]
+
+
+@pytest.mark.skipif(shutil.which("c++") is None, reason="needs a C++ compiler")
+def test_cpp_through_handler(app):
+    code = '#include <iostream>\nint main() { std::cout << "hi" << std::endl; }\n'
+    with app.app_context():
+        response, _ = execute_code(MockRequest({"code": code, "language": "cpp"}))
+
+    assert response.get_json()["stdout"] == "hi\n"
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from gcf.cancellation import Call, CallRegistry, Cancelled
+from gcf.main import execute_code
+from gcf.output import run_process
+from tests.conftest import MockRequest
+
+
+def cancel_later(cancel, delay=0.2):
+    timer = threading.Timer(delay, cancel)
+    timer.start()
+    return timer
+
+
+def test_timeout_is_cut_short_by_deadline():
+    assert Call().timeout(30) == 30
+    assert Call(deadline=time.monotonic() + 100).timeout(30) == 30
+    assert Call(deadline=time.monotonic() + 5).timeout(30) <= 5
+    assert Call(deadline=time.monotonic() - 1).timeout(30) == 0
+
+
+def test_from_headers():
+    call = Call.from_headers({"X-Request-Id": "r1", "X-Deadline-Ms": "2000"})
+
+    assert call.request_id == "r1"
+    assert 1 < call.timeout(30) <= 2
+    assert Call.from_headers({"X-Deadline-Ms": "soon"}).deadline is None
+
+
+def test_on_cancel_kills_at_once_when_already_cancelled():
+    call = Call()
+    call.cancel()
+    killed = []
+
+    with call.on_cancel(lambda: killed.append(True)):
+        pass
+
+    assert killed == [True]
+
+
+def test_registry_remembers_early_cancels():
+    calls = CallRegistry()
+
+    assert calls.cancel("r1") is False
+    call = Call("r1")
+    calls.add(call)
+
+    assert call.cancelled
+
+
+def test_cancel_kills_process():
+    call = Call("r1")
+    cancel_later(call.cancel)
+    started = time.monotonic()
+
+    with pytest.raises(Cancelled):
+        run_process(["sleep", "10"], 30, call=call)
+    assert time.monotonic() - started < 5
+
+
+def test_cancel_action_stops_run(app):
+    def cancel():
+        with app.app_context():
+            execute_code(MockRequest({"action": "cancel", "requestId": "r1"}))
+
+    timer = cancel_later(cancel, 0.5)
+    started = time.monotonic()
+    with app.app_context():
+        response, status_code = execute_code(
+            MockRequest(
+                {"code": "sleep 10", "language": "bash"}, {"X-Request-Id": "r1"}
+            )
+        )
+    timer.join()
+
+    assert status_code == 200
+    assert response.get_json()["stderr"] == "Code execution cancelled"
+    assert time.monotonic() - started < 5
+
+
+def test_deadline_header_shortens_run(app):
+    with app.app_context():
+        response, _ = execute_code(
+            MockRequest(
+                {"code": "sleep 10", "language": "bash"}, {"X-Deadline-Ms": "500"}
+            )
+        )
+
+    stderr = response.get_json()["stderr"]
+    assert stderr.startswith("Code execution timed out after 0.")
+
+
+def test_requested_timeout(app):
+    with app.app_context():
+        response, _ = execute_code(
+            MockRequest({"code": "sleep 10", "language": "bash", "timeout": 0.5})
+        )
+        invalid, status_code = execute_code(
+            MockRequest({"code": "echo", "language": "bash", "timeout": "soon"})
+        )
+
+    assert response.get_json()["stderr"] == "Code execution timed out after 0.5 seconds"
+    assert status_code == 400
+    assert (
+        invalid.get_json()["error"]
+        == "Field timeout must be a positive number of seconds"
+    )
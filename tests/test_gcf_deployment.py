@@ -1,6 +1,9 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
 import pytest
-import json
-from unittest.mock import Mock, patch, MagicMock
+
 from src.code_mcp.gcf_deployer import GCFDeployer
 
 
@@ -16,51 +19,44 @@ def test_deployer_initialization(deployer):
 
 
 def test_check_gcloud_installed(deployer):
-    with patch('subprocess.run') as mock_run:
+    with patch("subprocess.run") as mock_run:
         mock_run.return_value = MagicMock(returncode=0)
-        
+
         assert deployer.check_gcloud_installed() is True
         mock_run.assert_called_once_with(
-            ["gcloud", "--version"],
-            capture_output=True,
-            text=True
+            ["gcloud", "--version"], capture_output=True, text=True
         )
 
 
 def test_check_gcloud_not_installed(deployer):
-    with patch('subprocess.run') as mock_run:
+    with patch("subprocess.run") as mock_run:
         mock_run.side_effect = FileNotFoundError()
-        
+
         assert deployer.check_gcloud_installed() is False
 
 
 def test_get_current_project(deployer):
-    with patch('subprocess.run') as mock_run:
-        mock_run.return_value = MagicMock(
-            returncode=0,
-            stdout="my-gcp-project\n"
-        )
-        
+    with patch("subprocess.run") as mock_run:
+        mock_run.return_value = MagicMock(returncode=0, stdout="my-gcp-project\n")
+
         project = deployer.get_current_project()
         assert project == "my-gcp-project"
-        
+
         mock_run.assert_called_once_with(
-            ["gcloud", "config", "get-value", "project"],
-            capture_output=True,
-            text=True
+            ["gcloud", "config", "get-value", "project"], capture_output=True, text=True
         )
 
 
 def test_deploy_function(deployer):
-    with patch('subprocess.run') as mock_run:
+    with patch("subprocess.run") as mock_run:
         mock_run.return_value = MagicMock(returncode=0)
-        
+
         result = deployer.deploy_function()
         assert result is True
-        
+
         mock_run.assert_called_once()
         call_args = mock_run.call_args[0][0]
-        
+
         assert call_args[0] == "gcloud"
         assert call_args[1] == "functions"
         assert call_args[2] == "deploy"
@@ -72,50 +68,162 @@ def test_deploy_function(deployer):
         assert f"--source={deployer.gcf_source_dir}" in call_args
 
 
-def test_deploy_function_failure(deployer):
-    with patch('subprocess.run') as mock_run:
-        mock_run.return_value = MagicMock(
-            returncode=1,
-            stderr="Deployment failed"
-        )
-        
+def test_deploy_function_failure(deployer, caplog):
+    with patch("subprocess.run") as mock_run:
+        # stderr goes straight to the terminal, so there is none to log
+        mock_run.return_value = MagicMock(returncode=1, stderr=None)
+
         result = deployer.deploy_function()
         assert result is False
+        assert "gcloud exited with code 1" in caplog.text
 
 
 def test_get_function_url(deployer):
-    expected_url = "https://us-central1-test-project.cloudfunctions.net/code-interpreter"
-    
-    with patch('subprocess.run') as mock_run:
-        mock_run.return_value = MagicMock(
-            returncode=0,
-            stdout=expected_url + "\n"
-        )
-        
+    expected_url = (
+        "https://us-central1-test-project.cloudfunctions.net/code-interpreter"
+    )
+
+    with patch("subprocess.run") as mock_run:
+        mock_run.return_value = MagicMock(returncode=0, stdout=expected_url + "\n")
+
         url = deployer.get_function_url()
         assert url == expected_url
-        
+
         mock_run.assert_called_once_with(
             [
-                "gcloud", "functions", "describe", "code-interpreter",
-                "--region", "us-central1",
-                "--format", "value(httpsTrigger.url)",
-                "--project=test-project"
+                "gcloud",
+                "functions",
+                "describe",
+                "code-interpreter",
+                "--region",
+                "us-central1",
+                "--format",
+                "value(httpsTrigger.url)",
+                "--project=test-project",
             ],
             capture_output=True,
-            text=True
+            text=True,
         )
 
 
 def test_full_deployment_flow(deployer):
-    with patch.object(deployer, 'check_gcloud_installed', return_value=True), \
-         patch.object(deployer, 'get_current_project', return_value="test-project"), \
-         patch.object(deployer, 'deploy_function', return_value=True), \
-         patch.object(deployer, 'get_function_url', return_value="https://test.url"):
-        
+    with (
+        patch.object(deployer, "check_gcloud_installed", return_value=True),
+        patch.object(deployer, "get_current_project", return_value="test-project"),
+        patch.object(deployer, "deploy_function", return_value=True),
+        patch.object(deployer, "get_function_url", return_value="https://test.url"),
+    ):
         result = deployer.deploy()
         assert result == {
             "success": True,
             "function_url": "https://test.url",
-            "project_id": "test-project"
-        }
\ No newline at end of file
+            "project_id": "test-project",
+        }
+
+
+FAKE_GCLOUD = """#!{python}
+import sys, json, pathlib
+
+state = pathlib.Path({state!r})
+args = sys.argv[1:]
+with open(state.with_suffix(".log"), "a") as log:
+    log.write(" ".join(args) + "\\n")
+
+if args[:1] == ["--version"]:
+    print("Google Cloud SDK 0.0.0")
+elif args[:2] == ["functions", "describe"]:
+    if not state.exists():
+        sys.exit(1)
+    if "value(httpsTrigger.url)" in args:
+        print(json.loads(state.read_text())["httpsTrigger"]["url"])
+    else:
+        print(state.read_text())
+elif args[:2] == ["functions", "deploy"]:
+    labels = {{}}
+    for arg in args:
+        if arg.startswith("--update-labels="):
+            key, value = arg.split("=", 1)[1].split("=", 1)
+            labels[key] = value
+    state.write_text(json.dumps({{
+        "name": args[2],
+        "httpsTrigger": {{"url": "https://fake.cloudfunctions.net/" + args[2]}},
+        "labels": labels,
+    }}))
+"""
+
+
+@pytest.fixture
+def fake_gcloud(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    state = tmp_path / "function.json"
+    script = bin_dir / "gcloud"
+    script.write_text(FAKE_GCLOUD.format(python=sys.executable, state=str(state)))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+
+    def deploys():
+        log = state.with_suffix(".log")
+        calls = log.read_text().splitlines() if log.exists() else []
+        return [call for call in calls if call.startswith("functions deploy")]
+
+    return deploys
+
+
+@pytest.fixture
+def source_deployer(tmp_path):
+    source = tmp_path / "gcf"
+    source.mkdir()
+    (source / "main.py").write_text("def execute_code(request):\n    pass\n")
+    deployer = GCFDeployer(project_id="test-project")
+    deployer.gcf_source_dir = source
+    return deployer
+
+
+def test_source_hash_tracks_source_and_config(source_deployer):
+    original = source_deployer.source_hash()
+    assert len(original) <= 63
+    assert source_deployer.source_hash() == original
+
+    cache = source_deployer.gcf_source_dir / "__pycache__"
+    cache.mkdir()
+    (cache / "main.cpython-311.pyc").write_bytes(b"\0")
+    assert source_deployer.source_hash() == original
+
+    source_deployer.memory = "512MB"
+    assert source_deployer.source_hash() != original
+    source_deployer.memory = "256MB"
+
+    (source_deployer.gcf_source_dir / "main.py").write_text(
+        "def execute_code(request):\n    return 1\n"
+    )
+    assert source_deployer.source_hash() != original
+
+
+def test_deploy_skips_unchanged_source(fake_gcloud, source_deployer):
+    first = source_deployer.deploy()
+    assert first["success"] is True
+    assert first["function_url"] == "https://fake.cloudfunctions.net/code-interpreter"
+    assert len(fake_gcloud()) == 1
+    assert (
+        f"--update-labels=code-mcp-source-hash={source_deployer.source_hash()}"
+        in fake_gcloud()[0]
+    )
+
+    second = source_deployer.deploy()
+    assert second == first
+    assert len(fake_gcloud()) == 1
+
+
+def test_deploy_after_source_change(fake_gcloud, source_deployer):
+    source_deployer.deploy()
+    (source_deployer.gcf_source_dir / "requirements.txt").write_text("flask\n")
+
+    source_deployer.deploy()
+    assert len(fake_gcloud()) == 2
+
+
+def test_force_deploy(fake_gcloud, source_deployer):
+    source_deployer.deploy()
+    source_deployer.deploy(force=True)
+    assert len(fake_gcloud()) == 2
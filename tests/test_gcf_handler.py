@@ -1,197 +1,245 @@
-import pytest
-import json
-from unittest.mock import Mock, patch, MagicMock
-from flask import Flask
+from unittest.mock import patch
+
 from gcf.main import execute_code
+from tests.conftest import MockRequest
 
 
-@pytest.fixture
-def app():
-    app = Flask(__name__)
-    return app
+def test_execute_code_python(app):
+    request = MockRequest({"code": "print('Hello, World!')", "language": "python"})
 
+    with app.app_context(), patch("gcf.main.run_process") as mock_run:
+        mock_run.return_value = {
+            "stdout": "Hello, World!\n",
+            "stderr": "",
+            "exitCode": 0,
+        }
 
-class MockRequest:
-    def __init__(self, json_data):
-        self.json_data = json_data
-    
-    def get_json(self):
-        return self.json_data
+        response, status_code = execute_code(request)
 
+        assert response.json == {
+            "stdout": "Hello, World!\n",
+            "stderr": "",
+            "exitCode": 0,
+        }
+        assert status_code == 200
 
-def test_execute_code_python(app):
-    request = MockRequest({
-        "code": "print('Hello, World!')",
-        "language": "python"
-    })
-    
-    with app.app_context():
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = MagicMock(
-                stdout="Hello, World!\n",
-                stderr="",
-                returncode=0
-            )
-            
-            response, status_code = execute_code(request)
-            
-            assert response.json == {
-                "stdout": "Hello, World!\n",
-                "stderr": "",
-                "exitCode": 0
-            }
-            assert status_code == 200
-            
-            mock_run.assert_called_once()
-            call_args = mock_run.call_args
-            assert call_args[0][0][0] == "python"
-            assert call_args[0][0][1] == "-c"
-            assert call_args[0][0][2] == "print('Hello, World!')"
+        mock_run.assert_called_once()
+        call_args = mock_run.call_args
+        assert call_args[0][0][0] == "python"
+        assert call_args[0][0][1] == "-c"
+        assert call_args[0][0][2] == "print('Hello, World!')"
 
 
 def test_execute_code_javascript(app):
-    request = MockRequest({
-        "code": "console.log(6 * 7)",
-        "language": "javascript"
-    })
-    
-    with app.app_context():
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = MagicMock(
-                stdout="42\n",
-                stderr="",
-                returncode=0
-            )
-            
-            response, status_code = execute_code(request)
-            
-            assert response.json == {
-                "stdout": "42\n",
-                "stderr": "",
-                "exitCode": 0
-            }
-            assert status_code == 200
-            
-            mock_run.assert_called_once()
-            call_args = mock_run.call_args
-            assert call_args[0][0][0] == "node"
-            assert call_args[0][0][1] == "-e"
-            assert call_args[0][0][2] == "console.log(6 * 7)"
+    request = MockRequest({"code": "console.log(6 * 7)", "language": "javascript"})
+
+    with app.app_context(), patch("gcf.main.run_process") as mock_run:
+        mock_run.return_value = {"stdout": "42\n", "stderr": "", "exitCode": 0}
+
+        response, status_code = execute_code(request)
+
+        assert response.json == {"stdout": "42\n", "stderr": "", "exitCode": 0}
+        assert status_code == 200
+
+        mock_run.assert_called_once()
+        call_args = mock_run.call_args
+        assert call_args[0][0][0] == "node"
+        assert call_args[0][0][1] == "-e"
+        assert call_args[0][0][2] == "console.log(6 * 7)"
 
 
 def test_execute_code_bash(app):
-    request = MockRequest({
-        "code": "echo 'Hello from Bash'",
-        "language": "bash"
-    })
-    
-    with app.app_context():
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = MagicMock(
-                stdout="Hello from Bash\n",
-                stderr="",
-                returncode=0
-            )
-            
-            response, status_code = execute_code(request)
-            
-            assert response.json == {
-                "stdout": "Hello from Bash\n",
-                "stderr": "",
-                "exitCode": 0
-            }
-            assert status_code == 200
-            
-            mock_run.assert_called_once()
-            call_args = mock_run.call_args
-            assert call_args[0][0][0] == "bash"
-            assert call_args[0][0][1] == "-c"
-            assert call_args[0][0][2] == "echo 'Hello from Bash'"
+    request = MockRequest({"code": "echo 'Hello from Bash'", "language": "bash"})
+
+    with app.app_context(), patch("gcf.main.run_process") as mock_run:
+        mock_run.return_value = {
+            "stdout": "Hello from Bash\n",
+            "stderr": "",
+            "exitCode": 0,
+        }
+
+        response, status_code = execute_code(request)
+
+        assert response.json == {
+            "stdout": "Hello from Bash\n",
+            "stderr": "",
+            "exitCode": 0,
+        }
+        assert status_code == 200
+
+        mock_run.assert_called_once()
+        call_args = mock_run.call_args
+        assert call_args[0][0][0] == "bash"
+        assert call_args[0][0][1] == "-c"
+        assert call_args[0][0][2] == "echo 'Hello from Bash'"
 
 
 def test_execute_code_with_error(app):
-    request = MockRequest({
-        "code": "print('unclosed",
-        "language": "python"
-    })
-    
-    with app.app_context():
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = MagicMock(
-                stdout="",
-                stderr="SyntaxError: EOL while scanning string literal\n",
-                returncode=1
-            )
-            
-            response, status_code = execute_code(request)
-            
-            assert response.json == {
-                "stdout": "",
-                "stderr": "SyntaxError: EOL while scanning string literal\n",
-                "exitCode": 1
-            }
-            assert status_code == 200
+    request = MockRequest({"code": "print('unclosed", "language": "python"})
+
+    with app.app_context(), patch("gcf.main.run_process") as mock_run:
+        mock_run.return_value = {
+            "stdout": "",
+            "stderr": "SyntaxError: EOL while scanning string literal\n",
+            "exitCode": 1,
+        }
+
+        response, status_code = execute_code(request)
+
+        assert response.json == {
+            "stdout": "",
+            "stderr": "SyntaxError: EOL while scanning string literal\n",
+            "exitCode": 1,
+        }
+        assert status_code == 200
 
 
 def test_execute_code_timeout(app):
-    request = MockRequest({
-        "code": "import time; time.sleep(100)",
-        "language": "python"
-    })
-    
-    with app.app_context():
-        with patch('subprocess.run') as mock_run:
-            import subprocess
-            mock_run.side_effect = subprocess.TimeoutExpired(cmd=['python'], timeout=30)
-            
-            response, status_code = execute_code(request)
-            
-            assert response.json == {
-                "stdout": "",
-                "stderr": "Code execution timed out after 30 seconds",
-                "exitCode": -1
-            }
-            assert status_code == 200
+    request = MockRequest(
+        {"code": "import time; time.sleep(100)", "language": "python"}
+    )
 
+    with app.app_context(), patch("gcf.main.run_process") as mock_run:
+        import subprocess
+
+        mock_run.side_effect = subprocess.TimeoutExpired(cmd=["python"], timeout=30)
 
-def test_execute_code_unsupported_language(app):
-    request = MockRequest({
-        "code": "some code",
-        "language": "unsupported"
-    })
-    
-    with app.app_context():
         response, status_code = execute_code(request)
-        
+
         assert response.json == {
-            "error": "Unsupported language: unsupported"
+            "stdout": "",
+            "stderr": "Code execution timed out after 30 seconds",
+            "exitCode": -1,
         }
+        assert status_code == 200
+
+
+def test_execute_code_unsupported_language(app):
+    request = MockRequest({"code": "some code", "language": "unsupported"})
+
+    with app.app_context():
+        response, status_code = execute_code(request)
+
+        assert response.json == {"error": "Unsupported language: unsupported"}
         assert status_code == 400
 
 
 def test_execute_code_missing_code(app):
-    request = MockRequest({
-        "language": "python"
-    })
-    
+    request = MockRequest({"language": "python"})
+
     with app.app_context():
         response, status_code = execute_code(request)
-        
-        assert response.json == {
-            "error": "Missing required field: code"
-        }
+
+        assert response.json == {"error": "Missing required field: code"}
         assert status_code == 400
 
 
 def test_execute_code_missing_language(app):
-    request = MockRequest({
-        "code": "print('test')"
-    })
-    
+    request = MockRequest({"code": "print('test')"})
+
+    with app.app_context():
+        response, status_code = execute_code(request)
+
+        assert response.json == {"error": "Missing required field: language"}
+        assert status_code == 400
+
+
+def test_execute_code_batch(app):
+    request = MockRequest(
+        {
+            "batch": [
+                {"code": "print(1)", "language": "python"},
+                {"code": "echo 2", "language": "bash"},
+            ]
+        }
+    )
+
+    with app.app_context(), patch("gcf.main.run_process") as mock_run:
+        mock_run.side_effect = [
+            {"stdout": "1\n", "stderr": "", "exitCode": 0},
+            {"stdout": "2\n", "stderr": "", "exitCode": 0},
+        ]
+
+        response, status_code = execute_code(request)
+
+        assert status_code == 200
+        assert response.json == {
+            "results": [
+                {"stdout": "1\n", "stderr": "", "exitCode": 0},
+                {"stdout": "2\n", "stderr": "", "exitCode": 0},
+            ]
+        }
+        assert [call[0][0][0] for call in mock_run.call_args_list] == ["python", "bash"]
+
+
+def test_execute_code_batch_parallel_keeps_order(app):
+    request = MockRequest(
+        {
+            "batch": [{"code": f"print({i})", "language": "python"} for i in range(6)],
+            "parallel": True,
+        }
+    )
+
+    def fake_run(cmd, *args):
+        return {"stdout": cmd[2], "stderr": "", "exitCode": 0}
+
+    with app.app_context(), patch("gcf.main.run_process", side_effect=fake_run):
+        response, status_code = execute_code(request)
+
+        assert status_code == 200
+        assert [r["stdout"] for r in response.json["results"]] == [
+            f"print({i})" for i in range(6)
+        ]
+
+
+def test_execute_code_batch_invalid_item(app):
+    request = MockRequest(
+        {"batch": [{"code": "print(1)", "language": "cobol"}, {"language": "python"}]}
+    )
+
     with app.app_context():
         response, status_code = execute_code(request)
-        
+
+        assert status_code == 200
         assert response.json == {
-            "error": "Missing required field: language"
+            "results": [
+                {"error": "Unsupported language: cobol"},
+                {"error": "Missing required field: code"},
+            ]
+        }
+
+
+def test_execute_code_batch_rejects_sessions_and_files(app):
+    request = MockRequest(
+        {
+            "batch": [
+                {"code": "print(1)", "language": "python", "sessionId": "s1"},
+                {"code": "print(1)", "language": "python", "files": {}},
+                {"code": "print(1)", "language": "python", "collectFiles": True},
+            ]
         }
-        assert status_code == 400
\ No newline at end of file
+    )
+
+    with app.app_context():
+        with patch("gcf.main.run_process") as run_process:
+            response, status_code = execute_code(request)
+
+        assert status_code == 200
+        assert response.json == {
+            "results": [
+                {"error": "Field sessionId is not supported in batch snippets"},
+                {"error": "Field files is not supported in batch snippets"},
+                {"error": "Field collectFiles is not supported in batch snippets"},
+            ]
+        }
+        run_process.assert_not_called()
+
+
+def test_execute_code_batch_empty(app):
+    request = MockRequest({"batch": []})
+
+    with app.app_context():
+        response, status_code = execute_code(request)
+
+        assert response.json == {"error": "Field batch must be a non-empty list"}
+        assert status_code == 400
@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+
+from gcf import main
+from gcf.admission import AdmissionRejected
+from gcf.jobs import JobError, JobManager
+from gcf.main import execute_code
+from tests.conftest import MockRequest
+
+
+def test_wait_returns_result_once_done():
+    jobs = JobManager(max_running=1)
+    job = jobs.submit(lambda: {"stdout": "ok\n", "stderr": "", "exitCode": 0})
+
+    snapshot = jobs.wait(job.id, timeout=5)
+
+    assert snapshot["status"] == "done"
+    assert snapshot["result"]["stdout"] == "ok\n"
+    assert jobs.stats()["done"] == 1
+
+
+def test_wait_is_capped_and_reports_running_jobs():
+    jobs = JobManager(max_running=1, max_wait=0.05)
+    release = threading.Event()
+    job = jobs.submit(lambda: release.wait(5) and {"exitCode": 0})
+
+    started = time.monotonic()
+    snapshot = jobs.wait(job.id, timeout=10)
+    release.set()
+
+    assert time.monotonic() - started < 1
+    assert snapshot["status"] in ("pending", "running")
+    assert "result" not in snapshot
+
+
+def test_failed_job_reports_error():
+    jobs = JobManager(max_running=1)
+
+    def boom():
+        raise RuntimeError("boom")
+
+    snapshot = jobs.wait(jobs.submit(boom).id, timeout=5)
+
+    assert snapshot["result"]["exitCode"] == -1
+    assert "boom" in snapshot["result"]["stderr"]
+
+
+def test_rejects_jobs_beyond_limit():
+    jobs = JobManager(max_running=1, max_jobs=1)
+    release = threading.Event()
+    jobs.submit(release.wait)
+
+    with pytest.raises(AdmissionRejected):
+        jobs.submit(dict)
+    release.set()
+    assert jobs.stats()["rejected"] == 1
+
+
+def test_finished_jobs_expire():
+    jobs = JobManager(max_running=1, result_ttl=0)
+    job = jobs.submit(dict)
+    job.done.wait(5)
+    time.sleep(0.01)
+
+    with pytest.raises(JobError) as exc_info:
+        jobs.wait(job.id)
+    assert exc_info.value.status == 404
+    assert jobs.stats()["expired"] == 1
+
+
+def test_async_run_through_handler(app):
+    with app.app_context():
+        response, status_code = execute_code(
+            MockRequest({"code": "print(6 * 7)", "language": "python", "async": True})
+        )
+        assert status_code == 202
+        job_id = response.get_json()["jobId"]
+
+        response, status_code = execute_code(
+            MockRequest({"action": "get_job", "jobId": job_id, "wait": 10})
+        )
+
+    assert status_code == 200
+    job = response.get_json()
+    assert job["status"] == "done"
+    assert job["result"]["stdout"] == "42\n"
+
+
+def test_async_run_uses_job_timeout(app, monkeypatch):
+    monkeypatch.setattr(main, "JOB_TIMEOUT", 0.5)
+    with app.app_context():
+        response, _ = execute_code(
+            MockRequest(
+                {
+                    "code": "import time; time.sleep(5)",
+                    "language": "python",
+                    "async": True,
+                }
+            )
+        )
+        response, _ = execute_code(
+            MockRequest(
+                {"action": "get_job", "jobId": response.get_json()["jobId"], "wait": 10}
+            )
+        )
+
+    assert (
+        response.get_json()["result"]["stderr"]
+        == "Code execution timed out after 0.5 seconds"
+    )
+
+
+def test_async_run_gets_cpu_time_for_its_timeout(app, monkeypatch):
+    captured = []
+
+    def fake_run(cmd, timeout, max_output, limits, *args):
+        captured.append(limits)
+        return {"stdout": "", "stderr": "", "exitCode": 0}
+
+    monkeypatch.setattr(main, "run_process", fake_run)
+    with app.app_context():
+        response, _ = execute_code(
+            MockRequest({"code": "echo hi", "language": "bash", "async": True})
+        )
+        execute_code(
+            MockRequest(
+                {"action": "get_job", "jobId": response.get_json()["jobId"], "wait": 10}
+            )
+        )
+
+    assert captured == [main.JOB_LIMITS]
+    assert main.JOB_LIMITS.cpu_seconds >= main.JOB_TIMEOUT
+    assert main.JOB_LIMITS.memory_mb == main.DEFAULT_LIMITS.memory_mb
+
+
+def test_async_run_checks_input_files_first(app):
+    with app.app_context():
+        response, status_code = execute_code(
+            MockRequest(
+                {
+                    "code": "cat data.txt",
+                    "language": "bash",
+                    "async": True,
+                    "files": {"data.txt": "0" * 64},
+                }
+            )
+        )
+
+    assert status_code == 409
+    assert response.get_json()["missing"] == ["0" * 64]
+
+
+def test_get_unknown_job(app):
+    with app.app_context():
+        response, status_code = execute_code(
+            MockRequest({"action": "get_job", "jobId": "nope"})
+        )
+
+    assert status_code == 404
+    assert response.get_json()["error"] == "Unknown job: nope"
@@ -0,0 +1,74 @@
+from gcf.limits import ResourceLimits
+from gcf.output import run_process
+from gcf.pool import WORKER_COMMANDS, WorkerPool
+from gcf.streaming import stream_process
+
+
+def test_usage_reported_when_requested():
+    result = run_process(["python", "-c", "sum(range(10 ** 6))"], 10, usage=True)
+
+    usage = result["usage"]
+    assert usage["wallMs"] > 0
+    assert usage["cpuUserMs"] + usage["cpuSysMs"] > 0
+    assert usage["maxRssKb"] > 0
+
+
+def test_usage_omitted_by_default():
+    result = run_process(["python", "-c", "pass"], 10)
+    assert "usage" not in result
+
+
+def test_memory_limit_stops_large_allocation():
+    limits = ResourceLimits(
+        cpu_seconds=0, memory_mb=256, max_processes=0, file_size_mb=0
+    )
+    result = run_process(
+        ["python", "-c", "x = bytearray(512 * 1024 * 1024)"], 10, limits=limits
+    )
+
+    assert result["exitCode"] == 1
+    assert "MemoryError" in result["stderr"]
+
+
+def test_cpu_limit_stops_busy_loop():
+    limits = ResourceLimits(cpu_seconds=1, memory_mb=0, max_processes=0, file_size_mb=0)
+    result = run_process(["python", "-c", "while True: pass"], 10, limits=limits)
+
+    assert result["exitCode"] < 0
+    assert "CPU time limit exceeded" in result["stderr"]
+
+
+def test_file_size_limit():
+    limits = ResourceLimits(cpu_seconds=0, memory_mb=0, max_processes=0, file_size_mb=1)
+    code = "import os, tempfile\nwith tempfile.TemporaryFile() as f: f.write(os.urandom(2 * 1024 * 1024)); f.flush()"
+    result = run_process(["python", "-c", code], 10, limits=limits)
+
+    assert result["exitCode"] != 0
+
+
+def test_node_memory_limit_uses_heap_flag():
+    limits = ResourceLimits(
+        cpu_seconds=0, memory_mb=128, max_processes=0, file_size_mb=0
+    )
+    cmd, preexec_fn = limits.apply(["node", "-e", "1"])
+
+    assert cmd == ["node", "--max-old-space-size=128", "-e", "1"]
+    assert preexec_fn is None
+
+
+def test_stream_process_reports_usage():
+    events = list(stream_process(["python", "-c", "print(1)"], 10, usage=True))
+    assert "cpuUserMs" in events[-1]["usage"]
+
+
+def test_pooled_worker_reports_usage():
+    pool = WorkerPool(
+        WORKER_COMMANDS["python"], min_size=0, max_size=1, max_uses=10, idle_timeout=60
+    )
+    try:
+        result = pool.run("sum(range(10 ** 6))", timeout=10, usage=True)
+        assert set(result["usage"]) == {"cpuUserMs", "cpuSysMs", "maxRssKb", "wallMs"}
+        assert "usage" not in pool.run("pass", timeout=10)
+    finally:
+        for worker in pool._idle:
+            worker.close()
@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+from gcf.main import execute_code
+from gcf.metrics import StageMetrics, StageTimer, outcome_of
+from tests.conftest import MockRequest
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = StageMetrics("test_seconds", buckets=(0.1, 1))
+    metrics.observe("execute", 0.05, "python", "ok")
+    metrics.observe("execute", 0.5, "python", "ok")
+    metrics.observe("execute", 5, "python", "ok")
+
+    text = metrics.render()
+
+    labels = 'stage="execute",language="python",outcome="ok"'
+    assert f'test_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'test_seconds_bucket{{{labels},le="1"}} 2' in text
+    assert f'test_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f"test_seconds_count{{{labels}}} 3" in text
+
+
+def test_stage_timer_records_once():
+    metrics = StageMetrics("test_seconds")
+    timer = StageTimer(metrics, "bash")
+    timer.add("parse", 0.001)
+    timer.finish("ok")
+    timer.finish("failed")
+
+    snapshot = metrics.snapshot()
+    assert snapshot[("parse", "bash", "ok")]["count"] == 1
+    assert snapshot[("total", "bash", "ok")]["count"] == 1
+    assert not any(outcome == "failed" for _, _, outcome in snapshot)
+
+
+def test_outcome_of():
+    assert outcome_of({"exitCode": 0}) == "ok"
+    assert outcome_of({"exitCode": 2}) == "error"
+    assert outcome_of({"exitCode": -1}) == "failed"
+    assert outcome_of({"error": "Missing required field: code"}) == "invalid"
+
+
+def test_execution_records_every_stage(app):
+    metrics = StageMetrics("executor_stage_seconds")
+
+    with patch("gcf.main.METRICS", metrics):
+        _, status_code = execute_code(
+            MockRequest({"code": "print(1)", "language": "python"})
+        )
+
+    assert status_code == 200
+    stages = {
+        stage for stage, language, _ in metrics.snapshot() if language == "python"
+    }
+    assert stages == {"parse", "queue_wait", "spawn", "execute", "serialize", "total"}
+
+
+def test_metrics_endpoint(app):
+    metrics = StageMetrics("executor_stage_seconds")
+    metrics.observe("execute", 0.2, "bash", "error")
+
+    with patch("gcf.main.METRICS", metrics):
+        response, status_code = execute_code(
+            MockRequest(None, method="GET", path="/metrics")
+        )
+
+    text = response.get_data(as_text=True)
+    assert status_code == 200
+    assert response.mimetype == "text/plain"
+    assert (
+        'executor_stage_seconds_count{stage="execute",language="bash",outcome="error"} 1'
+        in text
+    )
+    assert "executor_admission_active 0" in text
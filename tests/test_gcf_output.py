@@ -0,0 +1,137 @@
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from gcf.output import BoundedBuffer, RingBuffer, run_process
+from gcf.pool import WORKER_COMMANDS, WorkerPool
+from gcf.streaming import stream_process
+
+
+def test_ring_buffer_keeps_latest_bytes():
+    ring = RingBuffer(5)
+    ring.write(b"abc")
+    assert ring.getvalue() == b"abc"
+    ring.write(b"defg")
+    assert ring.getvalue() == b"cdefg"
+    ring.write(b"0123456789")
+    assert ring.getvalue() == b"56789"
+
+
+def test_bounded_buffer_under_limit():
+    buffer = BoundedBuffer(10)
+    buffer.write(b"hello")
+    buffer.write(b"abc")
+
+    assert buffer.getvalue() == "helloabc"
+    assert not buffer.truncated
+
+
+def test_bounded_buffer_keeps_head_and_tail():
+    buffer = BoundedBuffer(10)
+    for chunk in (b"0123", b"4567", b"89ab", b"cdef"):
+        buffer.write(chunk)
+
+    assert buffer.truncated
+    assert buffer.total == 16
+    assert buffer.getvalue() == "01234\n... [6 bytes truncated] ...\nbcdef"
+
+
+def test_run_process_captures_output():
+    result = run_process(
+        [
+            "python",
+            "-c",
+            "import sys; print('out'); print('err', file=sys.stderr); sys.exit(2)",
+        ],
+        10,
+    )
+
+    assert result == {"stdout": "out\n", "stderr": "err\n", "exitCode": 2}
+
+
+def test_run_process_bounds_output():
+    code = "import sys\nfor i in range(100000): sys.stdout.write('x' * 99 + '\\n')\nprint('END')"
+    result = run_process(["python", "-c", code], 30, max_output=1000)
+
+    assert result["truncated"] is True
+    assert result["stdoutBytes"] == 100000 * 100 + 4
+    assert result["stdout"].startswith("x" * 99)
+    assert result["stdout"].endswith("END\n")
+    assert len(result["stdout"]) < 1100
+
+
+def test_run_process_timeout():
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_process(["python", "-c", "import time; time.sleep(5)"], 0.2)
+
+
+def test_run_process_background_child_cannot_outlive_timeout():
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_process(["bash", "-c", "sleep 600 & echo started"], 1)
+
+    assert time.monotonic() - started < 3
+
+
+def test_run_process_waits_for_children_within_timeout():
+    result = run_process(["bash", "-c", "(sleep 0.2; echo late) & echo early"], 10)
+
+    assert result["stdout"] == "early\nlate\n"
+
+
+def test_stream_process_bounds_output():
+    code = "for i in range(1000): print('y' * 99)\nprint('END')"
+    events = list(stream_process(["python", "-c", code], 10, max_output=1000))
+
+    stdout = "".join(e["data"] for e in events if e.get("stream") == "stdout")
+    assert stdout.startswith("y" * 99)
+    assert stdout.endswith("END\n")
+    assert "bytes truncated" in stdout
+    assert events[-1] == {
+        "exitCode": 0,
+        "truncated": True,
+        "stdoutBytes": 100004,
+        "stderrBytes": 0,
+    }
+
+
+def test_worker_bounds_output(monkeypatch):
+    monkeypatch.setenv("MAX_OUTPUT_BYTES", "1000")
+    pool = WorkerPool(
+        WORKER_COMMANDS["python"], min_size=0, max_size=1, max_uses=10, idle_timeout=60
+    )
+
+    result = pool.run("for i in range(1000): print('z' * 99)", timeout=10)
+
+    assert result["truncated"] is True
+    assert result["stdoutBytes"] == 100000
+    assert len(result["stdout"]) < 1100
+    pool._idle[0].close()
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_javascript_worker_bounds_output(monkeypatch):
+    monkeypatch.setenv("MAX_OUTPUT_BYTES", "1000")
+    pool = WorkerPool(
+        WORKER_COMMANDS["javascript"],
+        min_size=0,
+        max_size=1,
+        max_uses=10,
+        idle_timeout=60,
+    )
+
+    result = pool.run(
+        "for (let i = 0; i < 1000; i++) console.log('z'.repeat(98) + 'é')\nconsole.log('END')",
+        timeout=10,
+    )
+
+    assert result["truncated"] is True
+    assert result["stdoutBytes"] == 1000 * 101 + 4
+    assert result["stderrBytes"] == 0
+    assert result["stdout"].startswith("z" * 98)
+    assert result["stdout"].endswith("END\n")
+    assert "bytes truncated" in result["stdout"]
+    assert len(result["stdout"]) < 1100
+    pool._idle[0].close()
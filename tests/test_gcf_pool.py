@@ -0,0 +1,111 @@
+import shutil
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from gcf.main import execute_code
+from gcf.pool import WORKER_COMMANDS, WorkerPool
+from tests.conftest import MockRequest
+
+requires_node = pytest.mark.skipif(
+    shutil.which("node") is None, reason="node not installed"
+)
+
+
+@pytest.fixture
+def python_pool():
+    pool = WorkerPool(
+        WORKER_COMMANDS["python"], min_size=0, max_size=2, max_uses=3, idle_timeout=60
+    )
+    yield pool
+    for worker in pool._idle:
+        worker.close()
+
+
+def test_python_worker_runs_code(python_pool):
+    result = python_pool.run("print(1 + 1)", timeout=10)
+    assert result == {"stdout": "2\n", "stderr": "", "exitCode": 0}
+
+
+def test_python_worker_captures_child_process_output(python_pool):
+    result = python_pool.run("import os; os.system('echo from-shell')", timeout=10)
+    assert result["stdout"] == "from-shell\n"
+
+
+def test_python_worker_reports_errors_like_python_c(python_pool):
+    result = python_pool.run("1/0", timeout=10)
+    assert result["exitCode"] == 1
+    assert result["stderr"].startswith(
+        'Traceback (most recent call last):\n  File "<string>", line 1'
+    )
+    assert "ZeroDivisionError" in result["stderr"]
+
+    result = python_pool.run("import sys; sys.exit(3)", timeout=10)
+    assert result["exitCode"] == 3
+
+
+def test_python_worker_does_not_leak_globals(python_pool):
+    python_pool.run("x = 1", timeout=10)
+    result = python_pool.run("print(x)", timeout=10)
+    assert "NameError" in result["stderr"]
+
+
+def test_worker_reused_then_recycled_after_max_uses(python_pool):
+    pids = [
+        python_pool.run("import os; print(os.getpid())", timeout=10)["stdout"]
+        for _ in range(4)
+    ]
+
+    assert len(set(pids[:3])) == 1
+    assert pids[3] != pids[0]
+    assert python_pool.stats() == {"size": 1, "idle": 1, "waiting": 0}
+
+
+def test_worker_timeout_replaces_worker(python_pool):
+    with pytest.raises(subprocess.TimeoutExpired):
+        python_pool.run("import time; time.sleep(5)", timeout=0.2)
+
+    assert python_pool.stats()["size"] == 0
+    assert python_pool.run("print('ok')", timeout=10)["stdout"] == "ok\n"
+
+
+def test_worker_crash_returns_exit_code(python_pool):
+    result = python_pool.run("import os; os._exit(7)", timeout=10)
+    assert result["exitCode"] == 7
+    assert python_pool.stats()["size"] == 0
+
+
+@requires_node
+def test_javascript_worker_waits_for_timers():
+    pool = WorkerPool(
+        WORKER_COMMANDS["javascript"],
+        min_size=0,
+        max_size=1,
+        max_uses=10,
+        idle_timeout=60,
+    )
+
+    result = pool.run(
+        "setTimeout(() => console.log('late'), 20); console.log('early')", timeout=10
+    )
+    assert result == {"stdout": "early\nlate\n", "stderr": "", "exitCode": 0}
+
+    result = pool.run("process.exit(4)", timeout=10)
+    assert result["exitCode"] == 4
+    pool._idle[0].close()
+
+
+def test_execute_code_uses_pool(app, python_pool):
+    request = MockRequest({"code": "print('pooled')", "language": "python"})
+
+    with (
+        app.app_context(),
+        patch.dict("gcf.main.POOLS", {"python": python_pool}),
+        patch("gcf.main.run_process") as mock_run,
+    ):
+        response, status_code = execute_code(request)
+
+    assert status_code == 200
+    assert response.json == {"stdout": "pooled\n", "stderr": "", "exitCode": 0}
+    mock_run.assert_not_called()
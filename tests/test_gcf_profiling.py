@@ -0,0 +1,162 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from gcf.main import execute_code
+from gcf.output import run_process
+from gcf.profiling import Profiler, summarize_cpuprofile
+from tests.conftest import MockRequest
+
+FIB_PY = "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\n\nprint(fib(18))\n"
+FIB_JS = "function fib(n) { return n < 2 ? n : fib(n - 1) + fib(n - 2); }\nconsole.log(fib(25));\n"
+
+
+def functions(summary: dict) -> dict:
+    return {entry["function"]: entry for entry in summary["functions"]}
+
+
+def test_python_profile_reports_snippet_functions():
+    with Profiler("python") as profiler:
+        result = run_process(profiler.command(FIB_PY), 10)
+        summary = profiler.summary()
+
+    assert result["stdout"] == "2584\n"
+    assert summary["profiler"] == "cProfile"
+    fib = functions(summary)["<string>:1(fib)"]
+    assert fib["calls"] == 8361
+    assert fib["cumulativeMs"] >= fib["selfMs"] > 0
+    assert summary["functions"][0]["function"] == "<string>:1(fib)"
+    # Nothing from the runner itself
+    assert not any(
+        "profile_runner" in name or "exec" in name for name in functions(summary)
+    )
+
+
+def test_python_profile_keeps_exit_code_and_traceback():
+    with Profiler("python") as profiler:
+        result = run_process(profiler.command("print('before')\n1 / 0"), 10)
+        summary = profiler.summary()
+    with Profiler("python") as profiler:
+        exited = run_process(profiler.command("import sys\nsys.exit(3)"), 10)
+
+    assert result["stdout"] == "before\n"
+    assert result["exitCode"] == 1
+    assert result["stderr"].startswith(
+        'Traceback (most recent call last):\n  File "<string>", line 2'
+    )
+    assert "profile_runner" not in result["stderr"]
+    assert summary is not None
+    assert exited["exitCode"] == 3
+
+
+def test_profile_directory_is_removed():
+    with Profiler("python") as profiler:
+        run_process(profiler.command("pass"), 10)
+        directory = profiler.directory
+
+    assert not os.path.exists(directory)
+
+
+def test_unsupported_language():
+    with pytest.raises(ValueError):
+        Profiler("bash")
+
+
+def test_cpuprofile_summary_counts_recursion_once(tmp_path):
+    def node(id, name, children=(), url="[eval]"):
+        frame = {"functionName": name, "url": url, "lineNumber": 0, "columnNumber": 0}
+        return {"id": id, "callFrame": frame, "children": list(children)}
+
+    profile = {
+        "nodes": [
+            node(1, "(root)", [2, 3], url=""),
+            node(2, "(idle)", url=""),
+            node(3, "", [4]),
+            node(4, "fib", [5]),
+            node(5, "fib"),
+        ],
+        "startTime": 0,
+        "endTime": 4000,
+        "samples": [5, 5, 4, 2],
+        "timeDeltas": [0, 1000, 1000, 1000],
+    }
+    path = tmp_path / "run.cpuprofile"
+    path.write_text(json.dumps(profile))
+
+    summary = summarize_cpuprofile(str(path))
+
+    assert summary["profiler"] == "v8"
+    assert summary["totalMs"] == 3.0
+    fib = functions(summary)["[eval]:1(fib)"]
+    assert fib == {
+        "function": "[eval]:1(fib)",
+        "samples": 3,
+        "selfMs": 3.0,
+        "cumulativeMs": 3.0,
+    }
+    assert functions(summary)["[eval]:1((anonymous))"]["cumulativeMs"] == 3.0
+    assert "(idle)" not in functions(summary)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_javascript_profile():
+    with Profiler("javascript") as profiler:
+        result = run_process(profiler.command(FIB_JS), 10)
+        summary = profiler.summary()
+
+    assert result["stdout"] == "75025\n"
+    assert summary["profiler"] == "v8"
+    assert summary["functions"]
+
+
+def test_profile_through_handler(app):
+    with app.app_context():
+        response, status_code = execute_code(
+            MockRequest({"code": FIB_PY, "language": "python", "profile": True})
+        )
+        plain, _ = execute_code(MockRequest({"code": FIB_PY, "language": "python"}))
+
+    data = response.get_json()
+    assert status_code == 200
+    assert data["stdout"] == "2584\n"
+    assert "<string>:1(fib)" in functions(data["profile"])
+    assert "profile" not in plain.get_json()
+
+
+def test_profile_stream_through_handler(app):
+    with app.app_context():
+        response, _ = execute_code(
+            MockRequest(
+                {"code": FIB_PY, "language": "python", "profile": True, "stream": True}
+            )
+        )
+        events = [json.loads(line) for line in response.response]
+        response.close()
+
+    assert "".join(e["data"] for e in events if e.get("stream") == "stdout") == "2584\n"
+    assert events[-1]["exitCode"] == 0
+    assert "<string>:1(fib)" in functions(events[-1]["profile"])
+
+
+def test_profile_rejected_for_bash_and_sessions(app):
+    with app.app_context():
+        bash, bash_status = execute_code(
+            MockRequest({"code": "echo hi", "language": "bash", "profile": True})
+        )
+        session, session_status = execute_code(
+            MockRequest(
+                {
+                    "code": "x = 1",
+                    "language": "python",
+                    "profile": True,
+                    "sessionId": "abc",
+                }
+            )
+        )
+
+    assert bash_status == 400
+    assert bash.get_json()["error"] == "Profiling is not supported for bash"
+    assert session_status == 400
+    assert session.get_json()["error"] == "Profiling is not supported in sessions"
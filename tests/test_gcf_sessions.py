@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+import pytest
+
+from gcf.main import execute_code
+from gcf.sessions import SessionError, SessionManager
+from tests.conftest import MockRequest
+
+
+@pytest.fixture
+def sessions():
+    manager = SessionManager(max_sessions=2, memory_mb=512, idle_timeout=60)
+    yield manager
+    for session_id in list(manager._sessions):
+        manager.close(session_id)
+
+
+def test_session_keeps_globals(sessions):
+    session = sessions.create("python")
+
+    sessions.run(session.id, "x = 41", "python", timeout=10)
+    result = sessions.run(session.id, "print(x + 1)", "python", timeout=10)
+
+    assert result == {"stdout": "42\n", "stderr": "", "exitCode": 0}
+
+
+def test_session_language_must_match(sessions):
+    session = sessions.create("python")
+
+    with pytest.raises(SessionError) as exc_info:
+        sessions.run(session.id, "console.log(1)", "javascript", timeout=10)
+
+    assert exc_info.value.status == 400
+
+
+def test_session_limit(sessions):
+    sessions.create("python")
+    sessions.create("python")
+
+    with pytest.raises(SessionError) as exc_info:
+        sessions.create("python")
+
+    assert exc_info.value.status == 429
+
+
+def test_session_idle_eviction(sessions):
+    session = sessions.create("python")
+    session.last_used -= 120
+
+    sessions.evict_idle()
+
+    assert sessions.count() == 0
+    with pytest.raises(SessionError) as exc_info:
+        sessions.run(session.id, "print(1)", "python", timeout=10)
+    assert exc_info.value.status == 404
+
+
+def test_session_closed_on_timeout(sessions):
+    session = sessions.create("python")
+
+    result = sessions.run(
+        session.id, "import time; time.sleep(5)", "python", timeout=0.2
+    )
+
+    assert result["exitCode"] == -1
+    assert "session closed" in result["stderr"]
+    assert sessions.count() == 0
+
+
+def test_session_memory_limit(sessions):
+    session = sessions.create("python")
+
+    result = sessions.run(
+        session.id, "data = bytearray(2 * 1024 ** 3)", "python", timeout=10
+    )
+
+    assert "MemoryError" in result["stderr"]
+    assert (
+        sessions.run(session.id, "print('alive')", "python", timeout=10)["stdout"]
+        == "alive\n"
+    )
+
+
+def test_execute_code_session_actions(app, sessions):
+    with app.app_context(), patch("gcf.main.SESSIONS", sessions):
+        response, status_code = execute_code(
+            MockRequest({"action": "create_session", "language": "python"})
+        )
+        assert status_code == 200
+        session_id = response.json["sessionId"]
+
+        execute_code(
+            MockRequest(
+                {"code": "y = 'kept'", "language": "python", "sessionId": session_id}
+            )
+        )
+        response, status_code = execute_code(
+            MockRequest(
+                {"code": "print(y)", "language": "python", "sessionId": session_id}
+            )
+        )
+        assert response.json["stdout"] == "kept\n"
+
+        response, status_code = execute_code(
+            MockRequest({"action": "close_session", "sessionId": session_id})
+        )
+        assert response.json == {"closed": True}
+
+        response, status_code = execute_code(
+            MockRequest(
+                {"code": "print(y)", "language": "python", "sessionId": session_id}
+            )
+        )
+        assert status_code == 404
+        assert response.json == {"error": f"Unknown session: {session_id}"}
+
+
+def test_execute_code_unknown_action(app):
+    with app.app_context():
+        response, status_code = execute_code(MockRequest({"action": "reboot"}))
+
+    assert status_code == 400
+    assert response.json == {"error": "Unknown action: reboot"}
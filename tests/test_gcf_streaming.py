@@ -0,0 +1,76 @@
+import json
+import time
+
+from gcf.main import execute_code
+from gcf.streaming import stream_process
+from tests.conftest import MockRequest
+
+
+def test_stream_process_yields_output_then_exit_code():
+    events = list(
+        stream_process(
+            [
+                "python",
+                "-c",
+                "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)",
+            ],
+            timeout=10,
+        )
+    )
+
+    stdout = "".join(e["data"] for e in events if e.get("stream") == "stdout")
+    stderr = "".join(e["data"] for e in events if e.get("stream") == "stderr")
+    assert stdout == "out\n"
+    assert stderr == "err\n"
+    assert events[-1] == {"exitCode": 3}
+
+
+def test_stream_process_delivers_output_before_exit():
+    started = time.monotonic()
+    events = stream_process(
+        ["python", "-c", "import time; print('first', flush=True); time.sleep(1)"],
+        timeout=10,
+    )
+
+    first = next(events)
+    assert first["stream"] == "stdout"
+    assert first["data"].startswith("f")
+    assert time.monotonic() - started < 0.9
+    events.close()
+
+
+def test_stream_process_timeout():
+    events = list(
+        stream_process(["python", "-c", "import time; time.sleep(5)"], timeout=0.2)
+    )
+
+    assert events == [
+        {"stream": "stderr", "data": "Code execution timed out after 0.2 seconds"},
+        {"exitCode": -1},
+    ]
+
+
+def test_stream_process_background_child_cannot_outlive_timeout():
+    started = time.monotonic()
+    events = list(stream_process(["bash", "-c", "sleep 600 & echo started"], timeout=1))
+
+    assert time.monotonic() - started < 3
+    assert events[0] == {"stream": "stdout", "data": "started\n"}
+    assert events[-2:] == [
+        {"stream": "stderr", "data": "Code execution timed out after 1 seconds"},
+        {"exitCode": -1},
+    ]
+
+
+def test_execute_code_stream_returns_ndjson(app):
+    request = MockRequest({"code": "print('hi')", "language": "python", "stream": True})
+
+    with app.app_context():
+        response, status_code = execute_code(request)
+        body = response.get_data(as_text=True)
+
+    assert status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    events = [json.loads(line) for line in body.splitlines()]
+    assert "".join(e["data"] for e in events[:-1]) == "hi\n"
+    assert events[-1] == {"exitCode": 0}
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from gcf.main import execute_code
+from gcf.tracing import MAX_SPANS, Trace
+from tests.conftest import MockRequest
+
+
+def test_stages_are_laid_out_back_to_back():
+    trace = Trace("t1", started=10.0)
+    trace.add_stages({"build": 0.5, "spawn": 0.1, "execute": 0.4}, end=11.5)
+
+    spans = {s["name"]: s for s in trace.spans}
+    assert spans["build"] == {"name": "build", "startMs": 500.0, "durMs": 500.0}
+    assert spans["spawn"]["startMs"] == 1000.0
+    assert spans["execute"]["startMs"] == 1100.0
+
+
+def test_span_count_is_bounded():
+    trace = Trace("t1")
+    for _ in range(MAX_SPANS + 10):
+        trace.add("execute", 0.001)
+
+    assert len(json.loads(trace.header())) == MAX_SPANS
+
+
+def test_traced_request_returns_spans(app):
+    with app.app_context():
+        response, _ = execute_code(
+            MockRequest(
+                {"code": "print(1)", "language": "python"}, {"X-Trace-Id": "t1"}
+            )
+        )
+        untraced, _ = execute_code(
+            MockRequest({"code": "print(1)", "language": "python"})
+        )
+
+    spans = {s["name"]: s for s in json.loads(response.headers["X-Trace-Spans"])}
+    assert {
+        "parse",
+        "queue_wait",
+        "spawn",
+        "execute",
+        "serialize",
+        "execute_code",
+    } <= set(spans)
+    assert spans["spawn"]["startMs"] + spans["spawn"]["durMs"] == pytest.approx(
+        spans["execute"]["startMs"], abs=0.01
+    )
+    assert spans["execute_code"]["durMs"] >= spans["execute"]["durMs"]
+    assert "X-Trace-Spans" not in untraced.headers
+
+
+def test_traced_stream_sends_spans_with_final_event(app):
+    with app.app_context():
+        response, _ = execute_code(
+            MockRequest(
+                {"code": "print(1)", "language": "python", "stream": True},
+                {"X-Trace-Id": "t1"},
+            )
+        )
+        events = [json.loads(line) for line in response.response]
+        response.close()
+
+    assert events[-1]["exitCode"] == 0
+    assert {"spawn", "execute"} <= {s["name"] for s in events[-1]["trace"]}
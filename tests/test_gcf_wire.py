@@ -0,0 +1,139 @@
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+from flask import Flask, request
+
+from gcf import wire
+from gcf.main import execute_code
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/", methods=["POST"])
+    def handle():
+        return execute_code(request)
+
+    return app.test_client()
+
+
+def fake_run(stdout):
+    return {"stdout": stdout, "stderr": "", "exitCode": 0}
+
+
+def test_plain_json_advertises_encodings(client):
+    with patch("gcf.main.run_process", return_value=fake_run("hi\n")):
+        response = client.post("/", json={"code": "print('hi')", "language": "python"})
+
+    assert response.status_code == 200
+    assert response.get_json() == fake_run("hi\n")
+    assert "Content-Encoding" not in response.headers
+    assert "gzip" in response.headers["Accept-Encoding"]
+    assert "application/json" in response.headers["Accept-Post"]
+
+
+def test_gzip_request_body(client):
+    body = gzip.compress(
+        json.dumps({"code": "print('hi')", "language": "python"}).encode()
+    )
+
+    with patch("gcf.main.run_process", return_value=fake_run("hi\n")) as mock_run:
+        response = client.post(
+            "/",
+            data=body,
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+
+    assert response.status_code == 200
+    assert mock_run.call_args[0][0][-1] == "print('hi')"
+
+
+def test_large_response_is_compressed(client):
+    stdout = "x" * (wire.COMPRESS_MIN_BYTES * 4)
+
+    with patch("gcf.main.run_process", return_value=fake_run(stdout)):
+        response = client.post(
+            "/",
+            json={"code": "x", "language": "python"},
+            headers={"Accept-Encoding": "gzip"},
+        )
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(response.data) < len(stdout)
+    assert json.loads(gzip.decompress(response.data)) == fake_run(stdout)
+
+
+def test_small_response_is_not_compressed(client):
+    with patch("gcf.main.run_process", return_value=fake_run("hi\n")):
+        response = client.post(
+            "/",
+            json={"code": "x", "language": "python"},
+            headers={"Accept-Encoding": "gzip"},
+        )
+
+    assert "Content-Encoding" not in response.headers
+    assert response.get_json() == fake_run("hi\n")
+
+
+def test_decompression_bomb_is_rejected(client):
+    body = gzip.compress(b" " * (64 * 1024 * 1024))
+    assert len(body) < 100 * 1024
+
+    response = client.post(
+        "/",
+        data=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+
+    assert response.status_code == 413
+    assert "too large" in response.get_json()["error"]
+
+
+def test_decompress_reads_every_gzip_member():
+    body = gzip.compress(b"abc") + gzip.compress(b"def")
+
+    assert wire.decompress(body, "gzip", limit=6) == b"abcdef"
+    with pytest.raises(wire.RequestTooLarge):
+        wire.decompress(body, "gzip", limit=5)
+
+
+def test_unsupported_encoding_is_rejected(client):
+    response = client.post(
+        "/",
+        data=b"\x00",
+        headers={"Content-Type": "application/json", "Content-Encoding": "br"},
+    )
+
+    assert response.status_code == 415
+    assert "br" in response.get_json()["error"]
+    assert "gzip" in response.headers["Accept-Encoding"]
+
+
+def test_msgpack_round_trip(client):
+    msgpack = pytest.importorskip("msgpack")
+
+    with patch("gcf.main.run_process", return_value=fake_run("hi\n")):
+        response = client.post(
+            "/",
+            data=msgpack.packb({"code": "x", "language": "python"}),
+            headers={
+                "Content-Type": "application/msgpack",
+                "Accept": "application/msgpack",
+            },
+        )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/msgpack"
+    assert msgpack.unpackb(response.data) == fake_run("hi\n")
+
+
+def test_accepts_ignores_wildcards_and_zero_quality():
+    assert wire.accepts(
+        "application/msgpack, application/json;q=0.9", "application/msgpack"
+    )
+    assert not wire.accepts("*/*", "application/msgpack")
+    assert not wire.accepts("gzip;q=0", "gzip")
+    assert wire.accepts("deflate, gzip;q=0.5", "gzip")
@@ -0,0 +1,114 @@
+import subprocess
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from gcf.cancellation import Call, Cancelled
+from gcf.limits import ResourceLimits
+from gcf.main import execute_code
+from gcf.zygote import Zygote
+from tests.conftest import MockRequest
+
+
+@pytest.fixture(scope="module")
+def zygote():
+    zygote = Zygote(["decimal"], ResourceLimits(cpu_seconds=10, file_size_mb=1))
+    yield zygote
+    zygote.close()
+
+
+def test_runs_code_with_preloaded_modules(zygote):
+    result = zygote.run("import sys; print(__name__, 'decimal' in sys.modules)", 5)
+
+    assert result == {"stdout": "__main__ True\n", "stderr": "", "exitCode": 0}
+
+
+def test_exit_codes_and_tracebacks_match_python_c(zygote):
+    code = "import sys\nprint('partial')\nsys.stdout.flush()\nraise ValueError('boom')"
+
+    result = zygote.run(code, 5)
+    expected = subprocess.run(
+        ["python", "-c", code], capture_output=True, text=True, check=False
+    )
+
+    assert result["exitCode"] == expected.returncode == 1
+    assert result["stdout"] == expected.stdout
+    assert result["stderr"] == expected.stderr
+    assert zygote.run("import sys; sys.exit(7)", 5)["exitCode"] == 7
+
+
+def test_runs_are_isolated(zygote):
+    zygote.run("import decimal; decimal.getcontext().prec = 3; x = 1", 5)
+
+    result = zygote.run(
+        "import decimal; print(decimal.getcontext().prec, 'x' in globals())", 5
+    )
+
+    assert result["stdout"] == "28 False\n"
+
+
+def test_timeout_kills_the_run_and_its_children(zygote):
+    with pytest.raises(subprocess.TimeoutExpired):
+        zygote.run(
+            "import subprocess, time; subprocess.Popen(['sleep', '30']); time.sleep(30)",
+            0.5,
+        )
+
+    assert zygote.run("print('still serving')", 5)["stdout"] == "still serving\n"
+
+
+def test_cancel_kills_the_run(zygote):
+    call = Call("r1")
+    threading.Timer(0.2, call.cancel).start()
+    started = time.monotonic()
+
+    with pytest.raises(Cancelled):
+        zygote.run("import time; time.sleep(30)", 30, call=call)
+    assert time.monotonic() - started < 5
+
+
+def test_background_child_cannot_outlive_timeout(zygote):
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        zygote.run("import subprocess; subprocess.Popen(['sleep', '600'])", 1)
+
+    assert time.monotonic() - started < 3
+
+
+def test_limits_cwd_and_usage(zygote, tmp_path):
+    result = zygote.run(
+        "open('big', 'wb').write(b'x' * 2 * 1024 * 1024)",
+        5,
+        usage=True,
+        cwd=str(tmp_path),
+    )
+
+    assert result["exitCode"] != 0
+    # Python ignores SIGXFSZ, so the write fails as it would under python -c
+    assert "File too large" in result["stderr"]
+    assert (tmp_path / "big").exists()
+    assert set(result["usage"]) == {"wallMs", "cpuUserMs", "cpuSysMs", "maxRssKb"}
+
+
+def test_restarts_after_the_zygote_dies(zygote):
+    zygote.start()
+    zygote._proc.kill()
+    zygote._proc.wait()
+
+    assert zygote.run("print(1)", 5)["stdout"] == "1\n"
+    assert zygote.stats()["restarts"] >= 1
+
+
+def test_execute_code_uses_the_zygote(app, zygote):
+    runs = zygote.runs
+
+    with app.app_context(), patch("gcf.main.PYTHON_ZYGOTE", zygote):
+        response, status_code = execute_code(
+            MockRequest({"code": "print(2 + 2)", "language": "python"})
+        )
+
+    assert status_code == 200
+    assert response.json["stdout"] == "4\n"
+    assert zygote.runs == runs + 1
@@ -0,0 +1,169 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.code_mcp.hedging import HedgingPolicy, LatencyWindow, is_hedgeable, run_key
+
+
+def make_policy(**kwargs):
+    defaults = {
+        "enabled": True,
+        "percentile": 0.95,
+        "min_delay": 0.01,
+        "max_delay": 0.05,
+        "min_samples": 5,
+        "retries": 2,
+        "backoff": 0.001,
+    }
+    return HedgingPolicy(**{**defaults, **kwargs})
+
+
+def test_latency_window_percentile():
+    window = LatencyWindow()
+    for value in range(1, 101):
+        window.add(value / 100)
+    assert window.percentile(0.5) == pytest.approx(0.51)
+    assert window.percentile(0.99) == pytest.approx(1.0)
+
+
+def test_hedge_delay_follows_percentile():
+    policy = make_policy(max_delay=1)
+    assert policy.hedge_delay() == 1
+    for _ in range(10):
+        policy.latencies.add(0.2)
+    assert policy.hedge_delay() == pytest.approx(0.2)
+
+
+async def test_fast_request_is_not_hedged():
+    policy = make_policy()
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        return "ok"
+
+    assert await policy.run(send) == "ok"
+    assert calls == 1
+    assert policy.stats()["hedges_fired"] == 0
+
+
+async def test_slow_request_is_hedged_and_loser_cancelled():
+    policy = make_policy()
+    started = []
+    cancelled = []
+
+    async def send():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            await asyncio.sleep(1 if attempt == 0 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    assert await policy.run(send) == 1
+    await asyncio.sleep(0)
+    assert cancelled == [0]
+    stats = policy.stats()
+    assert stats["hedges_fired"] == 1
+    assert stats["hedges_won"] == 1
+
+
+async def test_long_running_snippet_is_not_hedged_again():
+    policy = make_policy()
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    key = run_key({"code": "sleep(0.1)", "language": "python"})
+    await policy.run(send, key=key)
+    assert calls == 2
+
+    # The primary won, so the code itself runs past the hedge delay
+    await policy.run(send, key=key)
+    assert calls == 3
+    assert policy.stats()["hedges_skipped"] == 1
+    # Other snippets are still hedged
+    await policy.run(send, key=run_key({"code": "other", "language": "python"}))
+    assert calls == 5
+
+
+async def test_no_hedging_while_typical_latency_is_above_cap():
+    policy = make_policy()
+    for _ in range(10):
+        policy.latencies.add(1.0)
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    await policy.run(send)
+    assert calls == 1
+    assert policy.stats()["hedges_fired"] == 0
+
+
+async def test_hedge_waits_for_other_request_after_failure():
+    policy = make_policy(retries=0)
+    started = []
+
+    async def send():
+        attempt = len(started)
+        started.append(attempt)
+        if attempt == 0:
+            await asyncio.sleep(0.1)
+            return "primary"
+        raise httpx.ReadTimeout("slow")
+
+    assert await policy.run(send) == "primary"
+    assert policy.stats()["hedges_won"] == 0
+
+
+async def test_disabled_or_stateful_requests_are_not_hedged():
+    policy = make_policy(enabled=False)
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    await policy.run(send)
+    await make_policy().run(send, hedge=False)
+    assert calls == 2
+    assert not is_hedgeable({"code": "x", "language": "python", "sessionId": "s1"})
+    assert not is_hedgeable({"code": "x", "language": "python", "async": True})
+    assert not is_hedgeable({"action": "create_session", "language": "python"})
+    assert is_hedgeable({"code": "x", "language": "python"})
+
+
+async def test_retries_connect_errors_only():
+    policy = make_policy(enabled=False)
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise httpx.ConnectError("refused")
+        return "ok"
+
+    assert await policy.run(flaky) == "ok"
+    assert policy.stats()["retries"] == 2
+
+    async def timed_out():
+        raise httpx.ReadTimeout("slow")
+
+    with pytest.raises(httpx.ReadTimeout):
+        await policy.run(timed_out)
+    assert policy.stats()["retries"] == 2
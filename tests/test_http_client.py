@@ -0,0 +1,271 @@
+import asyncio
+import gzip
+import json
+
+import httpx
+import pytest
+
+from src.code_mcp.http_client import (
+    GCFClient,
+    Overloaded,
+    PoolStats,
+    _PoolProbe,
+    call_deadline,
+)
+
+
+def make_client(handler, **kwargs):
+    return GCFClient(transport=httpx.MockTransport(handler), **kwargs)
+
+
+async def test_post_json_sends_payload():
+    seen = {}
+
+    def handler(request):
+        seen["body"] = json.loads(request.content)
+        return httpx.Response(200, json={"stdout": "2\n", "stderr": "", "exitCode": 0})
+
+    client = make_client(handler)
+    result = await client.post_json(
+        "https://gcf.test/run", {"code": "print(1+1)", "language": "python"}
+    )
+
+    assert result == {"stdout": "2\n", "stderr": "", "exitCode": 0}
+    assert seen["body"] == {"code": "print(1+1)", "language": "python"}
+    assert client.stats.in_flight == 0
+    await client.aclose()
+
+
+async def test_post_json_raises_on_http_error():
+    client = make_client(lambda request: httpx.Response(500, json={"error": "boom"}))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.post_json(
+            "https://gcf.test/run", {"code": "x", "language": "python"}
+        )
+    await client.aclose()
+
+
+async def test_stream_result_assembles_events():
+    lines = [
+        {"stream": "stdout", "data": "a"},
+        {"stream": "stderr", "data": "warn\n"},
+        {"stream": "stdout", "data": "b\n"},
+        {"exitCode": 1},
+    ]
+    seen = {}
+
+    def handler(request):
+        seen["body"] = json.loads(request.content)
+        body = "".join(json.dumps(line) + "\n" for line in lines)
+        return httpx.Response(
+            200, text=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+
+    chunks = []
+
+    async def on_output(stream, data):
+        chunks.append((stream, data))
+
+    client = make_client(handler)
+    result = await client.stream_result(
+        "https://gcf.test/run", {"code": "x", "language": "python"}, on_output
+    )
+
+    assert seen["body"]["stream"] is True
+    assert result == {"stdout": "ab\n", "stderr": "warn\n", "exitCode": 1}
+    assert chunks == [("stdout", "a"), ("stderr", "warn\n"), ("stdout", "b\n")]
+    await client.aclose()
+
+
+async def test_per_host_limit_creates_one_semaphore_per_host():
+    client = make_client(lambda request: httpx.Response(200, json={}), max_per_host=2)
+
+    await client.post_json("https://a.test/run", {})
+    await client.post_json("https://a.test/other", {})
+    await client.post_json("https://b.test/run", {})
+
+    assert set(client._host_limits) == {"a.test", "b.test"}
+    await client.aclose()
+
+
+async def test_probe_detects_new_connection():
+    probe = _PoolProbe(started=0.0)
+    await probe("connection.connect_tcp.started", {})
+    await probe("http11.send_request_headers.started", {})
+
+    assert probe.reused is False
+
+
+async def test_probe_detects_reused_connection():
+    probe = _PoolProbe(started=0.0)
+    await probe("http11.send_request_headers.started", {})
+
+    assert probe.reused is True
+
+
+def test_pool_stats_snapshot():
+    stats = PoolStats()
+    stats.record(reused=True, wait=0.001)
+    stats.record(reused=False, wait=0.003)
+
+    snapshot = stats.snapshot()
+    assert snapshot["hits"] == 1
+    assert snapshot["misses"] == 1
+    assert snapshot["hit_rate"] == 0.5
+    assert snapshot["wait_ms_max"] == pytest.approx(3.0)
+    assert snapshot["wait_ms_avg"] == pytest.approx(2.0)
+
+
+async def test_admission_limiter_rejects_when_queue_full():
+    release = asyncio.Event()
+
+    async def handler(request):
+        await release.wait()
+        return httpx.Response(200, json={"stdout": "", "stderr": "", "exitCode": 0})
+
+    client = make_client(handler, max_concurrent=1, max_queue=1)
+    payload = {"code": "x", "language": "python"}
+    first = asyncio.create_task(client.post_json("https://gcf.test/run", payload))
+    second = asyncio.create_task(client.post_json("https://gcf.test/run", payload))
+    await asyncio.sleep(0.05)
+
+    assert client.admission.snapshot()["active"] == 1
+    assert client.admission.snapshot()["queued"] == 1
+    with pytest.raises(Overloaded):
+        await client.post_json("https://gcf.test/run", payload)
+
+    release.set()
+    await asyncio.gather(first, second)
+    snapshot = client.admission.snapshot()
+    assert snapshot["admitted"] == 2
+    assert snapshot["rejected"] == 1
+    assert snapshot["wait_ms_max"] > 0
+    await client.aclose()
+
+
+def advertising(handler):
+    def wrapped(request):
+        response = handler(request)
+        response.headers["Accept-Encoding"] = "gzip"
+        response.headers["Accept-Post"] = "application/json"
+        return response
+
+    return wrapped
+
+
+async def test_requests_compressed_once_advertised():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        body = request.content
+        if request.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return httpx.Response(
+            200,
+            json={"stdout": json.loads(body)["code"][:1], "stderr": "", "exitCode": 0},
+        )
+
+    client = make_client(advertising(handler))
+    large = {"code": "x" * 4096, "language": "python"}
+    await client.post_json("https://gcf.test/run", large)
+    result = await client.post_json("https://gcf.test/run", large)
+    await client.post_json("https://gcf.test/run", {"code": "1", "language": "python"})
+
+    assert result["stdout"] == "x"
+    assert "Content-Encoding" not in seen[0].headers
+    assert seen[1].headers["Content-Encoding"] == "gzip"
+    assert len(seen[1].content) < 4096
+    # Below GCF_COMPRESS_MIN_BYTES
+    assert "Content-Encoding" not in seen[2].headers
+    await client.aclose()
+
+
+async def test_falls_back_to_json_on_unsupported_media_type():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("Content-Encoding"))
+        if request.headers.get("Content-Encoding"):
+            return httpx.Response(
+                415, json={"error": "Unsupported Content-Encoding: gzip"}
+            )
+        return httpx.Response(200, json={"stdout": "", "stderr": "", "exitCode": 0})
+
+    client = make_client(advertising(handler))
+    large = {"code": "x" * 4096, "language": "python"}
+    await client.post_json("https://gcf.test/run", large)
+    result = await client.post_json("https://gcf.test/run", large)
+
+    assert result["exitCode"] == 0
+    assert seen == [None, "gzip", None]
+    await client.aclose()
+
+
+async def test_executor_without_negotiation_gets_plain_json():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json={"stdout": "", "stderr": "", "exitCode": 0})
+
+    client = make_client(handler)
+    for _ in range(2):
+        await client.post_json(
+            "https://gcf.test/run", {"code": "x" * 4096, "language": "python"}
+        )
+
+    assert all("Content-Encoding" not in request.headers for request in seen)
+    assert all(
+        request.headers["Content-Type"] == "application/json" for request in seen
+    )
+    await client.aclose()
+
+
+async def test_cancelled_call_cancels_run_on_executor():
+    seen = []
+
+    async def handler(request):
+        body = json.loads(request.content)
+        seen.append((body, dict(request.headers)))
+        if body.get("action") == "cancel":
+            return httpx.Response(200, json={"cancelled": True})
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={"stdout": "", "stderr": "", "exitCode": 0})
+
+    client = make_client(handler, timeout=20)
+    call = asyncio.create_task(
+        client.post_json("https://gcf.test/run", {"code": "x", "language": "python"})
+    )
+    await asyncio.sleep(0.05)
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    await client.aclose()
+
+    (_, run_headers), (cancel, _) = seen
+    assert run_headers["x-deadline-ms"] == "20000"
+    assert cancel == {"action": "cancel", "requestId": run_headers["x-request-id"]}
+    assert client.cancels_sent == 1
+
+
+async def test_call_deadline_is_sent_to_the_executor():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers["x-deadline-ms"])
+        return httpx.Response(200, json={"stdout": "", "stderr": "", "exitCode": 0})
+
+    client = make_client(handler, timeout=20)
+    await client.post_json(
+        "https://gcf.test/run", {"code": "x", "language": "python"}, deadline=5
+    )
+    await client.post_json(
+        "https://gcf.test/run", {"code": "x", "language": "python"}, deadline=60
+    )
+    await client.aclose()
+
+    assert seen == ["5000", "20000"]
+    assert call_deadline({"code": "x", "timeout": 5}) == 5
+    assert call_deadline({"code": "x", "timeout": 5, "async": True}) is None
@@ -1,7 +1,9 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
 import pytest
-import json
-from unittest.mock import Mock, patch, AsyncMock
-from mcp.types import Tool, TextContent
+from mcp.types import TextContent
+
 from src.code_mcp.server import CodeInterpreterServer
 
 
@@ -12,84 +14,107 @@ def server():
 
 @pytest.fixture
 def mock_gcf_response():
-    return {
-        "stdout": "Hello, World!",
-        "stderr": "",
-        "exitCode": 0
-    }
+    return {"stdout": "Hello, World!", "stderr": "", "exitCode": 0}
 
 
 async def test_server_initialization(server):
     assert server.name == "code-interpreter"
-    assert hasattr(server, 'run_code')
+    assert hasattr(server, "run_code")
 
 
 async def test_list_tools(server):
     tools = await server.list_tools()
-    assert len(tools) == 1
+    assert len(tools) == 6
     assert tools[0].name == "run_code"
     assert tools[0].description == "Execute code in a sandboxed environment"
     assert "code" in tools[0].inputSchema["properties"]
     assert "language" in tools[0].inputSchema["properties"]
+    assert tools[1].name == "get_job_result"
+    assert tools[1].inputSchema["required"] == ["job_id"]
+    assert tools[2].name == "run_code_batch"
+    assert tools[2].inputSchema["required"] == ["snippets"]
+    assert [tool.name for tool in tools[3:]] == [
+        "create_session",
+        "close_session",
+        "get_metrics",
+    ]
 
 
 async def test_run_code_tool_python(server, mock_gcf_response):
-    with patch('src.code_mcp.server.CodeInterpreterServer._call_gcf', new_callable=AsyncMock) as mock_call:
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
         mock_call.return_value = mock_gcf_response
-        
-        result = await server.run_code(
-            code="print('Hello, World!')",
-            language="python"
-        )
-        
+
+        result = await server.run_code(code="print('Hello, World!')", language="python")
+
         assert isinstance(result, list)
         assert len(result) == 1
         assert isinstance(result[0], TextContent)
         assert result[0].text == "Hello, World!"
-        
-        mock_call.assert_called_once_with(
-            "print('Hello, World!')",
-            "python"
-        )
+
+        mock_call.assert_called_once_with("print('Hello, World!')", "python")
 
 
 async def test_run_code_tool_javascript(server, mock_gcf_response):
     mock_gcf_response["stdout"] = "42"
-    
-    with patch('src.code_mcp.server.CodeInterpreterServer._call_gcf', new_callable=AsyncMock) as mock_call:
+
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
         mock_call.return_value = mock_gcf_response
-        
-        result = await server.run_code(
-            code="console.log(6 * 7)",
-            language="javascript"
-        )
-        
+
+        result = await server.run_code(code="console.log(6 * 7)", language="javascript")
+
         assert isinstance(result, list)
         assert len(result) == 1
         assert isinstance(result[0], TextContent)
         assert result[0].text == "42"
-        
-        mock_call.assert_called_once_with(
-            "console.log(6 * 7)",
-            "javascript"
+
+        mock_call.assert_called_once_with("console.log(6 * 7)", "javascript")
+
+
+async def test_run_code_stream(server, mock_gcf_response):
+    with (
+        patch(
+            "src.code_mcp.server.CodeInterpreterServer._stream_gcf",
+            new_callable=AsyncMock,
+        ) as mock_stream,
+        patch(
+            "src.code_mcp.server.CodeInterpreterServer._call_gcf",
+            new_callable=AsyncMock,
+        ) as mock_call,
+    ):
+        mock_stream.return_value = mock_gcf_response
+
+        result = await server.handle_call_tool(
+            "run_code",
+            arguments={
+                "code": "print('Hello, World!')",
+                "language": "python",
+                "stream": True,
+            },
         )
 
+        assert result[0].text == "Hello, World!"
+        mock_stream.assert_called_once_with("print('Hello, World!')", "python")
+        mock_call.assert_not_called()
+
 
 async def test_run_code_with_error(server):
     error_response = {
         "stdout": "",
         "stderr": "SyntaxError: invalid syntax",
-        "exitCode": 1
+        "exitCode": 1,
     }
-    
-    with patch('src.code_mcp.server.CodeInterpreterServer._call_gcf', new_callable=AsyncMock) as mock_call:
+
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
         mock_call.return_value = error_response
-        
-        result = await server.run_code(
-            code="print('unclosed",
-            language="python"
-        )
-        
+
+        result = await server.run_code(code="print('unclosed", language="python")
+
         assert isinstance(result, list)
         assert len(result) == 1
         assert isinstance(result[0], TextContent)
@@ -97,31 +122,135 @@ async def test_run_code_with_error(server):
         assert "Exit code: 1" in result[0].text
 
 
+async def test_run_code_truncated_output(server):
+    truncated_response = {
+        "stdout": "head\n... [10 bytes truncated] ...\ntail",
+        "stderr": "",
+        "exitCode": 0,
+        "truncated": True,
+        "stdoutBytes": 2048,
+        "stderrBytes": 0,
+    }
+
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
+        mock_call.return_value = truncated_response
+
+        result = await server.run_code(code="print('x' * 2048)", language="python")
+
+        assert result[0].text.endswith(
+            "Output truncated: produced 2048 bytes of stdout and 0 bytes of stderr"
+        )
+
+
+async def test_run_code_reports_usage(server):
+    response = {
+        "stdout": "ok\n",
+        "stderr": "",
+        "exitCode": 0,
+        "usage": {
+            "wallMs": 41.5,
+            "cpuUserMs": 20.0,
+            "cpuSysMs": 4.0,
+            "maxRssKb": 10240,
+        },
+    }
+
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
+        mock_call.return_value = response
+
+        result = await server.run_code(
+            code="print('ok')", language="python", usage=True
+        )
+
+        mock_call.assert_called_once_with("print('ok')", "python", usage=True)
+        assert result[0].text == (
+            "ok\n\n\nResource usage: 41.5 ms wall, 20.0 ms user CPU, 4.0 ms system CPU, peak RSS 10.0 MiB"
+        )
+
+
+async def test_run_code_reports_profile(server):
+    response = {
+        "stdout": "ok\n",
+        "stderr": "",
+        "exitCode": 0,
+        "profile": {
+            "profiler": "cProfile",
+            "totalMs": 12.5,
+            "functions": [
+                {
+                    "function": "<string>:1(fib)",
+                    "calls": 8361,
+                    "selfMs": 12.0,
+                    "cumulativeMs": 12.4,
+                }
+            ],
+        },
+    }
+
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
+        mock_call.return_value = response
+
+        result = await server.run_code(
+            code="print('ok')", language="python", profile=True
+        )
+
+        mock_call.assert_called_once_with("print('ok')", "python", profile=True)
+        assert result[0].text.endswith(
+            "Profile (cProfile, 12.5 ms profiled, by self time):\n"
+            "   self ms     cum ms     calls  function\n"
+            "    12.000     12.400      8361  <string>:1(fib)"
+        )
+
+
+async def test_get_metrics_reports_tool_latency(server, mock_gcf_response):
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
+        mock_call.return_value = mock_gcf_response
+        await server.run_code(
+            code="print('Hello, World!')", language="python", cache=False
+        )
+
+    result = await server.handle_call_tool("get_metrics", arguments={})
+    text = result[0].text
+
+    assert "# TYPE code_mcp_stage_seconds histogram" in text
+    assert (
+        'code_mcp_stage_seconds_count{stage="tool",language="python",outcome="ok"}'
+        in text
+    )
+    assert "code_mcp_admission_active 0" in text
+
+
 async def test_run_code_gcf_failure(server):
-    with patch('src.code_mcp.server.CodeInterpreterServer._call_gcf', new_callable=AsyncMock) as mock_call:
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
         mock_call.side_effect = Exception("GCF connection failed")
-        
+
         with pytest.raises(Exception) as exc_info:
-            await server.run_code(
-                code="print('test')",
-                language="python"
-            )
-        
+            await server.run_code(code="print('test')", language="python")
+
         assert "GCF connection failed" in str(exc_info.value)
 
 
 async def test_handle_call_tool(server, mock_gcf_response):
-    with patch('src.code_mcp.server.CodeInterpreterServer._call_gcf', new_callable=AsyncMock) as mock_call:
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf", new_callable=AsyncMock
+    ) as mock_call:
         mock_call.return_value = mock_gcf_response
-        
+
         result = await server.handle_call_tool(
             "run_code",
-            arguments={
-                "code": "print('Hello, World!')",
-                "language": "python"
-            }
+            arguments={"code": "print('Hello, World!')", "language": "python"},
         )
-        
+
         assert isinstance(result, list)
         assert len(result) == 1
         assert isinstance(result[0], TextContent)
@@ -130,9 +259,169 @@ async def test_handle_call_tool(server, mock_gcf_response):
 
 async def test_handle_call_tool_invalid_tool(server):
     with pytest.raises(ValueError) as exc_info:
-        await server.handle_call_tool(
-            "invalid_tool",
-            arguments={}
+        await server.handle_call_tool("invalid_tool", arguments={})
+
+    assert "Unknown tool: invalid_tool" in str(exc_info.value)
+
+
+async def test_run_code_batch(server):
+    snippets = [
+        {"code": "print(1)", "language": "python"},
+        {"code": "exit 2", "language": "bash"},
+    ]
+    batch_response = {
+        "results": [
+            {"stdout": "1\n", "stderr": "", "exitCode": 0},
+            {"stdout": "", "stderr": "", "exitCode": 2},
+        ]
+    }
+
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf_batch",
+        new_callable=AsyncMock,
+    ) as mock_call:
+        mock_call.return_value = batch_response
+
+        result = await server.handle_call_tool(
+            "run_code_batch", arguments={"snippets": snippets, "parallel": True}
         )
-    
-    assert "Unknown tool: invalid_tool" in str(exc_info.value)
\ No newline at end of file
+
+        assert len(result) == 1
+        assert result[0].text == (
+            "--- Snippet 1 (python) ---\n1\n\n--- Snippet 2 (bash) ---\nExit code: 2"
+        )
+        mock_call.assert_called_once_with(snippets, True)
+
+
+async def test_run_code_batch_item_error(server):
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._call_gcf_batch",
+        new_callable=AsyncMock,
+    ) as mock_call:
+        mock_call.return_value = {"results": [{"error": "Unsupported language: cobol"}]}
+
+        result = await server.run_code_batch(
+            [{"code": "DISPLAY 1", "language": "cobol"}]
+        )
+
+        assert (
+            result[0].text
+            == "--- Snippet 1 (cobol) ---\nError: Unsupported language: cobol"
+        )
+
+
+async def test_create_session(server):
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._post_gcf", new_callable=AsyncMock
+    ) as mock_post:
+        mock_post.return_value = {"sessionId": "abc123", "language": "python"}
+
+        result = await server.handle_call_tool(
+            "create_session", arguments={"language": "python"}
+        )
+
+        assert result[0].text == "abc123"
+        mock_post.assert_called_once_with(
+            {"action": "create_session", "language": "python"}
+        )
+
+
+async def test_run_code_in_session_skips_cache(server, mock_gcf_response):
+    with (
+        patch(
+            "src.code_mcp.server.CodeInterpreterServer._call_gcf",
+            new_callable=AsyncMock,
+        ) as mock_call,
+        patch("src.code_mcp.server.run_cached", new_callable=AsyncMock) as mock_cached,
+    ):
+        mock_call.return_value = mock_gcf_response
+
+        result = await server.handle_call_tool(
+            "run_code",
+            arguments={
+                "code": "print(x)",
+                "language": "python",
+                "session_id": "abc123",
+            },
+        )
+
+        assert result[0].text == "Hello, World!"
+        mock_call.assert_called_once_with("print(x)", "python", sessionId="abc123")
+        mock_cached.assert_not_called()
+
+
+async def test_run_code_in_background_returns_job(server):
+    with (
+        patch(
+            "src.code_mcp.server.CodeInterpreterServer._post_gcf",
+            new_callable=AsyncMock,
+        ) as mock_post,
+        patch("src.code_mcp.server.run_cached", new_callable=AsyncMock) as mock_cached,
+    ):
+        mock_post.return_value = {
+            "jobId": "job1",
+            "status": "pending",
+            "elapsedMs": 0.2,
+        }
+
+        result = await server.handle_call_tool(
+            "run_code",
+            arguments={"code": "print(1)", "language": "python", "background": True},
+        )
+
+        assert "job1" in result[0].text
+        assert "get_job_result" in result[0].text
+        mock_post.assert_called_once_with(
+            {"code": "print(1)", "language": "python", "async": True}
+        )
+        mock_cached.assert_not_called()
+
+
+async def test_get_job_result_waits_for_output(server):
+    backend = AsyncMock()
+    backend.execute.side_effect = [
+        {"jobId": "job1", "status": "running", "elapsedMs": 20000.0},
+        {
+            "jobId": "job1",
+            "status": "done",
+            "elapsedMs": 25000.0,
+            "result": {"stdout": "done\n", "stderr": "", "exitCode": 0},
+        },
+    ]
+
+    with patch(
+        "src.code_mcp.server.CodeInterpreterServer._backend", new_callable=AsyncMock
+    ) as mock_backend:
+        mock_backend.return_value = backend
+        result = await server.handle_call_tool(
+            "get_job_result", arguments={"job_id": "job1", "timeout": 60}
+        )
+
+    assert result[0].text == "done"
+    first = backend.execute.call_args_list[0].args[0]
+    assert first["action"] == "get_job"
+    assert first["jobId"] == "job1"
+    assert 0 < first["wait"] <= 20
+
+
+async def test_concurrent_identical_run_code_calls_are_coalesced(
+    server, mock_gcf_response
+):
+    async def slow_call(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return mock_gcf_response
+
+    with (
+        patch(
+            "src.code_mcp.server.CodeInterpreterServer._call_gcf", side_effect=slow_call
+        ) as mock_call,
+        patch("src.code_mcp.singleflight.COALESCE", True),
+    ):
+        results = await asyncio.gather(
+            server.run_code(code="print(1)", language="python", coalesce=True),
+            server.run_code(code="print(1)", language="python", coalesce=True),
+            server.run_code(code="print(1)", language="python"),
+        )
+
+        assert [r[0].text for r in results] == ["Hello, World!"] * 3
+        assert mock_call.call_count == 2
@@ -0,0 +1,129 @@
+import asyncio
+from unittest.mock import patch
+
+from src.code_mcp.singleflight import SingleFlight, flight_key, run_coalesced
+
+RESULT = {"stdout": "2\n", "stderr": "", "exitCode": 0}
+
+
+def test_flight_key_depends_on_language_code_and_timeout():
+    key = flight_key("python", "print(1+1)")
+    assert key == flight_key("python", "print(1+1)")
+    assert key != flight_key("python", "print(1+2)")
+    assert key != flight_key("bash", "print(1+1)")
+    assert key != flight_key("python", "print(1+1)", timeout=5)
+
+
+async def test_concurrent_identical_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return RESULT
+
+    results = await asyncio.gather(*(flights.run("k", fetch) for _ in range(5)))
+
+    assert results == [RESULT] * 5
+    assert calls == 1
+    stats = flights.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["in_flight"] == 0
+
+
+async def test_different_keys_and_later_calls_run_again():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0)
+        return RESULT
+
+    await asyncio.gather(
+        flights.run("a", lambda: fetch("a")), flights.run("b", lambda: fetch("b"))
+    )
+    await flights.run("a", lambda: fetch("a"))
+
+    assert calls == ["a", "b", "a"]
+    assert flights.stats()["coalesced"] == 0
+
+
+async def test_error_reaches_every_caller():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("executor unreachable")
+
+    results = await asyncio.gather(
+        flights.run("k", fetch), flights.run("k", fetch), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+async def test_execution_outlives_the_caller_that_started_it():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return RESULT
+
+    first = asyncio.create_task(flights.run("k", fetch))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(flights.run("k", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == RESULT
+    assert cancelled == []
+
+
+async def test_execution_is_cancelled_when_every_caller_gives_up():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return RESULT
+
+    waiters = [asyncio.create_task(flights.run("k", fetch)) for _ in range(2)]
+    await asyncio.sleep(0)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert cancelled == [True]
+    assert flights.stats()["abandoned"] == 1
+    assert flights.stats()["in_flight"] == 0
+
+
+async def test_no_key_or_disabled_runs_alone():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return RESULT
+
+    with patch("src.code_mcp.singleflight.COALESCE", True):
+        await asyncio.gather(run_coalesced(None, fetch), run_coalesced(None, fetch))
+    assert calls == 2
+
+    await asyncio.gather(run_coalesced("k", fetch), run_coalesced("k", fetch))
+    assert calls == 4
@@ -0,0 +1,117 @@
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from src.code_mcp.http_client import GCFClient
+from src.code_mcp.metrics import METRICS
+from src.code_mcp.tracing import Trace, TraceWriter, current_trace, traced
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = TraceWriter(tmp_path / "trace.json")
+    with patch("src.code_mcp.tracing._writer", writer):
+        yield writer
+
+
+def read_events(writer: TraceWriter) -> list[dict]:
+    # Chrome traces may leave the array open
+    text = writer.path.read_text().rstrip().rstrip(",")
+    return json.loads(text + "]")
+
+
+async def test_sampled_call_writes_chrome_trace(writer):
+    with traced("run_code", language="python"):
+        trace = current_trace()
+        with METRICS.timed("tool", "python"):
+            pass
+
+    assert current_trace() is None
+    events = read_events(writer)
+    assert events[0]["ph"] == "M"
+    spans = {e["name"]: e for e in events[1:]}
+    assert set(spans) == {"tool", "run_code"}
+    assert all(
+        e["ph"] == "X" and e["args"]["traceId"] == trace.id for e in spans.values()
+    )
+    assert spans["run_code"]["ts"] <= spans["tool"]["ts"]
+    assert spans["run_code"]["dur"] >= spans["tool"]["dur"]
+    assert writer.stats()["written"] == 1
+
+
+async def test_each_call_gets_its_own_row(writer):
+    for _ in range(2):
+        with traced("run_code"):
+            pass
+
+    rows = {e["tid"] for e in read_events(writer)}
+    assert rows == {1, 2}
+
+
+async def test_unsampled_or_disabled_calls_are_not_traced(writer):
+    with patch("src.code_mcp.tracing.TRACE_SAMPLE", 0.0), traced("run_code"):
+        assert current_trace() is None
+    assert not writer.path.exists()
+
+    with (
+        patch("src.code_mcp.tracing._writer", None),
+        patch("src.code_mcp.tracing.TRACE_FILE", None),
+        traced("run_code"),
+    ):
+        assert current_trace() is None
+
+
+def test_executor_spans_are_centred_in_the_request():
+    trace = Trace("run_code")
+    spans = [
+        {"name": "execute_code", "startMs": 0, "durMs": 80},
+        {"name": "execute", "startMs": 10, "durMs": 60},
+    ]
+
+    trace.add_remote(spans, start=100.0, seconds=0.1, request_id="r1")
+
+    placed = {s["name"]: s for s in trace.spans}
+    assert placed["execute_code"]["start"] == pytest.approx(100.01)
+    assert placed["execute"]["start"] == pytest.approx(100.02)
+    assert placed["execute"]["seconds"] == pytest.approx(0.06)
+    assert placed["execute"]["category"] == "executor"
+    assert placed["execute"]["args"] == {"requestId": "r1"}
+
+
+async def test_client_propagates_trace_and_collects_executor_spans(writer):
+    seen = []
+    spans = [
+        {"name": "spawn", "startMs": 1, "durMs": 2},
+        {"name": "execute_code", "startMs": 0, "durMs": 5},
+    ]
+
+    def handler(request):
+        seen.append(request.headers.get("X-Trace-Id"))
+        return httpx.Response(
+            200,
+            json={"stdout": "", "stderr": "", "exitCode": 0},
+            headers={"X-Trace-Spans": json.dumps(spans)},
+        )
+
+    client = GCFClient(transport=httpx.MockTransport(handler))
+    with traced("run_code"):
+        trace = current_trace()
+        await client.post_json(
+            "https://gcf.test/run", {"code": "pass", "language": "python"}
+        )
+    untraced = await client.post_json(
+        "https://gcf.test/run", {"code": "pass", "language": "python"}
+    )
+    await client.aclose()
+
+    assert untraced["exitCode"] == 0
+    assert seen == [trace.id, None]
+    events = read_events(writer)
+    assert {e["args"]["traceId"] for e in events if e["ph"] == "X"} == {trace.id}
+    names = [e["name"] for e in events if e["ph"] == "X"]
+    assert {"queue_wait", "http", "spawn", "execute_code", "run_code"} <= set(names)
+    spawn = next(e for e in events if e["name"] == "spawn")
+    assert spawn["cat"] == "executor"
+    assert spawn["args"]["requestId"]